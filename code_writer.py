@@ -1,12 +1,53 @@
+import os
+import filecmp
+
 CPP = "__cplusplus"
 
 #class for simplifying generation of code
 class CodeWriter:
-    def __init__(self, fname):
+    #stream=True writes text out to the file as it is generated, rather than holding the entire file in memory
+    #bufferSize is the number of characters buffered before being flushed to the file (in stream mode)
+    def __init__(self, fname, stream=False, bufferSize=65536):
         self.fname = fname
         
+        self.stream = stream
+        self.bufferSize = bufferSize
+        
+        self.file = None
+        self.chunks = []
+        
         self.clear()
         
+    #text is stored as a list of chunks (avoid quadratic string concatenation)
+    #in stream mode, only the text that has not yet been flushed is returned
+    @property
+    def text(self):
+        return ''.join(self.chunks)
+        
+    #add a chunk of text to the output
+    def write(self, text):
+        if not text:
+            return
+            
+        self.chunks.append(text)
+        self.size += len(text)
+        self.length += len(text)
+        
+        if self.stream and self.size >= self.bufferSize:
+            self.flush()
+            
+    #write any buffered text out to the file (stream mode only)
+    def flush(self):
+        if not self.stream:
+            return
+            
+        if not self.file:
+            self.file = open(self.tempName(),'w')
+            
+        self.file.writelines(self.chunks)
+        self.chunks = []
+        self.size = 0
+        
     #increment the tab position
     def tabIn(self):
         self.tabs += 1
@@ -18,13 +59,14 @@ class CodeWriter:
             
     #append raw text
     def append(self, text, ignoreTabs=False):
-        self.text = self.text + '\t' * (0 if ignoreTabs else self.tabs)
-        self.text += text
+        if not ignoreTabs:
+            self.write('\t' * self.tabs)
+        self.write(text)
         
     #append a line (enforce newline chracter)
     def appendLine(self, text=None, comment=None, ignoreTabs=False):
         if self.comment:
-            self.text += '* '
+            self.write('* ')
         if text:
             self.append(text,ignoreTabs)
         if comment:
@@ -155,6 +197,14 @@ class CodeWriter:
         else:
             self.appendLine('#ifdef ' + define)
         
+    #switch to the #else part of an #if(n)def block
+    def startElse(self):
+        self.append('#else ')
+        if len(self.defs) > 0:
+            self.appendLine(comment=self.defs[-1])
+        else:
+            self.appendLine()
+        
     #end an #if(n)def block
     def endIf(self):
         self.append("#endif ")
@@ -172,12 +222,49 @@ class CodeWriter:
         self.appendLine('}')
         self.endIf()
         
+    #in stream mode, text is written to a temporary file and only moved into place if it differs
+    def tempName(self):
+        return self.fname + '.tmp'
+        
+    #write the text to file
+    #the file is only touched if the contents have changed (so that build systems do not see a new timestamp)
+    #returns True if the file was written, else False
     def writeToFile(self):
+        if self.stream:
+            #write out any remaining text and close the file
+            self.flush()
+            self.file.close()
+            self.file = None
+            
+            if os.path.exists(self.fname) and filecmp.cmp(self.tempName(), self.fname, shallow=False):
+                os.remove(self.tempName())
+                return False
+                
+            os.replace(self.tempName(), self.fname)
+            return True
+            
+        text = self.text
+        
+        if os.path.exists(self.fname):
+            with open(self.fname,'r') as file:
+                if file.read() == text:
+                    return False
+                    
         with open(self.fname,'w') as file:
-            file.write(self.text)
+            file.write(text)
+            
+        return True
             
     def clear(self):
-        self.text = ''
+        #discard any partially streamed file, it will be re-written from the start
+        if self.file:
+            self.file.close()
+            self.file = None
+            os.remove(self.tempName())
+            
+        self.chunks = []
+        self.size = 0 #number of characters buffered
+        self.length = 0 #total number of characters generated
         self.tabs = 0
         self.comment = False
         self.defs = [] #def levels
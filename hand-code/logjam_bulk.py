@@ -0,0 +1,186 @@
+"""
+LogJam bulk (columnar) decoder
+Decodes a buffer of frames (as produced by Log<Prefix>_CopyDataToBuffer()) into one numpy array per variable
+
+Requires numpy. The logging structure is described by the LogDecoder in a generated log_<prefix>_defs.py module:
+
+    import log_example_defs as example
+    from logjam_bulk import decodeColumns
+
+    values, valid = decodeColumns(example.decoder, buffer)
+
+Frames are grouped by their selection bitfield, and every frame in a group is decoded at once through a structured
+(big-endian) numpy dtype describing the layout of the selected variables. Frames containing variable-length encoded
+variables cannot be described by a dtype, so are decoded one at a time by the LogDecoder.
+"""
+
+import struct
+
+import numpy as np
+
+from logjam_decoder import LogContext
+
+#numpy (big-endian) type for each struct module format character
+NUMPY_FORMATS = {'b' : 'i1', 'B' : 'u1', 'h' : '>i2', 'H' : '>u2', 'i' : '>i4', 'I' : '>u4'}
+
+#number of frames gathered at once (limits the size of the temporary index arrays)
+CHUNK_FRAMES = 1 << 16
+
+#structured dtype for the frames of a (fixed-size) selection plan
+#returns the dtype and the names of the variables in it
+def frameDtype(decoder, plan):
+    names = []
+    formats = []
+    offsets = []
+
+    offset = decoder.headerBytes
+
+    for s, run in plan:
+        for var in run:
+            names.append(var.name)
+            formats.append(NUMPY_FORMATS[var.format])
+            offsets.append(offset)
+
+            offset += np.dtype(NUMPY_FORMATS[var.format]).itemsize
+
+    return np.dtype({'names' : names, 'formats' : formats, 'offsets' : offsets, 'itemsize' : offset}), names
+
+"""
+Find the start of each frame in a buffer
+offsets - position of each frame, or None if the frames are consecutive (from the start of the buffer)
+overhead - number of bytes between consecutive frames (in the given offsets)
+A gap between two frames means frames are missing, so the context is reset (delta variables are left out until the next keyframe)
+An incomplete final frame is left out
+Returns (offsets, groups, decoded)
+offsets - array of the position of each frame
+groups - dict of {selection: list of frame numbers} for each distinct (fixed-size) selection bitfield
+decoded - dict of {frame number: values} for the frames that contain variable-length encoded variables,
+which are decoded along the way (in order, so that delta variables are reconstructed through the given LogContext)
+"""
+def findFrames(decoder, buffer, context, offsets=None, overhead=0):
+    groups = {}
+    decoded = {}
+    sizes = {}
+
+    n = decoder.selectionBytes
+
+    frames = iter(offsets) if offsets is not None else None
+    positions = []
+    offset = 0
+
+    #end of the previous frame
+    end = None
+
+    while True:
+        if frames is not None:
+            offset = next(frames, None)
+
+            if offset is None:
+                break
+        elif offset >= len(buffer):
+            break
+
+        if offset + decoder.headerBytes > len(buffer):
+            break
+
+        if end is not None and offset != end + overhead:
+            context.reset()
+
+        selection = bytes(buffer[offset:offset + n])
+        size = sizes.get(selection)
+
+        if size is None:
+            plan = decoder.selectionPlan(selection)
+
+            #fixed-size frames (0 if the frame contains encoded variables)
+            size = decoder.headerBytes + sum([s.size for s, run in plan]) if all([s is not None for s, run in plan]) else 0
+            sizes[selection] = size
+
+        i = len(positions)
+
+        if size:
+            if offset + size > len(buffer):
+                break
+
+            groups.setdefault(selection, []).append(i)
+
+            #a keyframe without any delta variables still resynchronises the delta variables
+            if decoder.keyframeBytes and buffer[offset + n]:
+                decoder.reconstructDeltas({}, True, context)
+
+            length = size
+        else:
+            try:
+                decoded[i], length = decoder.decodeFrame(buffer, offset, context)
+            except (IndexError, struct.error):
+                break
+
+        positions.append(offset)
+
+        end = offset + length
+        offset = end
+
+    return np.array(positions, dtype=np.int64), groups, decoded
+
+"""
+Decode a buffer of frames into columns
+decoder - LogDecoder for the logging structure (e.g. log_<prefix>_defs.decoder)
+buffer - bytes-like object containing consecutive frames
+offsets - position of each frame (if the frames are not consecutive, e.g. as found by logjam_framing.scanFrames())
+overhead - number of bytes between consecutive frames in the given offsets (e.g. logjam_framing.overheadBytes(framing))
+context - LogContext for delta variables
+By default each call uses a fresh context (the decoder's own context is neither used nor changed), so delta variables are
+left out until the first keyframe in the buffer. Pass the same LogContext to successive calls to continue across buffers
+A gap between the given offsets (more than overhead bytes after the end of the previous frame) means frames are missing, so
+delta variables are left out again until the next keyframe. An incomplete final frame is left out
+
+Returns (values, valid), each a dict of {variable name: array} with one entry per frame
+values - the value of each variable (divided by the scaler, as float64, for scaled variables)
+valid - True where the variable was stored in the frame (values are 0 elsewhere)
+"""
+def decodeColumns(decoder, buffer, offsets=None, context=None, overhead=0):
+    if context is None:
+        context = LogContext()
+
+    offsets, groups, decoded = findFrames(decoder, buffer, context, offsets, overhead)
+
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    count = len(offsets)
+
+    values = {}
+    valid = {}
+
+    for var in decoder.variables:
+        values[var.name] = np.zeros(count, dtype=NUMPY_FORMATS[var.format].replace('>', ''))
+        valid[var.name] = np.zeros(count, dtype=bool)
+
+    for selection, frames in groups.items():
+        dtype, names = frameDtype(decoder, decoder.selectionPlan(selection))
+
+        if not names:
+            continue
+
+        frames = np.array(frames, dtype=np.int64)
+        span = np.arange(dtype.itemsize, dtype=np.int64)
+
+        for start in range(0, len(frames), CHUNK_FRAMES):
+            rows = frames[start:start + CHUNK_FRAMES]
+
+            #gather the bytes of each frame in the group, and view them through the frame dtype
+            records = data[offsets[rows][:, None] + span].view(dtype)[:, 0]
+
+            for name in names:
+                values[name][rows] = records[name]
+                valid[name][rows] = True
+
+    for i, frame in decoded.items():
+        for name, value in frame.items():
+            values[name][i] = value
+            valid[name][i] = True
+
+    #apply the scalers
+    for var in decoder.variables:
+        if var.scaler > 1:
+            values[var.name] = values[var.name] / var.scaler
+
+    return values, valid
@@ -1,104 +1,324 @@
 
-#include "logjam_common.h" //LogJam common function
-
-void CopyU8ToBuffer(uint8_t data, uint8_t **ptr)
-{
-    *(*ptr)++ = data;
-}
+//Compile the (non-inline) byte-copy and bit primitives in this file
+#define LOGJAM_IMPLEMENTATION
 
-//Copy an uint16_t to a pointer, and auto-increment the pointer
-void CopyU16ToBuffer(uint16_t data, uint8_t **ptr)
-{
-    *(*ptr)++ = (uint8_t) (data >> 8);
-    *(*ptr)++ = (uint8_t) (data & 0xFF);
-}
+#include "logjam_common.h" //LogJam common function
 
-void CopyU24ToBuffer(uint32_t data, uint8_t **ptr)
+//Copy a single variable (described by a LogField_t) from a data struct to a buffer
+uint8_t CopyFieldToBuffer(const LogField_t *field, const void *data, uint8_t **ptr)
 {
-    *(*ptr)++ = (uint8_t) (data >> 16);
-    *(*ptr)++ = (uint8_t) (data >> 8);
-    *(*ptr)++ = (uint8_t) (data & 0xFF);
+    const uint8_t *src = (const uint8_t*) data + field->offset;
+    uint16_t u16;
+    uint32_t u32;
+    uint8_t signExtend;
+    
+    //variable-length encoded fields
+    if (field->flags & (LOG_FIELD_VARINT | LOG_FIELD_ZIGZAG))
+    {
+        //signed values are sign-extended for zigzag encoding, other values are zero-extended
+        signExtend = (field->flags & LOG_FIELD_SIGNED) && (field->flags & LOG_FIELD_ZIGZAG);
+        
+        switch (field->bytes)
+        {
+        case 1:
+            u32 = signExtend ? (uint32_t) (int32_t) *((const int8_t*) src) : *src;
+            break;
+        case 2:
+            memcpy(&u16, src, 2);
+            u32 = signExtend ? (uint32_t) (int32_t) (int16_t) u16 : u16;
+            break;
+        case 4:
+            memcpy(&u32, src, 4);
+            break;
+        default:
+            return 0;
+        }
+        
+        if (field->flags & LOG_FIELD_ZIGZAG)
+            return CopyZigzagToBuffer((int32_t) u32, ptr);
+        else
+            return CopyVarintToBuffer(u32, ptr);
+    }
+    
+    switch (field->bytes)
+    {
+    case 1:
+        CopyU8ToBuffer(*src, ptr);
+        break;
+    case 2:
+        memcpy(&u16, src, 2);
+        CopyU16ToBuffer(u16, ptr);
+        break;
+    case 4:
+        memcpy(&u32, src, 4);
+        CopyU32ToBuffer(u32, ptr);
+        break;
+    default:
+        return 0;
+    }
+    
+    return field->bytes;
 }
 
-void CopyU32ToBuffer(uint32_t data, uint8_t **ptr)
+//Copy a single variable (described by a LogField_t) from a buffer to a data struct
+uint8_t CopyFieldFromBuffer(const LogField_t *field, void *data, uint8_t **ptr)
 {
-    *(*ptr)++ = (uint8_t) (data >> 24);
-    *(*ptr)++ = (uint8_t) (data >> 16);
-    *(*ptr)++ = (uint8_t) (data >> 8);
-    *(*ptr)++ = (uint8_t) (data & 0xFF);
+    uint8_t *dest = (uint8_t*) data + field->offset;
+    uint16_t u16;
+    uint32_t u32;
+    uint8_t n;
+    
+    //variable-length encoded fields
+    if (field->flags & (LOG_FIELD_VARINT | LOG_FIELD_ZIGZAG))
+    {
+        if (field->flags & LOG_FIELD_ZIGZAG)
+            n = CopyZigzagFromBuffer((int32_t*) &u32, ptr);
+        else
+            n = CopyVarintFromBuffer(&u32, ptr);
+        
+        switch (field->bytes)
+        {
+        case 1:
+            *dest = (uint8_t) u32;
+            break;
+        case 2:
+            u16 = (uint16_t) u32;
+            memcpy(dest, &u16, 2);
+            break;
+        case 4:
+            memcpy(dest, &u32, 4);
+            break;
+        default:
+            return 0;
+        }
+        
+        return n;
+    }
+    
+    switch (field->bytes)
+    {
+    case 1:
+        CopyU8FromBuffer(dest, ptr);
+        break;
+    case 2:
+        CopyU16FromBuffer(&u16, ptr);
+        memcpy(dest, &u16, 2);
+        break;
+    case 4:
+        CopyU32FromBuffer(&u32, ptr);
+        memcpy(dest, &u32, 4);
+        break;
+    default:
+        return 0;
+    }
+    
+    return field->bytes;
 }
 
-void CopyU8FromBuffer(uint8_t *data, uint8_t **ptr)
+uint16_t CopyFieldsToBuffer(const LogField_t *fields, uint16_t count, const void *data, const void *selection, uint8_t **ptr)
 {
-    *data = *(*ptr)++;
+    const uint8_t *bits = (const uint8_t*) selection;
+    uint16_t size = 0;
+    uint16_t i;
+    
+    for (i=0;i<count;i++)
+    {
+        if (bits && ((bits[i/8] & (1 << (i % 8))) == 0))
+            continue;
+            
+        size += CopyFieldToBuffer(&fields[i], data, ptr);
+    }
+    
+    return size;
 }
 
-void CopyU16FromBuffer(uint16_t *data, uint8_t **ptr)
+uint16_t CopyFieldsFromBuffer(const LogField_t *fields, uint16_t count, void *data, const void *selection, uint8_t **ptr)
 {
-    *data  = *(*ptr)++;      //Byte 2
-    *data <<= 8;
-    *data |= *(*ptr)++;      //Byte 1
+    const uint8_t *bits = (const uint8_t*) selection;
+    uint16_t size = 0;
+    uint16_t i;
+    
+    for (i=0;i<count;i++)
+    {
+        if (bits && ((bits[i/8] & (1 << (i % 8))) == 0))
+            continue;
+            
+        size += CopyFieldFromBuffer(&fields[i], data, ptr);
+    }
+    
+    return size;
 }
 
-void CopyU24FromBuffer(uint32_t *data, uint8_t **ptr)
+//Value of a variable (described by a LogField_t) in a data struct
+uint32_t GetFieldValue(const LogField_t *field, const void *data)
 {
-    *data  = *(*ptr)++;    //Byte 3
-    *data <<= 8;
-    *data |= *(*ptr)++;    //Byte 2
-    *data <<= 8;
-    *data |= *(*ptr)++;    //Byte 1
-}
-
-void CopyU32FromBuffer(uint32_t *data, uint8_t **ptr)
-{   
-    *data  = *(*ptr)++;    //Byte 4
-    *data <<= 8;
-    *data |= *(*ptr)++;    //Byte 3
-    *data <<= 8;
-    *data |= *(*ptr)++;    //Byte 2
-    *data <<= 8;
-    *data |= *(*ptr)++;    //Byte 1
+    const uint8_t *src = (const uint8_t*) data + field->offset;
+    uint16_t u16;
+    uint32_t u32;
+    uint8_t sign = field->flags & LOG_FIELD_SIGNED;
+    
+    switch (field->bytes)
+    {
+    case 1:
+        return sign ? (uint32_t) (int32_t) *((const int8_t*) src) : *src;
+    case 2:
+        memcpy(&u16, src, 2);
+        return sign ? (uint32_t) (int32_t) (int16_t) u16 : u16;
+    case 4:
+        memcpy(&u32, src, 4);
+        return u32;
+    default:
+        return 0;
+    }
 }
 
-void CopyI8ToBuffer(int8_t *data,)
-
-void CopyI16ToBuffer(int16_t data, uint8_t **ptr)
+//Format the value of a variable (described by a LogValueField_t) into a string
+uint8_t FormatField(const LogValueField_t *field, const void *data, char *str, uint8_t size)
 {
-    CopyU16ToBuffer((uint16_t) data, ptr);
+    uint32_t value = GetFieldValue(&field->field, data);
+    
+    if (field->field.flags & LOG_FIELD_SIGNED)
+        return FormatSigned(str, size, (int32_t) value, field->scaler, field->decimals);
+    else
+        return FormatUnsigned(str, size, value, field->scaler, field->decimals);
 }
 
-void CopyI32ToBuffer(int32_t data, uint8_t **ptr)
+//Start an (empty) event block in the provided buffer
+void LogEventBlockInit(LogEventBlock_t *block, uint8_t *buffer, uint16_t capacity, LogEventBlockFlush_t flush)
 {
-    CopyU32ToBuffer((uint32_t) data, ptr);
+    block->buffer = buffer;
+    block->capacity = capacity;
+    block->length = 0;
+    block->count = 0;
+    block->timestamp = 0;
+    block->flush = flush;
 }
 
-void CopyI16FromBuffer(int16_t *data, uint8_t **ptr)
+//Reserve space in a block for an event of a given size (including the event id)
+//The current block is flushed first if the event does not fit (or the timestamp is too far from the base timestamp)
+//Returns a pointer to where the event should be written, or NULL if the event is larger than the block
+uint8_t* LogEventBlockReserve(LogEventBlock_t *block, uint32_t timestamp, uint8_t size)
 {
-    CopyU16FromBuffer((uint16_t*) data, ptr);
+    uint8_t *ptr;
+    uint32_t offset;
+    
+    if (LOG_EVENT_BLOCK_HEADER_BYTES + LOG_EVENT_BLOCK_EVENT_BYTES + size > block->capacity)
+        return NULL;
+    
+    if (block->length > 0)
+    {
+        offset = timestamp - block->timestamp;
+        
+        if ((offset > 0xFFFF) ||
+            (block->count >= LOG_EVENT_BLOCK_MAX_EVENTS) ||
+            (block->length + LOG_EVENT_BLOCK_EVENT_BYTES + size > block->capacity))
+        {
+            LogEventBlockFlush(block);
+        }
+    }
+    
+    //Start a new block
+    if (block->length == 0)
+    {
+        ptr = block->buffer;
+        
+        *(ptr++) = LOG_EVENT_BLOCK_ID;
+        *(ptr++) = 0;
+        CopyU32ToBuffer(timestamp, &ptr);
+        
+        block->length = LOG_EVENT_BLOCK_HEADER_BYTES;
+        block->count = 0;
+        block->timestamp = timestamp;
+    }
+    
+    ptr = block->buffer + block->length;
+    
+    CopyU16ToBuffer((uint16_t) (timestamp - block->timestamp), &ptr);
+    
+    block->length += LOG_EVENT_BLOCK_EVENT_BYTES + size;
+    block->count++;
+    block->buffer[1] = block->count;
+    
+    return ptr;
 }
 
-void CopyI32FromBuffer(int32_t *data, uint8_t **ptr)
+//Pass the current block (if it contains any events) to the flush function, and start a new block
+void LogEventBlockFlush(LogEventBlock_t *block)
 {
-    CopyU32FromBuffer((uint32_t*) data, ptr);
+    if (block->count > 0 && block->flush)
+        block->flush(block->buffer, block->length);
+        
+    block->length = 0;
+    block->count = 0;
 }
 
-void SetBitByPosition(void *ptr, uint8_t pos)
+//Decode each event in a block, calling fn for each event
+//Returns the number of events decoded, or -1 if the block is invalid
+int16_t LogEventBlockDecode(const uint8_t *block, uint16_t length, LogEventSize_t eventSize, LogEventBlockFunc_t fn, void *arg)
 {
-    uint8_t *bits = (uint8_t*) ptr;
+    uint8_t *ptr = (uint8_t*) block;
+    uint16_t pos = LOG_EVENT_BLOCK_HEADER_BYTES;
+    uint8_t count;
+    uint8_t i;
+    uint8_t size;
+    uint16_t offset;
+    uint32_t timestamp;
+    
+    if (length < LOG_EVENT_BLOCK_HEADER_BYTES || block[0] != LOG_EVENT_BLOCK_ID)
+        return -1;
+        
+    ptr++;
+    CopyU8FromBuffer(&count, &ptr);
+    CopyU32FromBuffer(&timestamp, &ptr);
     
-    bits[pos/8] |= (1 << (pos % 8));
+    for (i=0;i<count;i++)
+    {
+        if (pos + LOG_EVENT_BLOCK_EVENT_BYTES + 1 > length)
+            return -1;
+            
+        CopyU16FromBuffer(&offset, &ptr);
+        
+        size = eventSize(*ptr);
+        
+        if (size == 0 || pos + LOG_EVENT_BLOCK_EVENT_BYTES + size > length)
+            return -1;
+            
+        if (fn)
+            fn(arg, *ptr, timestamp + offset, ptr);
+            
+        ptr += size;
+        pos += LOG_EVENT_BLOCK_EVENT_BYTES + size;
+    }
+    
+    return count;
 }
 
-void ClearBitByPosition(void *ptr, uint8_t pos)
+//Offset of a variable in a frame (from the first variable), given its selection bit position and,
+//for each selection byte, a table of the total size of the variables selected by each bit pattern
+uint16_t FrameVariableOffset(const uint8_t *selection, const uint8_t * const *tables, uint16_t pos)
 {
-    uint8_t *bits = (uint8_t*) ptr;
+    uint16_t offset = 0;
+    uint16_t i;
     
-    bits[pos/8] &= ~(1 << (pos % 8));    
+    //Variables in the preceding selection bytes
+    for (i=0;i<pos/8;i++)
+        offset += tables[i][selection[i]];
+        
+    //Variables before this one in the same selection byte
+    return offset + tables[i][selection[i] & ((1 << (pos % 8)) - 1)];
 }
 
-bool GetBitByPosition(void *ptr, uint8_t pos)
+#if !defined(__GNUC__) && !defined(__clang__)
+uint8_t CountTrailingZeros32(uint32_t x)
 {
-    uint8_t *bits = (uint8_t*) ptr;
+    uint8_t n = 0;
+    
+    if ((x & 0xFFFF) == 0) { n += 16; x >>= 16; }
+    if ((x & 0xFF) == 0)   { n += 8;  x >>= 8;  }
+    if ((x & 0xF) == 0)    { n += 4;  x >>= 4;  }
+    if ((x & 0x3) == 0)    { n += 2;  x >>= 2;  }
+    if ((x & 0x1) == 0)    { n += 1; }
     
-    return (bits[pos/8] & (1 << (pos % 8))) > 0;
+    return n;
 }
+#endif
@@ -5,13 +5,298 @@
 #include <stdbool.h>
 #include <stdio.h>
 #include <string.h>
+#include <stddef.h>
+
+/*
+Byte-copy and bit primitives
+Define LOGJAM_INLINE (for the whole project) to make these 'static inline' in every file that includes this header,
+otherwise they are compiled once, as regular functions, in logjam_common.c
+*/
+#if defined(LOGJAM_INLINE)
+#define LOGJAM_PRIMITIVE static inline
+#elif defined(LOGJAM_IMPLEMENTATION)
+#define LOGJAM_PRIMITIVE
+#endif
+
+#ifdef LOGJAM_PRIMITIVE
+
+LOGJAM_PRIMITIVE void CopyU8ToBuffer(uint8_t data, uint8_t **ptr)
+{
+    *(*ptr)++ = data;
+}
+
+//Copy an uint16_t to a pointer, and auto-increment the pointer
+LOGJAM_PRIMITIVE void CopyU16ToBuffer(uint16_t data, uint8_t **ptr)
+{
+    *(*ptr)++ = (uint8_t) (data >> 8);
+    *(*ptr)++ = (uint8_t) (data & 0xFF);
+}
+
+LOGJAM_PRIMITIVE void CopyU24ToBuffer(uint32_t data, uint8_t **ptr)
+{
+    *(*ptr)++ = (uint8_t) (data >> 16);
+    *(*ptr)++ = (uint8_t) (data >> 8);
+    *(*ptr)++ = (uint8_t) (data & 0xFF);
+}
+
+LOGJAM_PRIMITIVE void CopyU32ToBuffer(uint32_t data, uint8_t **ptr)
+{
+    *(*ptr)++ = (uint8_t) (data >> 24);
+    *(*ptr)++ = (uint8_t) (data >> 16);
+    *(*ptr)++ = (uint8_t) (data >> 8);
+    *(*ptr)++ = (uint8_t) (data & 0xFF);
+}
+
+LOGJAM_PRIMITIVE void CopyU8FromBuffer(uint8_t *data, uint8_t **ptr)
+{
+    *data = *(*ptr)++;
+}
+
+LOGJAM_PRIMITIVE void CopyU16FromBuffer(uint16_t *data, uint8_t **ptr)
+{
+    *data  = *(*ptr)++;      //Byte 2
+    *data <<= 8;
+    *data |= *(*ptr)++;      //Byte 1
+}
+
+LOGJAM_PRIMITIVE void CopyU24FromBuffer(uint32_t *data, uint8_t **ptr)
+{
+    *data  = *(*ptr)++;    //Byte 3
+    *data <<= 8;
+    *data |= *(*ptr)++;    //Byte 2
+    *data <<= 8;
+    *data |= *(*ptr)++;    //Byte 1
+}
+
+LOGJAM_PRIMITIVE void CopyU32FromBuffer(uint32_t *data, uint8_t **ptr)
+{   
+    *data  = *(*ptr)++;    //Byte 4
+    *data <<= 8;
+    *data |= *(*ptr)++;    //Byte 3
+    *data <<= 8;
+    *data |= *(*ptr)++;    //Byte 2
+    *data <<= 8;
+    *data |= *(*ptr)++;    //Byte 1
+}
+
+LOGJAM_PRIMITIVE void CopyI8ToBuffer(int8_t data, uint8_t **ptr)
+{
+    CopyU8ToBuffer((uint8_t) data, ptr);
+}
+
+LOGJAM_PRIMITIVE void CopyI16ToBuffer(int16_t data, uint8_t **ptr)
+{
+    CopyU16ToBuffer((uint16_t) data, ptr);
+}
+
+LOGJAM_PRIMITIVE void CopyI32ToBuffer(int32_t data, uint8_t **ptr)
+{
+    CopyU32ToBuffer((uint32_t) data, ptr);
+}
+
+LOGJAM_PRIMITIVE void CopyI8FromBuffer(int8_t *data, uint8_t **ptr)
+{
+    CopyU8FromBuffer((uint8_t*) data, ptr);
+}
+
+LOGJAM_PRIMITIVE void CopyI16FromBuffer(int16_t *data, uint8_t **ptr)
+{
+    CopyU16FromBuffer((uint16_t*) data, ptr);
+}
+
+LOGJAM_PRIMITIVE void CopyI32FromBuffer(int32_t *data, uint8_t **ptr)
+{
+    CopyU32FromBuffer((uint32_t*) data, ptr);
+}
+
+//Copy an unsigned value to a buffer with variable-length (LEB128) encoding
+//7 bits are stored per byte (least significant first), the top bit is set if more bytes follow
+//Returns the number of bytes written (1 to 5)
+LOGJAM_PRIMITIVE uint8_t CopyVarintToBuffer(uint32_t data, uint8_t **ptr)
+{
+    uint8_t n = 1;
+    
+    while (data > 0x7F)
+    {
+        *(*ptr)++ = (uint8_t) ((data & 0x7F) | 0x80);
+        data >>= 7;
+        n++;
+    }
+    
+    *(*ptr)++ = (uint8_t) data;
+    
+    return n;
+}
+
+//Copy a variable-length (LEB128) value out of a buffer
+//Returns the number of bytes read (at most 5)
+LOGJAM_PRIMITIVE uint8_t CopyVarintFromBuffer(uint32_t *data, uint8_t **ptr)
+{
+    uint8_t n = 0;
+    uint8_t b;
+    
+    *data = 0;
+    
+    do
+    {
+        b = *(*ptr)++;
+        *data |= ((uint32_t) (b & 0x7F)) << (7 * n);
+        n++;
+    } while ((b & 0x80) && (n < 5));
+    
+    return n;
+}
+
+//Copy a signed value to a buffer with zigzag encoding (0, -1, 1, -2 -> 0, 1, 2, 3) then LEB128 encoding
+LOGJAM_PRIMITIVE uint8_t CopyZigzagToBuffer(int32_t data, uint8_t **ptr)
+{
+    return CopyVarintToBuffer(((uint32_t) data << 1) ^ (uint32_t) (data >> 31), ptr);
+}
+
+LOGJAM_PRIMITIVE uint8_t CopyZigzagFromBuffer(int32_t *data, uint8_t **ptr)
+{
+    uint32_t x;
+    uint8_t n = CopyVarintFromBuffer(&x, ptr);
+    
+    *data = (int32_t) ((x >> 1) ^ (~(x & 1) + 1));
+    
+    return n;
+}
+
+//Number of bytes in a variable-length (LEB128) value in a buffer (at most 5)
+LOGJAM_PRIMITIVE uint8_t VarintSize(const uint8_t *ptr)
+{
+    uint8_t n = 1;
+    
+    while ((*(ptr++) & 0x80) && (n < 5))
+        n++;
+        
+    return n;
+}
+
+//Integer-only formatting of values into a string (without sprintf)
+//At most size-1 characters are written (the string is always terminated, and is left empty if the value does not fit)
+//The value is divided by the scaler, and shown with a fixed number of decimal places (which are truncated, not rounded)
+//Each function returns the number of characters written
+LOGJAM_PRIMITIVE uint8_t FormatUnsigned(char *str, uint8_t size, uint32_t value, uint32_t scaler, uint8_t decimals)
+{
+    char digits[10];
+    uint32_t whole = value / scaler;
+    uint32_t rem = value % scaler;
+    uint8_t n = 0;
+    uint8_t len = 0;
+    
+    if (size == 0)
+        return 0;
+    
+    do
+    {
+        digits[n++] = (char) ('0' + (whole % 10));
+        whole /= 10;
+    } while (whole > 0);
+    
+    if (n + (decimals > 0 ? decimals + 1 : 0) >= size)
+    {
+        str[0] = '\0';
+        return 0;
+    }
+    
+    while (n > 0)
+        str[len++] = digits[--n];
+        
+    if (decimals > 0)
+    {
+        str[len++] = '.';
+        
+        while (decimals-- > 0)
+        {
+            rem *= 10;
+            str[len++] = (char) ('0' + (rem / scaler));
+            rem %= scaler;
+        }
+    }
+    
+    str[len] = '\0';
+    
+    return len;
+}
+
+LOGJAM_PRIMITIVE uint8_t FormatSigned(char *str, uint8_t size, int32_t value, uint32_t scaler, uint8_t decimals)
+{
+    uint8_t n;
+    
+    if (value >= 0)
+        return FormatUnsigned(str, size, (uint32_t) value, scaler, decimals);
+        
+    if (size < 2)
+    {
+        if (size > 0)
+            str[0] = '\0';
+            
+        return 0;
+    }
+        
+    n = FormatUnsigned(str + 1, size - 1, 0u - (uint32_t) value, scaler, decimals);
+    
+    if (n == 0)
+    {
+        str[0] = '\0';
+        return 0;
+    }
+    
+    str[0] = '-';
+    
+    return n + 1;
+}
+
+//Copy a string (at most size-1 characters are written, and the string is always terminated)
+LOGJAM_PRIMITIVE uint8_t FormatString(char *str, uint8_t size, const char *src)
+{
+    uint8_t len = 0;
+    
+    if (size == 0)
+        return 0;
+        
+    while (src[len] && (len < size - 1))
+    {
+        str[len] = src[len];
+        len++;
+    }
+    
+    str[len] = '\0';
+    
+    return len;
+}
+
+LOGJAM_PRIMITIVE void SetBitByPosition(void *ptr, uint8_t pos)
+{
+    uint8_t *bits = (uint8_t*) ptr;
+    
+    bits[pos/8] |= (1 << (pos % 8));
+}
+
+LOGJAM_PRIMITIVE void ClearBitByPosition(void *ptr, uint8_t pos)
+{
+    uint8_t *bits = (uint8_t*) ptr;
+    
+    bits[pos/8] &= ~(1 << (pos % 8));    
+}
+
+LOGJAM_PRIMITIVE bool GetBitByPosition(void *ptr, uint8_t pos)
+{
+    uint8_t *bits = (uint8_t*) ptr;
+    
+    return (bits[pos/8] & (1 << (pos % 8))) > 0;
+}
+
+#else
 
 //Copy unsigned data types to/from buffer 
 void CopyU8ToBuffer(uint8_t data, uint8_t **ptr);
 void CopyU16ToBuffer(uint16_t data, uint8_t **ptr);
 void CopyU24ToBuffer(uint32_t data, uint8_t **ptr);
 void CopyU32ToBuffer(uint32_t data, uint8_t **ptr);
-void CopyU8FromBuffer(uint8_t data, uint8_t **ptr);
+void CopyU8FromBuffer(uint8_t *data, uint8_t **ptr);
 void CopyU16FromBuffer(uint16_t *data, uint8_t **ptr);
 void CopyU24FromBuffer(uint32_t *data, uint8_t **ptr);
 void CopyU32FromBuffer(uint32_t *data, uint8_t **ptr);
@@ -20,14 +305,175 @@ void CopyU32FromBuffer(uint32_t *data, uint8_t **ptr);
 void CopyI8ToBuffer(int8_t data, uint8_t **ptr);
 void CopyI16ToBuffer(int16_t data, uint8_t **ptr);
 void CopyI32ToBuffer(int32_t data, uint8_t **ptr);
-void CopyI8FromBuffer(int8_t data, uint8_t **ptr);
+void CopyI8FromBuffer(int8_t *data, uint8_t **ptr);
 void CopyI16FromBuffer(int16_t *data, uint8_t **ptr);
 void CopyI32FromBuffer(int32_t *data, uint8_t **ptr);
 
+//Variable-length encoding (LEB128 and zigzag)
+uint8_t CopyVarintToBuffer(uint32_t data, uint8_t **ptr);
+uint8_t CopyVarintFromBuffer(uint32_t *data, uint8_t **ptr);
+uint8_t CopyZigzagToBuffer(int32_t data, uint8_t **ptr);
+uint8_t CopyZigzagFromBuffer(int32_t *data, uint8_t **ptr);
+uint8_t VarintSize(const uint8_t *ptr);
+
+//Integer-only string formatting
+uint8_t FormatUnsigned(char *str, uint8_t size, uint32_t value, uint32_t scaler, uint8_t decimals);
+uint8_t FormatSigned(char *str, uint8_t size, int32_t value, uint32_t scaler, uint8_t decimals);
+uint8_t FormatString(char *str, uint8_t size, const char *src);
+
 void SetBitByPosition(void *ptr, uint8_t pos);
 void ClearBitByPosition(void *ptr, uint8_t pos);
 bool GetBitByPosition(void *ptr, uint8_t pos);
 
+#endif //LOGJAM_PRIMITIVE
+
+/*
+Byte order of the target, if it is known at compile time
+Define LOGJAM_BIG_ENDIAN or LOGJAM_LITTLE_ENDIAN to override the automatic detection
+*/
+#if !defined(LOGJAM_BIG_ENDIAN) && !defined(LOGJAM_LITTLE_ENDIAN) && defined(__BYTE_ORDER__)
+#if __BYTE_ORDER__ == __ORDER_BIG_ENDIAN__
+#define LOGJAM_BIG_ENDIAN
+#elif __BYTE_ORDER__ == __ORDER_LITTLE_ENDIAN__
+#define LOGJAM_LITTLE_ENDIAN
+#endif
+#endif
+
+/*
+Bulk copies (memcpy plus an in-place byte swap) of contiguous struct members
+These are used by the generated code when the byte order is known (define LOGJAM_NO_BULK_COPY to disable)
+SwapBytes16/32 convert a big-endian (buffer) value to/from the native byte order, in place
+*/
+#if !defined(LOGJAM_NO_BULK_COPY)
+#if defined(LOGJAM_BIG_ENDIAN)
+#define LOGJAM_BULK_COPY
+#define SwapBytes16(p)
+#define SwapBytes32(p)
+#elif defined(LOGJAM_LITTLE_ENDIAN) && (defined(__GNUC__) || defined(__clang__))
+#define LOGJAM_BULK_COPY
+static inline void SwapBytes16(void *p)
+{
+    uint16_t x;
+    memcpy(&x, p, 2);
+    x = __builtin_bswap16(x);
+    memcpy(p, &x, 2);
+}
+
+static inline void SwapBytes32(void *p)
+{
+    uint32_t x;
+    memcpy(&x, p, 4);
+    x = __builtin_bswap32(x);
+    memcpy(p, &x, 4);
+}
+#endif
+#endif
+
+//Descriptor for a variable in a logging data struct (used by the table-driven codec)
+typedef struct
+{
+    uint16_t offset;    //Offset of the variable within the data struct
+    uint8_t bytes;      //Size of the variable (bytes)
+    uint8_t flags;      //LOG_FIELD_x flags
+} LogField_t;
+
+//LogField_t flags
+#define LOG_FIELD_SIGNED    0x01 //Variable is signed
+#define LOG_FIELD_VARINT    0x02 //Variable is LEB128 encoded in the buffer
+#define LOG_FIELD_ZIGZAG    0x04 //Variable is zigzag (then LEB128) encoded in the buffer
+
+//Table-driven copy of variables to/from a buffer
+//If selection is NULL, all variables are copied, else only those whose selection bit is set
+//Each function returns the number of bytes copied, and the pointer is auto-incremented
+uint8_t CopyFieldToBuffer(const LogField_t *field, const void *data, uint8_t **ptr);
+uint8_t CopyFieldFromBuffer(const LogField_t *field, void *data, uint8_t **ptr);
+uint16_t CopyFieldsToBuffer(const LogField_t *fields, uint16_t count, const void *data, const void *selection, uint8_t **ptr);
+uint16_t CopyFieldsFromBuffer(const LogField_t *fields, uint16_t count, void *data, const void *selection, uint8_t **ptr);
+
+//Descriptor for a variable in a logging data struct, including how its value is shown as a string
+typedef struct
+{
+    LogField_t field;   //Location, size and signedness of the variable
+    uint32_t scaler;    //Value is divided by the scaler when shown as a string
+    uint8_t decimals;   //Number of decimal places shown (for scaled values)
+} LogValueField_t;
+
+//Value of a variable (described by a LogField_t) in a data struct
+//Signed values are sign-extended to 32 bits, unsigned values are zero-extended
+uint32_t GetFieldValue(const LogField_t *field, const void *data);
+
+//Format the value of a variable (described by a LogValueField_t) into a string, with integer arithmetic
+//At most size-1 characters are written, returns the length of the string
+uint8_t FormatField(const LogValueField_t *field, const void *data, char *str, uint8_t size);
+
+/*
+Batched event blocks
+Consecutive events are grouped into a block with a single header, rather than each event being written on its own:
+[LOG_EVENT_BLOCK_ID] [count (1 byte)] [base timestamp (4 bytes)]
+followed by each event:
+[timestamp offset from the base (2 bytes)] [event id] [event variables]
+*/
+
+//Generic event id (0x00 -> 0x7F) marking the start of an event block
+#define LOG_EVENT_BLOCK_ID          0x7F
+
+//Size of the block header, and of the header for each event in a block (not including the event id)
+#define LOG_EVENT_BLOCK_HEADER_BYTES    6
+#define LOG_EVENT_BLOCK_EVENT_BYTES     2
+
+//Maximum number of events in a block
+#define LOG_EVENT_BLOCK_MAX_EVENTS      255
+
+//Function called with each complete block (e.g. to write it to flash)
+typedef void (*LogEventBlockFlush_t)(const uint8_t *block, uint16_t length);
+
+//Function called for each event decoded from a block, event points to the event id
+typedef void (*LogEventBlockFunc_t)(void *arg, uint8_t id, uint32_t timestamp, uint8_t *event);
+
+//Function returning the size of an event (including the id) or 0 if the id is unknown
+typedef uint8_t (*LogEventSize_t)(uint8_t id);
+
+typedef struct
+{
+    uint8_t *buffer;            //Block buffer (provided by the application)
+    uint16_t capacity;          //Size of the block buffer
+    uint16_t length;            //Number of bytes in the block (0 if the block is empty)
+    uint8_t count;              //Number of events in the block
+    uint32_t timestamp;         //Base timestamp of the block
+    LogEventBlockFlush_t flush; //Function called with each complete block
+} LogEventBlock_t;
+
+void LogEventBlockInit(LogEventBlock_t *block, uint8_t *buffer, uint16_t capacity, LogEventBlockFlush_t flush);
+uint8_t* LogEventBlockReserve(LogEventBlock_t *block, uint32_t timestamp, uint8_t size);
+void LogEventBlockFlush(LogEventBlock_t *block);
+int16_t LogEventBlockDecode(const uint8_t *block, uint16_t length, LogEventSize_t eventSize, LogEventBlockFunc_t fn, void *arg);
+
+//Offset of a variable in a frame (from the first variable), given its selection bit position and,
+//for each selection byte, a table of the total size of the variables selected by each bit pattern
+uint16_t FrameVariableOffset(const uint8_t *selection, const uint8_t * const *tables, uint16_t pos);
+
+//Count the trailing zero bits in a (non-zero) 32-bit word
+//(__builtin_ctz takes an unsigned int, which may only be 16 bits, so the unsigned long version is used)
+#if defined(__GNUC__) || defined(__clang__)
+#define CountTrailingZeros32(x) ((uint8_t) __builtin_ctzl((unsigned long) (x)))
+#else
+uint8_t CountTrailingZeros32(uint32_t x);
+#endif
+
+/*
+Memory barrier used by the generated frame ring buffers, so that a frame is completely written before it is published
+Define LOGJAM_MEMORY_BARRIER() to override (e.g. with a compiler-only barrier on a single-core target)
+There is no default for other compilers without C11 atomics - the ring buffers will not compile until it is defined
+*/
+#ifndef LOGJAM_MEMORY_BARRIER
+#if defined(__GNUC__) || defined(__clang__)
+#define LOGJAM_MEMORY_BARRIER() __sync_synchronize()
+#elif defined(__STDC_VERSION__) && (__STDC_VERSION__ >= 201112L) && !defined(__STDC_NO_ATOMICS__)
+#include <stdatomic.h>
+#define LOGJAM_MEMORY_BARRIER() atomic_thread_fence(memory_order_seq_cst)
+#endif
+#endif
+
 #endif //_LOGJAM_COMMON_H_
 
 
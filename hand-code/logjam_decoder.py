@@ -0,0 +1,229 @@
+"""
+LogJam host-side decoder
+Decodes the frames produced by Log<Prefix>_CopyDataToBuffer() and the events produced by Log<Prefix>_EventAdd_<Name>()
+
+The logging structure is described by the generated log_<prefix>_defs.py module (generated with the --python option),
+which creates a LogDecoder for the structure.
+
+Frame layout (multi-byte values are big-endian):
+[selection bits] [keyframe flag (if there are delta variables)] [each selected variable, in order]
+
+Event layout:
+[event id (0x80 + n)] [each event variable, in order]
+"""
+
+import struct
+
+from collections import namedtuple
+from functools import lru_cache
+
+#description of a variable in the logging structure
+#name - name of the variable (in the generated data struct)
+#format - struct module format character
+#scaler - the value is divided by the scaler for display
+#units - units string
+#title - title string
+#encoding - variable-length encoding ('varint', 'zigzag') or None
+#delta - the variable is stored as the difference from the previous value
+LogVariableInfo = namedtuple('LogVariableInfo', 'name format scaler units title encoding delta')
+
+#description of an event
+#name - name of the event
+#variables - list of LogVariableInfo for the event variables (which are never encoded)
+LogEventInfo = namedtuple('LogEventInfo', 'name variables')
+
+#id of the first event (ids 0x00 -> 0x7F are *generic* events)
+EVENT_ID_START = 0x80
+
+#number of selection cache entries (one for each distinct selection bitfield)
+CACHE_SIZE = 256
+
+#number of bits in each struct format
+FORMAT_BITS = {'b' : 8, 'B' : 8, 'h' : 16, 'H' : 16, 'i' : 32, 'I' : 32}
+
+#convert an integer to the (wrapped) value of a given struct format
+def wrapValue(value, fmt):
+    bits = FORMAT_BITS[fmt]
+
+    value &= (1 << bits) - 1
+
+    if fmt.islower() and value >= (1 << (bits - 1)):
+        value -= 1 << bits
+
+    return value
+
+#read a LEB128 encoded value from a buffer
+#returns (value, offset of the next byte)
+def readVarint(buffer, offset):
+    value = 0
+    shift = 0
+
+    while True:
+        byte = buffer[offset]
+        offset += 1
+
+        value |= (byte & 0x7F) << shift
+        shift += 7
+
+        if byte < 0x80:
+            return value, offset
+
+#state kept between frames (for reconstructing delta variables)
+class LogContext:
+    def __init__(self):
+        self.reset()
+
+    #forget the previous values (delta variables cannot be reconstructed until the next keyframe)
+    def reset(self):
+        self.synced = False
+        self.previous = {}
+
+class LogDecoder:
+    #prefix - name of the logging structure
+    #variables - list of LogVariableInfo, in selection bit order
+    #events - dict of {event id: LogEventInfo}
+    #cacheSize - number of distinct selection bitfields for which the decoding plan is kept
+    def __init__(self, prefix, variables, events=None, cacheSize=CACHE_SIZE):
+        self.prefix = prefix
+        self.variables = variables
+        self.events = events if events else {}
+
+        self.selectionBytes = (len(variables) + 7) // 8
+        self.keyframeBytes = 1 if any([v.delta for v in variables]) else 0
+        self.headerBytes = self.selectionBytes + self.keyframeBytes
+
+        self.context = LogContext()
+
+        #one compiled plan per selection bitfield
+        self.selectionPlan = lru_cache(maxsize=cacheSize)(self.createSelectionPlan)
+
+        self.eventStructs = {}
+
+        for id, evt in self.events.items():
+            self.eventStructs[id] = struct.Struct('>' + ''.join([v.format for v in evt.variables]))
+
+    #indices of the variables selected by a selection bitfield
+    def selectedVariables(self, selection):
+        return [i for i in range(len(self.variables)) if selection[i // 8] & (1 << (i % 8))]
+
+    """
+    Compile the decoding plan for a selection bitfield (bytes)
+    Returns a tuple of steps, each step is either:
+    (struct.Struct, (variable, ...)) - a run of fixed-size variables, unpacked with a single call
+    (None, variable) - a single variable-length encoded variable
+    A selection without any encoded variables is a single struct.Struct
+    """
+    def createSelectionPlan(self, selection):
+        steps = []
+        run = []
+
+        for i in self.selectedVariables(selection):
+            var = self.variables[i]
+
+            if var.encoding:
+                if run:
+                    steps.append((struct.Struct('>' + ''.join([v.format for v in run])), tuple(run)))
+                    run = []
+
+                steps.append((None, var))
+            else:
+                run.append(var)
+
+        if run:
+            steps.append((struct.Struct('>' + ''.join([v.format for v in run])), tuple(run)))
+
+        return tuple(steps)
+
+    """
+    Decode a frame
+    buffer - bytes-like object containing the frame
+    offset - position of the frame in the buffer
+    context - LogContext for delta variables (defaults to the decoder's own context, so frames must be decoded in order)
+    scaled - divide the value of each variable by its scaler
+
+    Returns (values, length) where values is a dict of {name: value} for each variable in the frame
+    and length is the number of bytes in the frame
+    Delta variables are left out of the values until a keyframe has been decoded
+    """
+    def decodeFrame(self, buffer, offset=0, context=None, scaled=False):
+        start = offset
+
+        selection = bytes(buffer[offset:offset + self.selectionBytes])
+        offset += self.selectionBytes
+
+        if self.keyframeBytes:
+            keyframe = buffer[offset]
+            offset += self.keyframeBytes
+
+        values = {}
+
+        for s, item in self.selectionPlan(selection):
+            if s is not None:
+                values.update(zip([v.name for v in item], s.unpack_from(buffer, offset)))
+                offset += s.size
+            else:
+                value, offset = readVarint(buffer, offset)
+
+                if item.encoding == 'zigzag':
+                    value = (value >> 1) ^ -(value & 1)
+
+                values[item.name] = wrapValue(value, item.format)
+
+        length = offset - start
+
+        if self.keyframeBytes:
+            self.reconstructDeltas(values, keyframe, context if context else self.context)
+
+        if scaled:
+            values = self.scaleValues(values)
+
+        return values, length
+
+    #reconstruct the delta variables from the previous values (in place)
+    def reconstructDeltas(self, values, keyframe, context):
+        if keyframe:
+            context.synced = True
+            context.previous = {}
+
+        for var in self.variables:
+            if not var.delta or var.name not in values:
+                continue
+
+            if context.synced:
+                values[var.name] = wrapValue(values[var.name] + context.previous.get(var.name, 0), var.format)
+                context.previous[var.name] = values[var.name]
+            else:
+                del values[var.name]
+
+    #divide each value by the scaler of its variable
+    def scaleValues(self, values):
+        scaled = {}
+
+        for var in self.variables:
+            if var.name in values:
+                scaled[var.name] = values[var.name] / var.scaler if var.scaler > 1 else values[var.name]
+
+        return scaled
+
+    #size of an event (including the event id), or None if the id is not an event of this logging structure
+    def eventSize(self, id):
+        s = self.eventStructs.get(id)
+
+        return None if s is None else 1 + s.size
+
+    """
+    Decode an event
+    Returns (name, values, length) where values is a dict of {name: value} for each event variable
+    and length is the number of bytes in the event (including the id)
+    Returns None if the id is not an event of this logging structure
+    """
+    def decodeEvent(self, buffer, offset=0):
+        id = buffer[offset]
+        s = self.eventStructs.get(id)
+
+        if s is None:
+            return None
+
+        evt = self.events[id]
+
+        return evt.name, dict(zip([v.name for v in evt.variables], s.unpack_from(buffer, offset + 1))), 1 + s.size
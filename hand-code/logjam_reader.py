@@ -0,0 +1,264 @@
+"""
+LogJam streaming reader
+Reads frames and events from a (possibly very large) log file, without loading the file into memory
+
+The file is memory-mapped, and records are decoded lazily (one at a time, as they are iterated over) straight from
+the mapped memory, so the memory used does not depend on the size of the file:
+
+    import log_example_defs as example
+    from logjam_reader import LogReader
+
+    with LogReader('dump.bin', example.decoder, example.FRAMING, example.MAX_FRAME_BYTES) as reader:
+        for record in reader.records():
+            ...
+
+frames() - a file of frames (as produced by Log<Prefix>_CopyDataToBuffer(), or Log<Prefix>_FrameData() if framed)
+events() - a file of events (as produced by Log<Prefix>_EventAdd_<Name>()), including batched event blocks
+records() - a file of framed frames mixed with events (requires framing, so that frames can be told apart from events)
+"""
+
+import mmap
+import struct
+
+from collections import namedtuple
+
+from logjam_decoder import LogContext
+from logjam_framing import FRAME_SYNC, SYNC_BYTES, LENGTH_BYTES, HEADER_BYTES, checkFraming, checkFrame, crcBytes, scanFrames
+
+#a record read from a log file
+#kind - 'frame' or 'event'
+#offset - position of the record in the file
+#length - number of bytes in the record
+#name - name of the event (None for a frame)
+#values - dict of {name: value} for each variable in the record
+#timestamp - timestamp of an event from an event block (otherwise None)
+LogRecord = namedtuple('LogRecord', 'kind offset length name values timestamp')
+
+#batched event blocks (see logjam_common.h)
+EVENT_BLOCK_ID = 0x7F
+EVENT_BLOCK_HEADER_BYTES = 6
+EVENT_BLOCK_EVENT_BYTES = 2
+
+class LogReader:
+    #path - file to read
+    #decoder - LogDecoder for the logging structure (e.g. log_<prefix>_defs.decoder)
+    #framing - the framing used for the frames (e.g. log_<prefix>_defs.FRAMING), or None if the frames are not framed
+    #maxLength - longest valid frame (e.g. log_<prefix>_defs.MAX_FRAME_BYTES), required if the frames are framed
+    def __init__(self, path, decoder, framing=None, maxLength=None):
+        self.decoder = decoder
+        self.framing = framing
+        self.maxLength = maxLength
+
+        if framing:
+            checkFraming(framing)
+
+            if maxLength is None:
+                raise ValueError("The longest valid frame (maxLength) is required to read framed frames")
+
+        #number of bytes that could not be decoded (and were skipped over)
+        self.skipped = 0
+
+        #delta variables are reconstructed through the reader's own context (the decoder's context is not used or changed)
+        self.context = LogContext()
+
+        self.file = open(path, 'rb')
+
+        #an empty file cannot be mapped
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size() > 0 else b''
+        self.view = memoryview(self.map)
+
+        #the file is read from start to end, so pages can be read ahead (and dropped once they have been read)
+        if isinstance(self.map, mmap.mmap) and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+
+    def size(self):
+        return self.file.seek(0, 2)
+
+    #unmap and close the file (any generators from this reader must be finished, or closed, first)
+    def close(self):
+        self.view.release()
+
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    #skip over bytes that could not be decoded
+    #frames may have been lost, so delta variables are left out until the next keyframe
+    def skip(self, n):
+        if n > 0:
+            self.skipped += n
+            self.context.reset()
+
+    #decode a framed frame (of a given length, including the framing) at a given offset
+    def decodeFramedFrame(self, offset, length):
+        values = self.decoder.decodeFrame(self.view, offset + HEADER_BYTES, self.context)[0]
+
+        return LogRecord('frame', offset, length, None, values, None)
+
+    """
+    Yield a LogRecord for each frame in the file
+    Unframed frames must be consecutive (a corrupted frame will desynchronise the rest of the file)
+    Framed frames are found with logjam_framing.scanFrames(), so corrupted data is skipped over
+    Delta variables are left out after any skipped bytes, until the next keyframe
+    """
+    def frames(self):
+        if self.framing:
+            end = 0
+
+            for offset, frame in scanFrames(self.map, self.framing, self.maxLength):
+                self.skip(offset - end)
+                end = offset + len(frame) + HEADER_BYTES + crcBytes(self.framing)
+
+                frame.release()
+
+                yield self.decodeFramedFrame(offset, end - offset)
+
+            self.skip(len(self.view) - end)
+        else:
+            offset = 0
+
+            while offset < len(self.view):
+                try:
+                    values, length = self.decoder.decodeFrame(self.view, offset, self.context)
+                except (IndexError, struct.error):
+                    #the last frame is incomplete
+                    self.skip(len(self.view) - offset)
+                    return
+
+                yield LogRecord('frame', offset, length, None, values, None)
+
+                offset += length
+
+    #decode the event (or event block) at a given offset
+    #returns a list of LogRecord (one for each event in a block), or None if the id is not a known event
+    def decodeEvents(self, offset):
+        id = self.view[offset]
+
+        if id == EVENT_BLOCK_ID:
+            return self.decodeEventBlock(offset)
+
+        size = self.decoder.eventSize(id)
+
+        if size is None or offset + size > len(self.view):
+            return None
+
+        name, values, length = self.decoder.decodeEvent(self.view, offset)
+
+        return [LogRecord('event', offset, length, name, values, None)]
+
+    #decode each event in a batched event block
+    #returns None if the block is not valid
+    def decodeEventBlock(self, offset):
+        if offset + EVENT_BLOCK_HEADER_BYTES > len(self.view):
+            return None
+
+        count = self.view[offset + 1]
+        base = int.from_bytes(self.view[offset + 2:offset + EVENT_BLOCK_HEADER_BYTES], 'big')
+
+        records = []
+        pos = offset + EVENT_BLOCK_HEADER_BYTES
+
+        for i in range(count):
+            if pos + EVENT_BLOCK_EVENT_BYTES + 1 > len(self.view):
+                return None
+
+            timestamp = base + int.from_bytes(self.view[pos:pos + EVENT_BLOCK_EVENT_BYTES], 'big')
+            pos += EVENT_BLOCK_EVENT_BYTES
+
+            size = self.decoder.eventSize(self.view[pos])
+
+            if size is None or pos + size > len(self.view):
+                return None
+
+            name, values, length = self.decoder.decodeEvent(self.view, pos)
+
+            records.append(LogRecord('event', pos, length, name, values, timestamp))
+            pos += length
+
+        return records
+
+    """
+    Yield a LogRecord for each event in the file
+    Events in an event block are yielded individually (with their timestamp)
+    Raises ValueError if an unknown event id is found (the size of an unknown event is not known, so the rest of the file cannot be read)
+    """
+    def events(self):
+        offset = 0
+
+        while offset < len(self.view):
+            records = self.decodeEvents(offset)
+
+            if records is None:
+                raise ValueError("Unknown event 0x{id:02X} at offset {offset}".format(id=self.view[offset], offset=offset))
+
+            for record in records:
+                yield record
+
+            offset = records[-1].offset + records[-1].length if records else offset + EVENT_BLOCK_HEADER_BYTES
+
+    #is there a corrupted frame at a given offset (a sync word followed by a plausible length, but not a valid frame)
+    def isCorruptedFrame(self, offset):
+        if self.view[offset:offset + SYNC_BYTES] != FRAME_SYNC.to_bytes(SYNC_BYTES, 'big'):
+            return False
+
+        length = self.view[offset + SYNC_BYTES:offset + HEADER_BYTES]
+
+        return len(length) == LENGTH_BYTES and int.from_bytes(length, 'big') <= self.maxLength
+
+    #offset of the next valid frame after a given offset (or the end of the file if there are no more frames)
+    def nextFrame(self, offset):
+        for pos, frame in scanFrames(self.map, self.framing, self.maxLength, start=offset + 1):
+            frame.release()
+
+            return pos
+
+        return len(self.view)
+
+    """
+    Yield a LogRecord for each frame and event in a file of framed frames mixed with events
+    Bytes which are neither a valid frame nor a known event are skipped over
+    A corrupted frame is skipped (as a whole) up to the next valid frame, so that bytes inside it are never mistaken for
+    events. Any events between a corrupted frame and the next valid frame are skipped too (and counted in skipped)
+    """
+    def records(self):
+        if not self.framing:
+            raise ValueError("Frames must be framed to be read alongside events")
+
+        offset = 0
+
+        while offset < len(self.view):
+            length = checkFrame(self.view, offset, self.framing, self.maxLength)
+
+            if length is not None:
+                length += HEADER_BYTES + crcBytes(self.framing)
+
+                yield self.decodeFramedFrame(offset, length)
+
+                offset += length
+                continue
+
+            if self.isCorruptedFrame(offset):
+                end = self.nextFrame(offset)
+
+                self.skip(end - offset)
+                offset = end
+                continue
+
+            records = self.decodeEvents(offset)
+
+            if records is None:
+                self.skip(1)
+                offset += 1
+                continue
+
+            for record in records:
+                yield record
+
+            offset = records[-1].offset + records[-1].length if records else offset + EVENT_BLOCK_HEADER_BYTES
@@ -10,9 +10,94 @@ from logjam_version import LOGJAM_VERSION, AutogenString
 from logjam_common import *
 
 from logjam_element import LogVariable, LogEvent
+
+from logjam_profile import LogProfiler
+
+import logjam_framing
+
+#codecs for copying data to/from a buffer
+#unrolled - one function call per variable (fastest, code size grows with the number of variables)
+#table - a const table of variable descriptors, copied by generic loops in logjam_common.c (smallest)
+CODECS = ['unrolled', 'table']
+
+#rough code size estimates (bytes, for a typical 32-bit MCU) used to compare the codecs
+#these are only intended to give an idea of the trade-off for a given schema
+UNROLLED_CALL_BYTES = 10    #a single Copy...Buffer() call (load arguments, branch)
+UNROLLED_TEST_BYTES = 10    #testing a single selection bit
+TABLE_FIELD_BYTES = 4       #a single LogField_t entry
+TABLE_CALL_BYTES = 16       #a call to one of the CopyFields...Buffer() loops
+TABLE_LOOP_BYTES = 320      #CopyField(s)...Buffer() functions (shared between all schemas)
+
+#rough per-variable copy cost (relative to an unrolled call)
+TABLE_RELATIVE_COST = 2.0
+
+#default number of frames between keyframes (for delta variables)
+KEYFRAME_INTERVAL = 32
+
+#size of the keyframe flag stored after the selection bits (for delta variables)
+KEYFRAME_FLAG_BYTES = 1
+
+#default number of frames in a ring buffer
+RING_FRAMES = 8
+
+#id of the first event (ids 0x00 -> 0x7F are *generic* events)
+EVENT_ID_START = '0x80'
     
 class LogFile:
-    def __init__(self, prefix, version, sourceFile, vars=None, events=None, outputdir=None):
+
+    #generator sections that are recorded in profiling mode
+    PROFILE_SECTIONS = [
+        'createDataStruct',
+        'createCopyTables',
+        'createFieldTable',
+        'createSelectionSizeTables',
+        'createFrameOffsetTables',
+        'createStringTables',
+        'createResetFunction',
+        'createResetContextFunction',
+        'createCopyAllToFunction',
+        'createCopyDataToFunction',
+        'createCopyAllFromFunction',
+        'createCopyDataFromFunction',
+        'getSelectionSizeFunction',
+        'encodeSelectedFunction',
+        'createFrameAccessor',
+        'createRingFunctions',
+        'createFramingFunctions',
+        'createAdditionFunction',
+        'createDecodeFunction',
+        'copyVarToBuffer',
+        'copyVarFromBuffer',
+        'bulkCopyRun',
+        'createCaseEnumeration',
+        'titleByIndexFunction',
+        'unitsByIndexFunction',
+        'valueByIndexFunction',
+        'addEventCopyFuncs',
+        'createEventTables',
+        'eventSizeFunction',
+        'addEventBlockFunc',
+        'decodeEventBlockFunction',
+        'eventsToStringFunction',
+        'eventToStringFunc',
+        'constructPythonFile',
+        ]
+    
+    #stream - write the generated files out incrementally rather than building them in memory
+    #srcHash - hash of the source file, stamped into the generated files in place of the time (deterministic output)
+    #profile - record the time taken and bytes generated by each section of the generator
+    #bitIteration - only visit the *set* selection bits when copying data or measuring the selection size
+    #codec - method for copying data to/from a buffer (see CODECS)
+    #bulkCopy - copy runs of contiguous struct members with a single memcpy (when the target byte order is known)
+    #sizeTables - calculate the selection size with a lookup table per selection byte
+    #ring - generate a single-producer / single-consumer ring buffer of frames
+    #eventBlocks - generate functions for batching events into blocks
+    #frameAccessors - generate functions for reading individual variables straight from an encoded frame
+    #integerFormat - format values into strings with integer arithmetic (rather than sprintf), into a buffer of a given size
+    #stringTables - look up titles, units and values by index in const tables (rather than a switch statement)
+    #framing - wrap frames with a sync word, length and CRC (see logjam_framing.FRAMINGS), or None
+    #pythonDecoder - also generate a python module for decoding frames and events on the host
+    def __init__(self, prefix, version, sourceFile, vars=None, events=None, outputdir=None, stream=False, srcHash=None, profile=False, bitIteration=False, codec='unrolled', bulkCopy=False, sizeTables=False, ring=False, eventBlocks=False, frameAccessors=False, integerFormat=False, stringTables=False, framing=None, pythonDecoder=False):
         
         if not vars:
             vars = []
@@ -26,6 +111,27 @@ class LogFile:
         self.prefix = prefix
         self.version = version
         self.source = sourceFile
+        self.srcHash = srcHash
+        
+        self.bitIteration = bitIteration
+        
+        if codec not in CODECS:
+            raise ValueError("Codec '{c}' is not one of {codecs}".format(c=codec, codecs=', '.join(CODECS)))
+        
+        self.codec = codec
+        
+        self.bulkCopy = bulkCopy
+        self.sizeTables = sizeTables
+        self.ring = ring
+        self.eventBlocks = eventBlocks
+        self.frameAccessors = frameAccessors
+        self.integerFormat = integerFormat
+        self.stringTables = stringTables
+        
+        if framing:
+            logjam_framing.checkFraming(framing)
+            
+        self.framing = framing
         
         hfile = headerFileName(prefix) + '.h'
         cfile = headerFileName(prefix) + '.c'
@@ -34,20 +140,51 @@ class LogFile:
             hfile = os.path.join(outputdir, hfile)
             cfile = os.path.join(outputdir, cfile)
         
-        self.hFile = CodeWriter(hfile)
-        self.cFile = CodeWriter(cfile)
+        self.hFile = CodeWriter(hfile, stream=stream)
+        self.cFile = CodeWriter(cfile, stream=stream)
+        
+        self.pythonDecoder = pythonDecoder
+        self.pyFile = None
+        
+        if pythonDecoder:
+            pyfile = headerFileName(prefix) + '.py'
+            
+            if outputdir:
+                pyfile = os.path.join(outputdir, pyfile)
+                
+            self.pyFile = CodeWriter(pyfile, stream=stream)
+        
+        self.profiler = None
+        
+        if profile:
+            self.profiler = LogProfiler(self.codeFiles())
+            
+            for name in self.PROFILE_SECTIONS:
+                setattr(self, name, self.profiler.wrap(name, getattr(self, name)))
         
     def constructCodeFile(self):
         
         self.cFile.clear()
         
-        self.cFile.append(AutogenString(self.source))
+        self.cFile.append(AutogenString(self.source, self.srcHash))
         
         #include the header file
         self.cFile.include('"{file}.h"'.format(file=headerFileName(self.prefix)))
         
         self.cFile.appendLine()
         
+        if self.codec == 'table':
+            self.createFieldTable()
+        
+        if self.bitIteration:
+            self.createCopyTables()
+            
+        if self.sizeTables or (self.frameAccessors and not self.hasVariableLengthVariables()):
+            self.createSelectionSizeTables()
+            
+        if self.frameAccessors:
+            self.createFrameOffsetTables()
+        
         #add in the global functions
         self.cFile.startComment()
         self.cFile.appendLine("Global functions")
@@ -56,11 +193,20 @@ class LogFile:
         self.cFile.appendLine()
         
         self.createResetFunction()
+        if self.hasDeltaVariables():
+            self.createResetContextFunction()
         self.createCopyAllToFunction()
         self.createCopyDataToFunction()
         self.createCopyAllFromFunction()
         self.createCopyDataFromFunction()
         self.getSelectionSizeFunction()
+        self.encodeSelectedFunction()
+        
+        if self.ring:
+            self.createRingFunctions()
+            
+        if self.framing:
+            self.createFramingFunctions()
         
         self.cFile.appendLine()
         self.cFile.startComment()
@@ -69,11 +215,31 @@ class LogFile:
         
         self.cFile.appendLine()
         
-        #add in the functions to add variables
+        #add in the functions to add variables (these are in the header if LOGJAM_INLINE is defined)
+        self.cFile.startIf('LOGJAM_INLINE', invert=True)
+        self.cFile.appendLine()
+        
         for v in self.variables:
             self.createAdditionFunction(v)
+            
+        self.cFile.endIf()
+        
+        #add in the functions to decode variables
+        for v in self.variables:
             self.createDecodeFunction(v)
+            
+        if self.frameAccessors:
+            self.cFile.startComment()
+            self.cFile.appendLine('Functions for reading individual variables straight from an encoded frame')
+            self.cFile.finishComment()
+            self.cFile.appendLine()
+            
+            for v in self.variables:
+                self.createFrameAccessor(v)
        
+        if self.stringTables:
+            self.createStringTables()
+            
         self.titleByIndexFunction()
         self.unitsByIndexFunction()
         self.valueByIndexFunction()
@@ -85,6 +251,17 @@ class LogFile:
             for e in self.events:
                 self.addEventCopyFuncs(e)
                 
+            self.createEventTables()
+            self.eventSizeFunction()
+            
+            if self.eventBlocks:
+                self.cFile.appendLine(comment='Functions to add *events* to a batched event block')
+                
+                for e in self.events:
+                    self.addEventBlockFunc(e)
+                    
+                self.decodeEventBlockFunction()
+                
             self.cFile.appendLine(comment='Decode a {pref} event to a string'.format(pref=self.prefix))
             self.eventsToStringFunction()
             
@@ -93,11 +270,74 @@ class LogFile:
             for e in self.events:
                 self.eventToStringFunc(e)
        
+    #python module describing the logging structure, for decoding frames and events on the host
+    #the decoding itself is done by hand-code/logjam_decoder.py
+    def constructPythonFile(self):
+        
+        self.pyFile.clear()
+        
+        self.pyFile.append(AutogenString(self.source, self.srcHash, python=True))
+        
+        self.pyFile.appendLine('"""')
+        self.pyFile.appendLine("Decoder for the '{pref}' logging structure (version {v})".format(pref=self.prefix, v=self.version))
+        self.pyFile.appendLine('"""')
+        self.pyFile.appendLine()
+        self.pyFile.appendLine('from logjam_decoder import LogDecoder, LogVariableInfo, LogEventInfo')
+        self.pyFile.appendLine()
+        self.pyFile.appendLine('PREFIX = {p!r}'.format(p=self.prefix))
+        self.pyFile.appendLine('VERSION = {v!r}'.format(v=self.version))
+        self.pyFile.appendLine()
+        self.pyFile.appendLine('#number of bytes used for the selection bits')
+        self.pyFile.appendLine('SELECTION_BYTES = {n}'.format(n=bitfieldSize(len(self.variables))))
+        self.pyFile.appendLine()
+        self.pyFile.appendLine('#maximum number of bytes required to store a frame (selection bits and data)')
+        self.pyFile.appendLine('MAX_FRAME_BYTES = {n}'.format(n=self.maxFrameBytes()))
+        self.pyFile.appendLine()
+        self.pyFile.appendLine('#frame sync and CRC (see logjam_framing.py), or None if frames are not framed')
+        self.pyFile.appendLine('FRAMING = {f!r}'.format(f=self.framing))
+        self.pyFile.appendLine()
+        
+        self.pyFile.appendLine('#variables, in selection bit order')
+        self.pyFile.appendLine('VARIABLES = [')
+        for v in self.variables:
+            self.pyFile.appendLine('    {info},'.format(info=self.variableInfo(v)))
+        self.pyFile.appendLine('    ]')
+        self.pyFile.appendLine()
+        
+        self.pyFile.appendLine('#events, by event id')
+        self.pyFile.appendLine('EVENTS = {')
+        for i,e in enumerate(self.events):
+            self.pyFile.appendLine('    0x{id:02X} : LogEventInfo({name!r}, [{vars}]),'.format(
+                id=int(EVENT_ID_START, 16) + i,
+                name=e.name,
+                vars=', '.join([self.variableInfo(v) for v in e.variables])))
+        self.pyFile.appendLine('    }')
+        self.pyFile.appendLine()
+        
+        self.pyFile.appendLine('decoder = LogDecoder(PREFIX, VARIABLES, EVENTS)')
+        self.pyFile.appendLine()
+        self.pyFile.appendLine('#decode a frame, returns (values, length)')
+        self.pyFile.appendLine('decodeFrame = decoder.decodeFrame')
+        self.pyFile.appendLine()
+        self.pyFile.appendLine('#decode an event, returns (name, values, length) or None if the id is not a {pref} event'.format(pref=self.prefix))
+        self.pyFile.appendLine('decodeEvent = decoder.decodeEvent')
+        
+    #LogVariableInfo for a variable (in the python decoder module)
+    def variableInfo(self, var):
+        return 'LogVariableInfo({name!r}, {fmt!r}, {scaler}, {units!r}, {title!r}, {enc!r}, {delta})'.format(
+            name=var.name,
+            fmt=var.structFormat(),
+            scaler=var.scaler,
+            units=var.units,
+            title=var.title,
+            enc=var.encoding,
+            delta=var.delta)
+            
     def constructHeaderFile(self):
         
         self.hFile.clear()
         
-        self.hFile.append(AutogenString(self.source))
+        self.hFile.append(AutogenString(self.source, self.srcHash))
         
         self.hFile.startIf(headerDefineName(self.prefix),invert=True)
         self.hFile.define(headerDefineName(self.prefix))
@@ -139,19 +379,35 @@ class LogFile:
         self.hFile.appendLine(comment="Data struct definition for the " + self.prefix + " logging struct")
         self.createDataStruct()
         
-        #total data size
-        d_size = sum([v.bytes for v in self.variables])
+        #total data size (variable-length encoded variables are counted at their maximum size)
+        d_size = sum([v.maxBytes() for v in self.variables])
         self.hFile.appendLine()
-        self.hFile.appendLine(comment='{n} bytes are required to store all the data parameters'.format(n=d_size))
+        self.hFile.appendLine(comment='Up to {n} bytes are required to store all the data parameters'.format(n=d_size))
         self.hFile.define('LOG_{pref}_DATA_BYTES'.format(pref=self.prefix.upper()),value=d_size)
         
         self.hFile.appendLine()
         
+        if self.hasDeltaVariables():
+            self.createContextStruct()
+            
+        self.hFile.appendLine(comment='Maximum number of bytes required to store a frame (selection bits and data)')
+        self.hFile.define(self.maxFrameBytesName(), value=self.maxFrameBytes())
+        self.hFile.appendLine()
+        
+        if self.ring:
+            self.createRingStruct()
+            
+        if self.framing:
+            self.createFramingDefines()
+        
         #events
         if len(self.events) > 0:
             self.hFile.appendLine(comment='Logging event definitions for the {the}'.format(the=self.prefix))
             self.hFile.appendLine(comment='Enumeration starts at 0x80 as *generic* events are 0x00 -> 0x7F')
-            self.hFile.createEnum('Log{pref}_EventEnum_t'.format(pref=self.prefix),[e.getEnumString() for e in self.events],start="0x80")
+            self.hFile.createEnum('Log{pref}_EventEnum_t'.format(pref=self.prefix),[e.getEnumString() for e in self.events],start=EVENT_ID_START)
+            
+            self.hFile.appendLine(comment='Number of events defined for the \'{pref}\' logging structure'.format(pref=self.prefix))
+            self.hFile.define(self.eventCountName(), value=len(self.events))
             
         self.hFile.appendLine()
         
@@ -160,7 +416,22 @@ class LogFile:
         self.hFile.appendLine(comment='Pointer is automatically incremented as required')
         #functions for the events
         for e in self.events:
-            self.hFile.appendLine('inline uint8_t {func};'.format(func=e.eventPrototype()))
+            self.hFile.appendLine('uint8_t {func};'.format(func=e.eventPrototype()))
+        
+        if len(self.events) > 0:
+            self.hFile.appendLine()
+            self.hFile.appendLine(comment='Size of an event (including the event id), or 0 if the id is not a {pref} event'.format(pref=self.prefix))
+            self.hFile.appendLine(self.eventSizePrototype() + ';')
+            
+        if self.eventBlocks and len(self.events) > 0:
+            self.hFile.appendLine()
+            self.hFile.appendLine(comment='Functions to add events to a batched event block')
+            self.hFile.appendLine(comment='Each function returns the number of bytes written to the block (0 if the event is larger than the block)')
+            for e in self.events:
+                self.hFile.appendLine('uint8_t {func};'.format(func=e.blockPrototype()))
+            self.hFile.appendLine()
+            self.hFile.appendLine(comment='Decode each event in a batched event block (returns the number of events, or -1 if the block is invalid)')
+            self.hFile.appendLine(self.decodeEventBlockPrototype() + ';')
         
         self.hFile.appendLine();
         self.hFile.appendLine(comment='Function to extract an event from a buffer, and format it as a human-readable string')
@@ -169,7 +440,7 @@ class LogFile:
         self.hFile.appendLine()
         self.hFile.appendLine(comment='Functions for turning individual events into strings')
         for e in self.events:
-            self.hFile.appendLine(e.toStringPrototype() + ';',comment='Format the {evt} event into a string'.format(evt=e.getEnumString()))
+            self.hFile.appendLine(e.toStringPrototype(bounded=self.integerFormat) + ';',comment='Format the {evt} event into a string'.format(evt=e.getEnumString()))
         
         self.hFile.appendLine()
         
@@ -180,6 +451,10 @@ class LogFile:
         self.hFile.appendLine(comment="Reset the bitfield of the logging structure")
         self.hFile.appendLine(self.resetPrototype() + ";")
         
+        if self.hasDeltaVariables():
+            self.hFile.appendLine(comment='Reset a context struct for encoding or decoding delta variables')
+            self.hFile.appendLine(self.resetContextPrototype() + ';')
+        
         self.hFile.appendLine(comment='Copy *all* data from the logging structure')
         self.hFile.appendLine(self.copyAllPrototype() + ';')
         
@@ -195,6 +470,22 @@ class LogFile:
         self.hFile.appendLine(comment='Get the total size of the selected variables')
         self.hFile.appendLine(self.getSelectionSizePrototype() + ';')
         
+        self.hFile.appendLine(comment='Copy *selected* data to a buffer of a given capacity')
+        self.hFile.appendLine(comment='Returns the number of bytes copied, or (if the buffer is too small) minus the number of bytes required')
+        self.hFile.appendLine(self.encodeSelectedPrototype() + ';')
+        
+        if self.ring:
+            self.hFile.appendLine()
+            self.hFile.appendLine(comment='Frame ring buffer functions')
+            for proto in self.ringPrototypes():
+                self.hFile.appendLine(proto + ';')
+                
+        if self.framing:
+            self.hFile.appendLine()
+            self.hFile.appendLine(comment='Frame sync and CRC functions')
+            for proto in self.framingPrototypes():
+                self.hFile.appendLine(proto + ';')
+        
         self.hFile.appendLine()
         
         self.hFile.appendLine(comment="Functions for getting variable information based on the index");
@@ -224,29 +515,77 @@ class LogFile:
                 name=var.name,
                 units=var.getUnitsString()),
                 comment='Units string for {var} variable'.format(var=var.name))
-            self.hFile.appendLine(self.additionPrototype(var) + '; //Add ' + var.name + " to the log struct")
             self.hFile.appendLine(self.decodePrototype(var) + '; //Decode ' + var.name + ' into a printable string')
+            
+            if self.frameAccessors:
+                self.hFile.appendLine(self.frameAccessorPrototype(var) + '; //Read ' + var.name + ' straight from an encoded frame')
         
         self.hFile.appendLine()
+        self.hFile.startComment()
+        self.hFile.appendLine("Functions for adding variables to the log struct")
+        self.hFile.appendLine("Define LOGJAM_INLINE to make these 'static inline', so they can be collapsed by the compiler")
+        self.hFile.finishComment()
+        self.hFile.startIf('LOGJAM_INLINE')
+        self.hFile.appendLine()
+        
+        for var in self.variables:
+            self.createAdditionFunction(var, inline=True)
+            
+        self.hFile.startElse()
+        
+        for var in self.variables:
+            self.hFile.appendLine(self.additionPrototype(var) + '; //Add ' + var.name + " to the log struct")
+            
+        self.hFile.endIf()
+        
         self.hFile.externExit()
         
         self.hFile.endIf()
     
+    #construct and write both files
+    #returns a list of the files that were actually written (unchanged files are not touched)
     def saveFiles(self):
         
         self.constructHeaderFile()
         self.constructCodeFile()
         
-        self.hFile.writeToFile()
-        self.cFile.writeToFile() 
+        return self.writeFiles()
+        
+    #the files that are generated
+    def codeFiles(self):
+        files = [self.hFile, self.cFile]
+        
+        if self.pyFile:
+            files.append(self.pyFile)
+            
+        return files
+        
+    def writeFiles(self):
+        written = []
+        
+        for f in self.codeFiles():
+            if f.writeToFile():
+                written.append(f.fname)
+                
+        return written
+        
+    #summary information about the logging structure
+    def statistics(self):
+        return {
+            'variables' : len(self.variables),
+            'events' : len(self.events),
+            'selectionBytes' : bitfieldSize(len(self.variables)),
+            'dataBytes' : sum([v.maxBytes() for v in self.variables]),
+            'codec' : self.codecEstimate(),
+            }
         
     def addEventCopyFuncs(self, e):
         #copy TO buffer
-        self.cFile.appendLine('inline uint8_t {func}'.format(func=e.eventPrototype()))
+        self.cFile.appendLine('uint8_t {func}'.format(func=e.eventPrototype()))
         self.cFile.openBrace()
         
         #copy across the event type
-        self.cFile.appendLine('*(*ptr++) = {evt};'.format(evt=e.getEnumString()),comment='Copy the event type to the buffer')
+        self.cFile.appendLine('*(*ptr)++ = {evt};'.format(evt=e.getEnumString()),comment='Copy the event type to the buffer')
         
         if len(e.variables) > 0:
             self.cFile.appendLine()
@@ -279,44 +618,56 @@ class LogFile:
         
         self.hFile.appendLine('} ' + dataStructName(self.prefix) + ';')
         
-    def additionPrototype(self,var):
-        return self.createVariableFunction(var,'add',returnType='bool',extra=[('onlyIfNew','bool')])
+    def additionPrototype(self,var,inline=False):
+        return self.createVariableFunction(var,'add',returnType='bool',inline=inline,extra=[('onlyIfNew','bool')])
         
     #create the function for adding a variable to the logging structure
-    def createAdditionFunction(self, var):
+    #inline - write the function to the header file as 'static inline'
+    def createAdditionFunction(self, var, inline=False):
     
-        self.cFile.appendLine(comment='Add variable {name} to the {prefix} logging struct'.format(
+        f = self.hFile if inline else self.cFile
+        
+        f.appendLine(comment='Add variable {name} to the {prefix} logging struct'.format(
                         name=var.name,
                         prefix=self.prefix))
                         
-        self.cFile.appendLine(self.additionPrototype(var))
-        self.cFile.openBrace()
-        self.cFile.appendLine('if (onlyIfNew == true)',comment='Ignore value if it is the same as the value already stored')
-        self.cFile.openBrace()
-        self.cFile.appendLine('if (data->{var} == {var})'.format(var=var.name))
-        self.cFile.tabIn()
-        self.cFile.appendLine('return false;')
-        self.cFile.tabOut()
-        self.cFile.closeBrace()
-        self.cFile.appendLine()
-        self.cFile.appendLine(var.setBit('selection'),comment='Set the appropriate bit')
+        f.appendLine(self.additionPrototype(var, inline=inline))
+        f.openBrace()
+        f.appendLine('if (onlyIfNew == true)',comment='Ignore value if it is the same as the value already stored')
+        f.openBrace()
+        f.appendLine('if (data->{var} == {var})'.format(var=var.name))
+        f.tabIn()
+        f.appendLine('return false;')
+        f.tabOut()
+        f.closeBrace()
+        f.appendLine()
+        f.appendLine(var.setBit('selection'),comment='Set the appropriate bit')
         #now actually add the variable in
-        self.cFile.appendLine(var.addVariable('data'))
-        self.cFile.appendLine()
-        self.cFile.appendLine('return true;')
-        self.cFile.closeBrace()
-        self.cFile.appendLine()
+        f.appendLine(var.addVariable('data'))
+        f.appendLine()
+        f.appendLine('return true;')
+        f.closeBrace()
+        f.appendLine()
         
     #function for decoding a particular variable into a printable string for writing to a log file
     def decodePrototype(self, var):
-        return self.createVariableFunction(var,'decode',blank=True,bits=False,returnType='void',extra=[('*str','char')])
+        if self.integerFormat:
+            return self.createVariableFunction(var,'decode',blank=True,bits=False,returnType='uint8_t',extra=[('*str','char'), ('size','uint8_t')])
+        else:
+            return self.createVariableFunction(var,'decode',blank=True,bits=False,returnType='void',extra=[('*str','char')])
     
     def createDecodeFunction(self, var):
         self.cFile.appendLine(comment='Decode the {name} variable and return a printable string (e.g. for saving to a log file'.format(name=var.name))
-        self.cFile.appendLine(comment='Pointer to *str must have enough space allocated!')
+        if self.integerFormat:
+            self.cFile.appendLine(comment='At most size-1 characters are written, returns the length of the string')
+        else:
+            self.cFile.appendLine(comment='Pointer to *str must have enough space allocated!')
         self.cFile.appendLine(self.decodePrototype(var))
         self.cFile.openBrace()
-        self.cFile.appendLine('sprintf(str,"{patt}",data->{var});'.format(patt=var.getStringCast(),var=var.name))
+        if self.integerFormat:
+            self.cFile.appendLine('return {call};'.format(call=var.getFormatCall('data->' + var.name)))
+        else:
+            self.cFile.appendLine('sprintf(str,"{patt}",{value});'.format(patt=var.getStringCast(),value=var.getStringValue('data->' + var.name)))
         self.cFile.closeBrace()
         self.cFile.appendLine()
         pass
@@ -338,11 +689,12 @@ class LogFile:
     name - name of the function
     data - Include a pointer to the LogData_t struct?
     bits - Include a pointer to the LogBitfield_t struct?
-    inline - Make the function inline?
+    inline - Make the function (static) inline?
     returnType - Function return type
     extra - Extra parameters to pass to the function - list of tuples
     """
-    def createFunctionPrototype(self, name, data=True, bits=True, inline=False, returnType='void', extra=None):
+    #constData - the function does not modify the data struct
+    def createFunctionPrototype(self, name, data=True, bits=True, inline=False, returnType='void', extra=None, constData=False):
         
         if not extra:
             extra = []
@@ -356,8 +708,9 @@ class LogFile:
             paramstring += ' '
             paramstring += pair[0]
             
-        return '{inline}{returnType} Log{prefix}_{name}({data}{comma}{bits}{params})'.format(
-                    inline='inline ' if inline else '',
+        return '{inline}{returnType} Log{prefix}_{name}({const}{data}{comma}{bits}{params})'.format(
+                    inline='static inline ' if inline else '',
+                    const='const ' if data and constData else '',
                     returnType=returnType,
                     prefix=self.prefix.capitalize(),
                     name=name,
@@ -403,15 +756,22 @@ class LogFile:
         self.cFile.appendLine('uint8_t *ptr = (uint8_t*) dest; //Pointer for keeping track of data addressing')
         self.cFile.appendLine()
         
-        for var in self.variables:
-            self.copyVarToBuffer(var)
-            self.cFile.appendLine()
+        if self.codec == 'table':
+            self.cFile.appendLine(self.copyFieldsCall('To', 'NULL'))
+        elif self.bulkCopy:
+            for run in self.contiguousRuns():
+                self.bulkCopyRun(run, 'To')
+                self.cFile.appendLine()
+        else:
+            for var in self.variables:
+                self.copyVarToBuffer(var)
+                self.cFile.appendLine()
         
         self.cFile.closeBrace()
         self.cFile.appendLine()
 
     def copySelectedPrototype(self):
-        return self.createFunctionPrototype('CopyDataToBuffer',extra=[('*dest','void')], returnType='uint16_t')
+        return self.createFunctionPrototype('CopyDataToBuffer',extra=[('*dest','void')] + self.contextParam(), returnType='uint16_t', constData=True)
         
     #create a function that copies across ONLY the bits that are set
     def createCopyDataToFunction(self):
@@ -423,20 +783,43 @@ class LogFile:
         self.cFile.appendLine('uint8_t *ptr = (uint8_t*) dest; //Pointer for keeping track of data addressing')
         self.cFile.appendLine('uint8_t *bf = (uint8_t*) selection; //Pointer for keeping track of the bitfield')
         self.cFile.appendLine('uint16_t count = 0; //Variable for keeping track of how many bytes were copied')
+        if self.hasDeltaVariables():
+            self.cFile.appendLine('uint8_t keyframe = (context->frames == 0); //Delta variables are stored in full on a keyframe')
+            if self.codec == 'table':
+                self.declareDeltaValues()
+        if self.bitIteration:
+            self.declareIterationVariables()
         self.cFile.appendLine()
         self.cFile.appendLine(comment='Copy the selection for keeping track of data')
         
         self.copyBitfieldToBuffer(count=True)
         
         self.cFile.appendLine()
-        self.cFile.appendLine(comment='Check each variable in the logging struct to see if it should be added')
         
-        for var in self.variables:
-            self.cFile.appendLine('if ({test})'.format(test=var.getBit('selection')))
-            self.cFile.openBrace()
+        if self.hasDeltaVariables():
+            self.deltaToBufferStart()
+        
+        if self.bitIteration:
+            self.cFile.appendLine(comment='Copy only the variables whose selection bit is set')
+            self.iterateSelectionBits(lambda bit: self.copyBitCall('To', bit, data=self.copySource()))
             
-            self.copyVarToBuffer(var, count=True)
-            self.cFile.closeBrace()
+            self.cFile.appendLine()
+            self.cFile.appendLine('count = (uint16_t) (ptr - (uint8_t*) dest);',comment='Total number of bytes copied')
+        elif self.codec == 'table':
+            self.cFile.appendLine(comment='Copy the variables whose selection bit is set')
+            self.cFile.appendLine('count += ' + self.copyFieldsCall('To', 'bf', data=self.copySource()))
+        else:
+            self.cFile.appendLine(comment='Check each variable in the logging struct to see if it should be added')
+            
+            for var in self.variables:
+                self.cFile.appendLine('if ({test})'.format(test=var.getBit('selection')))
+                self.cFile.openBrace()
+                
+                self.copyVarToBuffer(var, count=True, delta=True)
+                self.cFile.closeBrace()
+        
+        if self.hasDeltaVariables():
+            self.deltaToBufferFinish()
         
         self.cFile.appendLine()
         self.cFile.appendLine('return count; //Return the number of bytes that were actually copied')
@@ -463,7 +846,16 @@ class LogFile:
         if count:
             self.cFile.appendLine('count += {size};'.format(size=bf_size))
         
-    def copyVarToBuffer(self, var, struct='data->', pointer='&ptr', count=False):
+    #delta - copy delta variables as the difference from the previous value (held in the context struct)
+    def copyVarToBuffer(self, var, struct='data->', pointer='&ptr', count=False, delta=False):
+        if delta and var.delta:
+            self.copyDeltaVarToBuffer(var, struct, pointer, count)
+            return
+            
+        if var.isVariableLength():
+            self.copyEncodedVarToBuffer(var, struct, pointer, count)
+            return
+            
         self.cFile.appendLine('Copy{sign}{bits}ToBuffer({struct}{name}, {ptr});'.format(
                             sign='I' if var.isSigned() else 'U',
                             bits=var.bytes*8,
@@ -475,19 +867,58 @@ class LogFile:
         if count:
             self.cFile.appendLine('count += {size};'.format(size=var.bytes))
             
-    def copyVarFromBuffer(self, var, struct='data->',pointer='&ptr',count=False):
+    #name - name of the destination (if not var.name)
+    def copyVarFromBuffer(self, var, struct='&data->',pointer='&ptr',count=False,name=None):
+        if var.isVariableLength():
+            self.copyEncodedVarFromBuffer(var, struct, pointer, count, name)
+            return
     
         self.cFile.appendLine('Copy{sign}{bits}FromBuffer({struct}{name}, {ptr});'.format(
                             sign='I' if var.isSigned() else 'U',
                             bits=var.bytes*8,
                             struct=struct,
-                            name=var.name,
+                            name=name if name else var.name,
                             ptr = pointer,
                             ),
                             comment="Copy the '{var}' variable ({n} bytes)".format(var=var.name,n=var.bytes))
                 
         if count:
             self.cFile.appendLine('count += {size};'.format(size=var.bytes))
+            
+    """
+    Functions for copying variable-length (varint / zigzag) encoded variables
+    The number of bytes copied is only known at runtime, so it is returned by the copy function
+    """
+    
+    #name of the common encoding function (Varint or Zigzag)
+    def encodingName(self, var):
+        return var.encoding.capitalize()
+        
+    def copyEncodedVarToBuffer(self, var, struct='data->', pointer='&ptr', count=False):
+        #zigzag values are sign-extended (if signed), varint values are always zero-extended
+        call = 'Copy{enc}ToBuffer(({cast}) {struct}{name}, {ptr});'.format(
+                            enc=self.encodingName(var),
+                            cast='int32_t' if var.encoding == 'zigzag' else 'uint{bits}_t'.format(bits=var.bytes*8),
+                            struct=struct,
+                            name=var.name,
+                            ptr=pointer)
+                            
+        self.cFile.appendLine('count += ' + call if count else call,
+                            comment="Copy the '{var}' variable ({enc}, up to {n} bytes)".format(var=var.name, enc=var.encoding, n=var.maxBytes()))
+                            
+    def copyEncodedVarFromBuffer(self, var, struct='&data->', pointer='&ptr', count=False, name=None):
+        #struct is the address of the variable, e.g. '&data->'
+        lvalue = struct[1:] if struct.startswith('&') else '*' + struct
+        
+        self.cFile.openBrace()
+        self.cFile.appendLine('{sign}int32_t value;'.format(sign='' if var.encoding == 'zigzag' else 'u'))
+        
+        call = 'Copy{enc}FromBuffer(&value, {ptr});'.format(enc=self.encodingName(var), ptr=pointer)
+        
+        self.cFile.appendLine('count += ' + call if count else call,
+                            comment="Copy the '{var}' variable ({enc}, up to {n} bytes)".format(var=var.name, enc=var.encoding, n=var.maxBytes()))
+        self.cFile.appendLine('{lvalue}{name} = ({fmt}) value;'.format(lvalue=lvalue, name=name if name else var.name, fmt=var.format))
+        self.cFile.closeBrace()
         
     """
     Functions for copying data back out of a buffer
@@ -508,9 +939,16 @@ class LogFile:
         self.cFile.appendLine('uint8_t *ptr = (uint8_t*) src; //Pointer for keeping track of data addressing')
         self.cFile.appendLine()
         
-        for var in self.variables:
-            self.copyVarFromBuffer(var)
-            self.cFile.appendLine()
+        if self.codec == 'table':
+            self.cFile.appendLine(self.copyFieldsCall('From', 'NULL'))
+        elif self.bulkCopy:
+            for run in self.contiguousRuns():
+                self.bulkCopyRun(run, 'From')
+                self.cFile.appendLine()
+        else:
+            for var in self.variables:
+                self.copyVarFromBuffer(var)
+                self.cFile.appendLine()
         
         self.cFile.closeBrace()
         self.cFile.appendLine()
@@ -518,7 +956,7 @@ class LogFile:
     def copyDataFromPrototype(self):
         return self.createFunctionPrototype('CopyDataFromBuffer',
                                             returnType='uint16_t',
-                                            extra = [('*src','void')])
+                                            extra = [('*src','void')] + self.contextParam())
                                             
     def createCopyDataFromFunction(self):
         self.cFile.appendLine(comment="Copy across *selected* data from a buffer")
@@ -528,21 +966,41 @@ class LogFile:
         self.cFile.appendLine('uint8_t *ptr = (uint8_t*) src; //Pointer for keeping track of data addressing')
         self.cFile.appendLine('uint8_t *bf = (uint8_t*) selection; //Pointer for keeping track of the bitfield')
         self.cFile.appendLine('uint16_t count = 0; //Variable for keeping track of how many bytes were copied')
+        if self.hasDeltaVariables():
+            self.cFile.appendLine('uint8_t keyframe; //Set if the values of delta variables are stored in full')
+        if self.bitIteration:
+            self.declareIterationVariables()
         self.cFile.appendLine()
         self.cFile.appendLine(comment='Copy the selection bits')
         
         self.copyBitfieldFromBuffer(count=True)
         
+        if self.hasDeltaVariables():
+            self.cFile.appendLine()
+            self.cFile.appendLine('keyframe = *(ptr++);', comment='Keyframe flag')
+            self.cFile.appendLine('count += {n};'.format(n=KEYFRAME_FLAG_BYTES))
+        
         self.cFile.appendLine()
         self.cFile.appendLine(comment='Only copy across variables that have actually been stored in the buffer')
         
-        for var in self.variables:
-            self.cFile.appendLine('if ({test})'.format(test=var.getBit('selection')))
-            self.cFile.openBrace()
+        if self.bitIteration:
+            self.iterateSelectionBits(lambda bit: self.copyBitCall('From', bit))
             
-            self.copyVarFromBuffer(var,count=True)
-            
-            self.cFile.closeBrace()
+            self.cFile.appendLine()
+            self.cFile.appendLine('count = (uint16_t) (ptr - (uint8_t*) src);',comment='Total number of bytes copied')
+        elif self.codec == 'table':
+            self.cFile.appendLine('count += ' + self.copyFieldsCall('From', 'bf'))
+        else:
+            for var in self.variables:
+                self.cFile.appendLine('if ({test})'.format(test=var.getBit('selection')))
+                self.cFile.openBrace()
+                
+                self.copyVarFromBuffer(var,count=True)
+                
+                self.cFile.closeBrace()
+                
+        if self.hasDeltaVariables():
+            self.deltaFromBufferFinish()
             
         self.cFile.appendLine()
         self.cFile.appendLine('return count; //Return the number of bytes that were actually copied')
@@ -578,6 +1036,10 @@ class LogFile:
         self.cFile.appendLine(self.titleByIndexPrototype())
         self.cFile.openBrace()
         
+        if self.stringTables:
+            self.stringLookup(self.titleOffsetTableName())
+            return
+            
         self.cFile.startSwitch('index')
         
         #add case labels
@@ -602,6 +1064,10 @@ class LogFile:
         self.cFile.appendLine(self.unitsByIndexPrototype())
         self.cFile.openBrace()
         
+        if self.stringTables:
+            self.stringLookup(self.unitsOffsetTableName())
+            return
+            
         self.cFile.startSwitch('index')
         
         fn = lambda var: 'Log{prefix}_{var}Units()'.format(prefix=self.prefix,var=var.name)
@@ -617,21 +1083,187 @@ class LogFile:
         self.cFile.appendLine()
          
     def valueByIndexPrototype(self):
-        return self.createFunctionPrototype('GetValueByIndex',bits=False,extra=[('index','uint8_t'), ('*str','char')])
+        if self.integerFormat:
+            return self.createFunctionPrototype('GetValueByIndex',bits=False,returnType='uint8_t',extra=[('index','uint8_t'), ('*str','char'), ('size','uint8_t')])
+        else:
+            return self.createFunctionPrototype('GetValueByIndex',bits=False,extra=[('index','uint8_t'), ('*str','char')])
         
     def valueByIndexFunction(self):
         self.cFile.appendLine(comment='Get a string-representation of a given variable, based on its enumerated value')
         self.cFile.appendLine(self.valueByIndexPrototype())
         self.cFile.openBrace()
         
+        if self.stringTables:
+            self.valueLookup()
+            return
+            
         self.cFile.startSwitch('index')
         
-        fn = lambda var: 'Log{prefix}_Decode{name}(data,str)'.format(prefix=self.prefix.capitalize(),name=var.name)
-        
-        self.createCaseEnumeration(blankFunction=fn)
+        if self.integerFormat:
+            fn = lambda var: 'Log{prefix}_Decode{name}(data,str,size)'.format(prefix=self.prefix.capitalize(),name=var.name)
+            
+            self.createCaseEnumeration(returnFunction=fn)
+        else:
+            fn = lambda var: 'Log{prefix}_Decode{name}(data,str)'.format(prefix=self.prefix.capitalize(),name=var.name)
+            
+            self.createCaseEnumeration(blankFunction=fn)
         
         self.cFile.endSwitch()
         
+        if self.integerFormat:
+            self.cFile.appendLine()
+            self.cFile.appendLine(comment='Unknown index')
+            self.cFile.appendLine('return FormatString(str, size, "");')
+        
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+    """
+    Flash-resident lookup tables (stringTables option)
+    Titles and units are packed into a single const string pool (identical strings are only stored once),
+    with a table of offsets into the pool for each variable. Values are found through a table of
+    LogValueField_t descriptors, so each lookup is an array access rather than a switch statement
+    """
+    def stringPoolName(self):
+        return 'Log{pref}_StringPool'.format(pref=self.prefix)
+        
+    def titleOffsetTableName(self):
+        return 'Log{pref}_TitleOffsets'.format(pref=self.prefix)
+        
+    def unitsOffsetTableName(self):
+        return 'Log{pref}_UnitsOffsets'.format(pref=self.prefix)
+        
+    def valueTableName(self):
+        return 'Log{pref}_ValueTable'.format(pref=self.prefix)
+        
+    #pack the title and units strings into a pool
+    #returns the list of strings in the pool, and the {string: offset} of each
+    def stringPool(self):
+        strings = []
+        offsets = {}
+        size = 0
+        
+        for var in self.variables:
+            for s in [var.title, var.units if var.units else '']:
+                if s not in offsets:
+                    offsets[s] = size
+                    strings.append(s)
+                    size += len(s.encode('utf-8')) + 1
+                    
+        return strings, offsets, size
+        
+    def createStringTables(self):
+        strings, offsets, size = self.stringPool()
+        
+        offsetType = 'uint16_t' if size <= 0xFFFF else 'uint32_t'
+        
+        self.cFile.startComment()
+        self.cFile.appendLine('Title and units strings for each variable, packed into a single pool')
+        self.cFile.appendLine('Each string is null-terminated, and identical strings are only stored once')
+        self.cFile.finishComment()
+        
+        self.cFile.appendLine('static const char {pool}[] ='.format(pool=self.stringPoolName()))
+        self.cFile.tabIn()
+        
+        for i,s in enumerate(strings):
+            self.cFile.appendLine('"{s}\\0"{end}'.format(s=s, end=';' if i == len(strings) - 1 else ''), comment='Offset {n}'.format(n=offsets[s]))
+            
+        self.cFile.tabOut()
+        self.cFile.appendLine()
+        
+        for table, attr in [(self.titleOffsetTableName(), 'title'), (self.unitsOffsetTableName(), 'units')]:
+            self.cFile.appendLine(comment='Offset of the {attr} string of each variable in the string pool'.format(attr=attr))
+            self.cFile.appendLine('static const {type} {table}[LOG_{PREF}_VARIABLE_COUNT] ='.format(type=offsetType, table=table, PREF=self.prefix.upper()))
+            self.cFile.openBrace()
+            
+            for var in self.variables:
+                s = getattr(var, attr)
+                self.cFile.appendLine('{n},'.format(n=offsets[s if s else '']), comment=var.getEnumString())
+                
+            self.cFile.tabOut()
+            self.cFile.appendLine('};')
+            self.cFile.appendLine()
+            
+        self.cFile.appendLine(comment='Descriptor (offset, size, signedness, scaler) of each variable in the {data} struct'.format(data=dataStructName(self.prefix)))
+        self.cFile.appendLine('static const LogValueField_t {table}[LOG_{PREF}_VARIABLE_COUNT] ='.format(table=self.valueTableName(), PREF=self.prefix.upper()))
+        self.cFile.openBrace()
+        
+        for var in self.variables:
+            self.cFile.appendLine('{{{{offsetof({data}, {name}), {n}, {flags}}}, {scaler}, {decimals}}},'.format(
+                data=dataStructName(self.prefix),
+                name=var.name,
+                n=var.bytes,
+                flags=self.fieldFlags(var),
+                scaler=var.scaler,
+                decimals=var.decimals()),
+                comment=var.getEnumString())
+                
+        self.cFile.tabOut()
+        self.cFile.appendLine('};')
+        self.cFile.appendLine()
+        
+    #test that a variable index is in range
+    def variableIndexTest(self):
+        return 'index >= LOG_{PREF}_VARIABLE_COUNT'.format(PREF=self.prefix.upper())
+        
+    #body of a function that looks up a string in the pool by variable index
+    def stringLookup(self, table):
+        self.cFile.appendLine('if ({test})'.format(test=self.variableIndexTest()))
+        self.cFile.tabIn()
+        self.cFile.appendLine('return "";')
+        self.cFile.tabOut()
+        self.cFile.appendLine()
+        self.cFile.appendLine('return (char*) &{pool}[{table}[index]];'.format(pool=self.stringPoolName(), table=table))
+        
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+    #body of the value-by-index function using the value table
+    def valueLookup(self):
+        
+        if self.integerFormat:
+            self.cFile.appendLine('if ({test})'.format(test=self.variableIndexTest()))
+            self.cFile.tabIn()
+            self.cFile.appendLine('return FormatString(str, size, "");')
+            self.cFile.tabOut()
+            self.cFile.appendLine()
+            self.cFile.appendLine('return FormatField(&{table}[index], data, str, size);'.format(table=self.valueTableName()))
+        else:
+            self.cFile.appendLine('const LogValueField_t *field;')
+            self.cFile.appendLine('uint32_t value;')
+            self.cFile.appendLine()
+            self.cFile.appendLine('if ({test})'.format(test=self.variableIndexTest()))
+            self.cFile.tabIn()
+            self.cFile.appendLine('return;')
+            self.cFile.tabOut()
+            self.cFile.appendLine()
+            self.cFile.appendLine('field = &{table}[index];'.format(table=self.valueTableName()))
+            self.cFile.appendLine('value = GetFieldValue(&field->field, data);')
+            self.cFile.appendLine()
+            
+            self.cFile.appendLine('if (field->field.flags & LOG_FIELD_SIGNED)')
+            self.cFile.openBrace()
+            self.cFile.appendLine('if (field->scaler > 1)')
+            self.cFile.tabIn()
+            self.cFile.appendLine('sprintf(str,"%.*f",field->decimals,(float) (int32_t) value / field->scaler);')
+            self.cFile.tabOut()
+            self.cFile.appendLine('else')
+            self.cFile.tabIn()
+            self.cFile.appendLine('sprintf(str,"%ld",(long) (int32_t) value);')
+            self.cFile.tabOut()
+            self.cFile.closeBrace()
+            self.cFile.appendLine('else')
+            self.cFile.openBrace()
+            self.cFile.appendLine('if (field->scaler > 1)')
+            self.cFile.tabIn()
+            self.cFile.appendLine('sprintf(str,"%.*f",field->decimals,(float) value / field->scaler);')
+            self.cFile.tabOut()
+            self.cFile.appendLine('else')
+            self.cFile.tabIn()
+            self.cFile.appendLine('sprintf(str,"%lu",(unsigned long) value);')
+            self.cFile.tabOut()
+            self.cFile.closeBrace()
+            
         self.cFile.closeBrace()
         self.cFile.appendLine()
         
@@ -640,36 +1272,134 @@ class LogFile:
     #pointer will be auto-incremented
     #returns 'true' if an event was extracted, else false
     def eventsToStringPrototype(self):
-        return 'bool Log{pref}_EventToString(uint8_t **ptr, char *str)'.format(pref=self.prefix)
+        return 'bool Log{pref}_EventToString(uint8_t **ptr, char *str{size})'.format(pref=self.prefix, size=', uint8_t size' if self.integerFormat else '')
+        
+    def eventCountName(self):
+        return 'LOG_{PREF}_EVENT_COUNT'.format(PREF=self.prefix.upper())
+        
+    def eventSizeTableName(self):
+        return 'Log{pref}_EventSizeTable'.format(pref=self.prefix)
+        
+    def eventToStringTableName(self):
+        return 'Log{pref}_EventToStringTable'.format(pref=self.prefix)
+        
+    #tables (indexed by event id - 0x80) of the size of each event, and the function for formatting it
+    def createEventTables(self):
+        self.cFile.startComment()
+        self.cFile.appendLine('Event tables, indexed by (event id - {first})'.format(first=EVENT_ID_START))
+        self.cFile.finishComment()
+        
+        self.cFile.appendLine(comment='Size of each event (including the event id)')
+        self.cFile.appendLine('static const uint8_t {table}[{count}] ='.format(table=self.eventSizeTableName(), count=self.eventCountName()))
+        self.cFile.openBrace()
+        for e in self.events:
+            self.cFile.appendLine('{n},'.format(n=e.eventSize()), comment=e.getEnumString())
+        self.cFile.tabOut()
+        self.cFile.appendLine('};')
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine(comment='Function for formatting each event into a string')
+        self.cFile.appendLine('typedef {ret} (*Log{pref}_EventToStringFunc_t)(uint8_t **ptr, char *str{size});'.format(
+            ret='uint8_t' if self.integerFormat else 'void',
+            pref=self.prefix,
+            size=', uint8_t size' if self.integerFormat else ''))
+        self.cFile.appendLine()
+        self.cFile.appendLine('static const Log{pref}_EventToStringFunc_t {table}[{count}] ='.format(pref=self.prefix, table=self.eventToStringTableName(), count=self.eventCountName()))
+        self.cFile.openBrace()
+        for e in self.events:
+            self.cFile.appendLine('Log{pref}_EventToString_{name},'.format(pref=self.prefix, name=e.name), comment=e.getEnumString())
+        self.cFile.tabOut()
+        self.cFile.appendLine('};')
+        self.cFile.appendLine()
+        
+    #test that an event id is one of the events in the tables
+    def eventIdTest(self, id='id'):
+        return '({id} >= {first}) && ({id} < {first} + {count})'.format(id=id, first=EVENT_ID_START, count=self.eventCountName())
         
     def eventsToStringFunction(self):
         self.cFile.startComment()
         self.cFile.appendLine('Extract an event from a buffer, given a pointer to the buffer, and a pointer to where the event will be strung')
-        self.cFile.appendLine('Function will auto-increment the pointer as necessary')
-        self.cFile.appendLine('Returns true if event was extracted and formatted as string, else returns false')
+        self.cFile.appendLine('The pointer is advanced past the event (pass str = NULL to skip over an event without formatting it)')
+        self.cFile.appendLine('Returns true if event was extracted and formatted as string, else returns false (and the pointer is not moved)')
         self.cFile.finishComment()
         self.cFile.appendLine(self.eventsToStringPrototype())
         self.cFile.openBrace()
+        
+        self.cFile.appendLine('uint8_t id = **ptr;')
+        self.cFile.appendLine('uint8_t *evt = *ptr + 1; //Event variables follow the id')
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine('if (!({test}))'.format(test=self.eventIdTest()), comment='Not a {pref} event'.format(pref=self.prefix))
+        self.cFile.tabIn()
+        self.cFile.appendLine('return false;')
+        self.cFile.tabOut()
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine('if (str != NULL)')
+        self.cFile.tabIn()
+        self.cFile.appendLine('{table}[id - {first}](&evt, str{size});'.format(table=self.eventToStringTableName(), first=EVENT_ID_START, size=', size' if self.integerFormat else ''))
+        self.cFile.tabOut()
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine('*ptr += {table}[id - {first}];'.format(table=self.eventSizeTableName(), first=EVENT_ID_START), comment='Skip to the next event')
+        self.cFile.appendLine()
+        self.cFile.appendLine('return true;')
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+    def eventSizePrototype(self):
+        return 'uint8_t Log{pref}_EventSize(uint8_t id)'.format(pref=self.prefix)
+        
+    def eventSizeFunction(self):
+        self.cFile.appendLine(comment='Size of an event (including the event id), or 0 if the id is not a {pref} event'.format(pref=self.prefix))
+        self.cFile.appendLine(self.eventSizePrototype())
+        self.cFile.openBrace()
+        
+        self.cFile.appendLine('if (!({test}))'.format(test=self.eventIdTest()))
+        self.cFile.tabIn()
+        self.cFile.appendLine('return 0;')
+        self.cFile.tabOut()
+        self.cFile.appendLine()
+        self.cFile.appendLine('return {table}[id - {first}];'.format(table=self.eventSizeTableName(), first=EVENT_ID_START))
+        
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+    #add an event to a batched event block
+    def addEventBlockFunc(self, e):
+        self.cFile.appendLine('uint8_t {func}'.format(func=e.blockPrototype()))
+        self.cFile.openBrace()
+        
+        self.cFile.appendLine('uint8_t *ptr = LogEventBlockReserve(block, timestamp, {n});'.format(n=e.eventSize()))
+        self.cFile.appendLine()
+        self.cFile.appendLine('if (ptr == NULL)')
+        self.cFile.tabIn()
+        self.cFile.appendLine('return 0;')
+        self.cFile.tabOut()
         self.cFile.appendLine()
         
-        self.cFile.appendLine('#error this needs to be completed')
-        self.cFile.startSwitch('TBD')
+        args = ['&ptr'] + [v.name for v in e.variables]
+        self.cFile.appendLine('return Log{pref}_EventAdd_{name}({args});'.format(pref=self.prefix, name=e.name, args=', '.join(args)))
         
-        #function for formatting a given even to a string
-        fn = lambda var: 'Log{pref}_EventToString_{name}(ptr,str)'.format(pref=var.prefix,name=var.name)
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
         
-        self.createCaseEnumeration(vars = self.events, blankFunction = fn)
-        self.cFile.addCase('default')
-        self.cFile.returnFromCase(value='false')
-        self.cFile.endSwitch()
-        self.cFile.appendLine('return true;',comment='Default return case')
+    def decodeEventBlockPrototype(self):
+        return 'int16_t Log{pref}_DecodeEventBlock(const uint8_t *block, uint16_t length, LogEventBlockFunc_t fn, void *arg)'.format(pref=self.prefix)
+        
+    def decodeEventBlockFunction(self):
+        self.cFile.appendLine(comment='Decode each event in a batched event block, calling fn with the id, timestamp and a pointer to each event')
+        self.cFile.appendLine(self.decodeEventBlockPrototype())
+        self.cFile.openBrace()
+        self.cFile.appendLine('return LogEventBlockDecode(block, length, Log{pref}_EventSize, fn, arg);'.format(pref=self.prefix))
         self.cFile.closeBrace()
+        self.cFile.appendLine()
         
     #func for formatting an individual func to a string
     def eventToStringFunc(self, evt):
         self.cFile.appendLine(comment='Format a {evt} event into a readable string'.format(evt=evt.name))
         self.cFile.appendLine(comment='Auto-increment the **ptr pointer')
-        self.cFile.appendLine(evt.toStringPrototype())
+        self.cFile.appendLine(evt.toStringPrototype(bounded=self.integerFormat))
         self.cFile.openBrace()
         
         #define vars for this event
@@ -687,9 +1417,15 @@ class LogFile:
 
             self.cFile.appendLine()
             
-        #compile a list of variables associated with this event
+        if self.integerFormat:
+            self.eventToStringBounded(evt)
+            self.cFile.closeBrace()
+            self.cFile.appendLine()
+            return
+            
+        #compile a list of variables associated with this event
         fmts = " ".join([v.getStringCast() for v in evt.variables])
-        vars = ", ".join([v.name for v in evt.variables])
+        vars = ", ".join([v.getStringValue(v.name) for v in evt.variables])
         
         self.cFile.appendLine('sprintf(str,"Event: {evt}{sep}{formats}"{comma}{vars});'.format(
                 evt = evt.getEnumString(),
@@ -701,28 +1437,1004 @@ class LogFile:
         self.cFile.closeBrace()
         self.cFile.appendLine()
         
+    #integer-only formatting of an event (the event variables have been copied into local variables)
+    def eventToStringBounded(self, evt):
+        self.cFile.appendLine('uint8_t n = FormatString(str, size, "Event: {evt}{sep}");'.format(
+                evt = evt.getEnumString(),
+                sep = ' -> ' if len(evt.variables) > 0 else ''))
+                
+        for i, v in enumerate(evt.variables):
+            if i > 0:
+                self.cFile.appendLine('n += FormatString(str + n, size - n, " ");')
+            self.cFile.appendLine('n += {call};'.format(call=v.getFormatCall(v.name, str='str + n', size='size - n')))
+            
+        self.cFile.appendLine()
+        self.cFile.appendLine('return n;')
+        
     #function to determine the size of the selected data
     def getSelectionSizePrototype(self):
         return self.createFunctionPrototype('GetSelectionSize',data=False,returnType='uint16_t')
         
     def getSelectionSizeFunction(self):
         self.cFile.appendLine(comment='Get the total size of the selected variables')
+        if any([v.isVariableLength() for v in self.variables]):
+            self.cFile.appendLine(comment='Variable-length encoded variables are counted at their maximum size')
         self.cFile.appendLine(self.getSelectionSizePrototype())
         self.cFile.openBrace()
         
         self.cFile.appendLine('uint16_t size = 0;')
+        
+        if self.sizeTables:
+            self.cFile.appendLine('uint8_t *bf = (uint8_t*) selection; //Pointer for keeping track of the bitfield')
+            self.cFile.appendLine()
+            self.cFile.appendLine(comment='Look up the size of the selected variables, one selection byte at a time')
+            
+            for i, table in enumerate(self.selectionSizeTableIndex()):
+                self.cFile.appendLine('size += {table}[bf[{i}]];'.format(table=self.selectionSizeTableName(table), i=i))
+        elif self.bitIteration:
+            self.cFile.appendLine('uint8_t *bf = (uint8_t*) selection; //Pointer for keeping track of the bitfield')
+            self.declareIterationVariables()
+            self.cFile.appendLine()
+            
+            self.iterateSelectionBits(lambda bit: 'size += {table}[{bit}];'.format(table=self.sizeTableName(), bit=bit))
+        else:
+            self.cFile.appendLine()
+            
+            for var in self.variables:
+                self.cFile.appendLine('if ({test})'.format(test=var.getBit('selection')))
+                self.cFile.openBrace()
+                self.cFile.appendLine('size += {n};'.format(n=var.maxBytes()))
+                self.cFile.closeBrace()
+            
+        self.cFile.appendLine()
+        self.cFile.appendLine('return size;')
+        
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+    def encodeSelectedPrototype(self):
+        return self.createFunctionPrototype('EncodeSelected', extra=[('*dest','void'), ('capacity','uint16_t')] + self.contextParam(), returnType='int32_t')
+        
+    #bounded version of CopyDataToBuffer
+    #the size of the selection only needs to be calculated if the buffer cannot hold the largest possible frame
+    def encodeSelectedFunction(self):
+        self.cFile.appendLine(comment='Copy *selected* data to a buffer of a given capacity')
+        self.cFile.appendLine(comment='Nothing is copied if the buffer is too small for the (worst case) size of the selected data')
+        self.cFile.appendLine(comment='Returns the number of bytes copied, or (if the buffer is too small) minus the number of bytes required')
+        self.cFile.appendLine(self.encodeSelectedPrototype())
+        self.cFile.openBrace()
+        
+        self.cFile.appendLine('uint16_t needed;')
+        self.cFile.appendLine()
+        self.cFile.appendLine(comment='A buffer that can hold the largest frame does not need to be checked')
+        self.cFile.appendLine('if (capacity < {max})'.format(max=self.maxFrameBytesName()))
+        self.cFile.openBrace()
+        self.cFile.appendLine('needed = LOG_{PREF}_SELECTION_BYTES{keyframe} + Log{pref}_GetSelectionSize(selection);'.format(
+            PREF=self.prefix.upper(),
+            pref=self.prefix.capitalize(),
+            keyframe=' + LOG_{PREF}_KEYFRAME_FLAG_BYTES'.format(PREF=self.prefix.upper()) if self.hasDeltaVariables() else ''))
+        self.cFile.appendLine()
+        self.cFile.appendLine('if (needed > capacity)')
+        self.cFile.tabIn()
+        self.cFile.appendLine('return -((int32_t) needed);')
+        self.cFile.tabOut()
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine('return Log{pref}_CopyDataToBuffer(data, selection, dest{ctx});'.format(
+            pref=self.prefix.capitalize(),
+            ctx=', context' if self.hasDeltaVariables() else ''))
+        
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+    """
+    Functions for iterating through the *set* bits of the selection bitfield
+    Rather than testing every selection bit in turn, the bitfield is read 32 bits at a time,
+    and each set bit is dispatched (by position) through a table of per-variable functions
+    """
+    def copyTableName(self, direction):
+        return 'Log{pref}_Copy{dir}BufferTable'.format(pref=self.prefix, dir=direction)
+        
+    def sizeTableName(self):
+        return 'Log{pref}_VariableSizeTable'.format(pref=self.prefix)
+        
+    def copyTableFunctionName(self, var, direction):
+        return 'Log{pref}_Copy{name}{dir}Buffer'.format(pref=self.prefix, name=var.name, dir=direction)
+        
+    def copyFuncTypeName(self, direction):
+        return 'Log{pref}_Copy{dir}Func_t'.format(pref=self.prefix, dir=direction)
+        
+    #parameters of the per-variable copy functions
+    #copying to a buffer does not modify the data, but delta variables update the context
+    def copyFuncParams(self, direction):
+        if direction == 'From':
+            return '{data} *data, uint8_t **ptr'.format(data=dataStructName(self.prefix))
+            
+        return 'const {data} *data, {ctx}uint8_t **ptr'.format(
+            data=dataStructName(self.prefix),
+            ctx=contextStructName(self.prefix) + ' *context, ' if self.hasDeltaVariables() else '')
+        
+    #the size table is only read when measuring the selection size by bit iteration
+    #(with sizeTables the selection size is looked up one selection byte at a time instead)
+    def usesSizeTable(self):
+        return self.bitIteration and not self.sizeTables
+        
+    #create the static tables (indexed by selection bit) used for bit iteration
+    def createCopyTables(self):
+        
+        #the table codec dispatches set bits straight to the field table, so only the size table may be needed
+        if self.codec == 'table' and not self.usesSizeTable():
+            return
+        
+        self.cFile.startComment()
+        self.cFile.appendLine('Per-variable copy functions, indexed by selection bit position')
+        self.cFile.finishComment()
+        
+        #the table codec dispatches set bits straight to the field table
+        if self.codec == 'table':
+            self.createSizeTable()
+            return
+        
+        self.cFile.appendLine('typedef void (*{fn})({params});'.format(fn=self.copyFuncTypeName('To'), params=self.copyFuncParams('To')))
+        self.cFile.appendLine('typedef void (*{fn})({params});'.format(fn=self.copyFuncTypeName('From'), params=self.copyFuncParams('From')))
         self.cFile.appendLine()
         
         for var in self.variables:
-            self.cFile.appendLine('if ({test})'.format(test=var.getBit('selection')))
+            self.cFile.appendLine('static void {fn}({params})'.format(fn=self.copyTableFunctionName(var, 'To'), params=self.copyFuncParams('To')))
+            self.cFile.openBrace()
+            self.copyVarToBuffer(var, pointer='ptr', delta=True)
+            self.cFile.closeBrace()
+            self.cFile.appendLine()
+            
+            self.cFile.appendLine('static void {fn}({params})'.format(fn=self.copyTableFunctionName(var, 'From'), params=self.copyFuncParams('From')))
             self.cFile.openBrace()
-            self.cFile.appendLine('size += {n};'.format(n=var.bytes))
+            self.copyVarFromBuffer(var, pointer='ptr')
             self.cFile.closeBrace()
+            self.cFile.appendLine()
+            
+        for direction in ['To', 'From']:
+            self.cFile.appendLine(comment='Functions for copying each variable {dir} a buffer'.format(dir=direction.lower()))
+            self.cFile.appendLine('static const {fn} {table}[LOG_{PREF}_VARIABLE_COUNT] ='.format(
+                fn=self.copyFuncTypeName(direction),
+                PREF=self.prefix.upper(),
+                table=self.copyTableName(direction)))
+            self.cFile.openBrace()
+            for var in self.variables:
+                self.cFile.appendLine('{fn},'.format(fn=self.copyTableFunctionName(var, direction)))
+            self.cFile.tabOut()
+            self.cFile.appendLine('};')
+            self.cFile.appendLine()
             
+        self.createSizeTable()
+        
+    def createSizeTable(self):
+        if not self.usesSizeTable():
+            return
+        
+        self.cFile.appendLine(comment='Size (in bytes) of each variable')
+        self.cFile.appendLine('static const uint8_t {table}[LOG_{PREF}_VARIABLE_COUNT] ='.format(PREF=self.prefix.upper(), table=self.sizeTableName()))
+        self.cFile.openBrace()
+        for var in self.variables:
+            self.cFile.appendLine('{n},'.format(n=var.maxBytes()), comment=var.getEnumString())
+        self.cFile.tabOut()
+        self.cFile.appendLine('};')
         self.cFile.appendLine()
-        self.cFile.appendLine('return size;')
         
+    #line to copy the variable at a given bit position to/from a buffer
+    #data - the data struct to copy (for the table codec, the copy with the delta variables replaced)
+    def copyBitCall(self, direction, bit, data='data'):
+        if self.codec == 'table':
+            return 'CopyField{dir}Buffer(&{table}[{bit}], {data}, &ptr);'.format(dir=direction, table=self.fieldTableName(), bit=bit, data=data)
+        else:
+            return '{table}[{bit}](data, {ctx}&ptr);'.format(
+                table=self.copyTableName(direction),
+                bit=bit,
+                ctx='context, ' if direction == 'To' and self.hasDeltaVariables() else '')
+        
+    #local variables required for iterateSelectionBits
+    def declareIterationVariables(self):
+        self.cFile.appendLine('uint32_t word; //32 selection bits at a time')
+        self.cFile.appendLine('uint8_t bit; //Position of the lowest set bit in the word')
+        
+    #iterate through the set bits of the bitfield 'bf'
+    #fn is called with a string giving the position of the set bit, and returns the line to dispatch it
+    def iterateSelectionBits(self, fn):
+        nBits = len(self.variables)
+        nBytes = bitfieldSize(nBits)
+        
+        for w in range(0, nBytes, 4):
+            
+            #assemble the word from up to 4 bitfield bytes
+            word = ' | '.join(['((uint32_t) bf[{i}]{shift})'.format(i=i, shift=leftShiftBytes(i-w)) for i in range(w, min(w+4, nBytes))])
+            
+            self.cFile.appendLine(comment='Selection bits {a} to {b}'.format(a=w*8, b=min(w*8+32, nBits)-1))
+            self.cFile.appendLine('word = {word};'.format(word=word))
+            
+            #mask out any bits that are beyond the last variable
+            if nBits < w*8 + 32:
+                self.cFile.appendLine('word &= 0x{mask:X}UL;'.format(mask=(1 << (nBits - w*8)) - 1), comment='Ignore unused bits')
+            
+            self.cFile.appendLine('while (word)',comment='Skip straight past any bits that are not set')
+            self.cFile.openBrace()
+            self.cFile.appendLine('bit = CountTrailingZeros32(word);')
+            self.cFile.appendLine(fn('bit + {n}'.format(n=w*8) if w > 0 else 'bit'))
+            self.cFile.appendLine('word &= word - 1;',comment='Clear the lowest set bit')
+            self.cFile.closeBrace()
+            
+    """
+    Functions for the table-driven codec
+    Each variable is described by a LogField_t (offset, size, signedness) in a const table,
+    and the generic CopyFields...Buffer() functions in logjam_common.c do the copying
+    """
+    def fieldTableName(self):
+        return 'Log{pref}_FieldTable'.format(pref=self.prefix)
+        
+    #call to copy fields to/from the buffer using the field table
+    #selection is 'NULL' to copy all fields
+    def copyFieldsCall(self, direction, selection, data='data'):
+        return 'CopyFields{dir}Buffer({table}, LOG_{PREF}_VARIABLE_COUNT, {data}, {sel}, &ptr);'.format(
+            dir=direction,
+            table=self.fieldTableName(),
+            PREF=self.prefix.upper(),
+            data=data,
+            sel=selection)
+        
+    #LogField_t flags for a variable
+    def fieldFlags(self, var):
+        flags = []
+        
+        if var.isSigned():
+            flags.append('LOG_FIELD_SIGNED')
+        if var.encoding == 'varint':
+            flags.append('LOG_FIELD_VARINT')
+        elif var.encoding == 'zigzag':
+            flags.append('LOG_FIELD_ZIGZAG')
+            
+        if len(flags) == 0:
+            return '0'
+            
+        return ' | '.join(flags)
+        
+    def createFieldTable(self):
+        self.cFile.startComment()
+        self.cFile.appendLine('Descriptor table for the variables in the {data} struct'.format(data=dataStructName(self.prefix)))
+        self.cFile.appendLine('Indexed by selection bit position, stored in flash')
+        self.cFile.finishComment()
+        
+        self.cFile.appendLine('static const LogField_t {table}[LOG_{PREF}_VARIABLE_COUNT] ='.format(table=self.fieldTableName(), PREF=self.prefix.upper()))
+        self.cFile.openBrace()
+        
+        for var in self.variables:
+            self.cFile.appendLine('{{offsetof({data}, {name}), {n}, {flags}}},'.format(
+                data=dataStructName(self.prefix),
+                name=var.name,
+                n=var.bytes,
+                flags=self.fieldFlags(var)),
+                comment=var.getEnumString())
+                
+        self.cFile.tabOut()
+        self.cFile.appendLine('};')
+        self.cFile.appendLine()
+        
+    #estimate the code size and speed of each codec for this schema
+    def codecEstimate(self):
+        n = len(self.variables)
+        
+        #four copy functions, two of which test selection bits
+        unrolled = n * (4 * UNROLLED_CALL_BYTES + 2 * UNROLLED_TEST_BYTES)
+        table = n * TABLE_FIELD_BYTES + 4 * TABLE_CALL_BYTES
+        
+        return {
+            'unrolled' : {'flashBytes' : unrolled, 'relativeCost' : 1.0},
+            'table' : {'flashBytes' : table, 'sharedFlashBytes' : TABLE_LOOP_BYTES, 'relativeCost' : TABLE_RELATIVE_COST},
+            }
+            
+    """
+    Functions for delta encoding
+    Delta variables are stored as the difference from the value stored in the previous frame (held in a context struct)
+    Every LOG_<PREFIX>_KEYFRAME_INTERVAL frames is a keyframe, where the values are stored in full so that a decoder can resync
+    A flag byte after the selection bits marks keyframes
+    """
+    
+    def deltaVariables(self):
+        return [v for v in self.variables if v.delta]
+        
+    def hasDeltaVariables(self):
+        return len(self.deltaVariables()) > 0
+        
+    #extra function parameter for the context struct (only if there are delta variables)
+    def contextParam(self):
+        if self.hasDeltaVariables():
+            return [('*context', contextStructName(self.prefix))]
+        else:
+            return []
+            
+    def keyframeIntervalName(self):
+        return 'LOG_{PREF}_KEYFRAME_INTERVAL'.format(PREF=self.prefix.upper())
+            
+    #create the context struct (in the header file)
+    def createContextStruct(self):
+        self.hFile.appendLine(comment='Keyframe interval (in frames) for delta variables')
+        self.hFile.startIf(self.keyframeIntervalName(), invert=True)
+        self.hFile.define(self.keyframeIntervalName(), value=KEYFRAME_INTERVAL)
+        self.hFile.endIf()
+        
+        self.hFile.appendLine(comment='Delta encoded frames store a keyframe flag after the selection bits')
+        self.hFile.define('LOG_{PREF}_KEYFRAME_FLAG_BYTES'.format(PREF=self.prefix.upper()), value=KEYFRAME_FLAG_BYTES)
+        self.hFile.appendLine()
+        
+        self.hFile.appendLine(comment='Context struct for the {pref} logging struct'.format(pref=self.prefix))
+        self.hFile.appendLine(comment='Holds the previous value of each delta variable; use a separate context for encoding and decoding')
+        self.hFile.appendLine('typedef struct {')
+        self.hFile.tabIn()
+        
+        self.hFile.appendLine('uint16_t frames; //Number of frames since the last keyframe (encoding)')
+        self.hFile.appendLine('uint8_t synced; //Set once a keyframe has been received (decoding)')
+        
+        for v in self.deltaVariables():
+            self.hFile.appendLine('{fmt} {name}; //Previous value of the \'{name}\' variable'.format(fmt=v.format, name=v.name))
+            
+        self.hFile.tabOut()
+        self.hFile.appendLine('}} {name};'.format(name=contextStructName(self.prefix)))
+        
+    def resetContextPrototype(self):
+        return 'void Log{pref}_ResetContext({ctx} *context)'.format(pref=self.prefix, ctx=contextStructName(self.prefix))
+        
+    def createResetContextFunction(self):
+        self.cFile.appendLine(comment='Reset a context struct (the next frame encoded will be a keyframe)')
+        self.cFile.appendLine(self.resetContextPrototype())
+        self.cFile.openBrace()
+        self.cFile.appendLine('memset(context, 0, sizeof({ctx}));'.format(ctx=contextStructName(self.prefix)))
         self.cFile.closeBrace()
         self.cFile.appendLine()
         
-
+    #copy the keyframe flag, and reset the previous values on a keyframe
+    def deltaToBufferStart(self):
+        self.cFile.appendLine(comment='Copy the keyframe flag')
+        self.cFile.appendLine('*(ptr++) = keyframe;')
+        self.cFile.appendLine('count += {n};'.format(n=KEYFRAME_FLAG_BYTES))
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine(comment='Values are stored in full on a keyframe')
+        self.cFile.appendLine('if (keyframe)')
+        self.cFile.openBrace()
+        for v in self.deltaVariables():
+            self.cFile.appendLine('context->{name} = 0;'.format(name=v.name))
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+        #the table codec copies every variable from a struct, so the differences are calculated in a copy of the data
+        if self.codec == 'table':
+            self.cFile.appendLine(comment='Replace the selected delta variables (in the copy of the data) with the difference from the previous value')
+            for v in self.deltaVariables():
+                self.cFile.appendLine('if ({test})'.format(test=v.getBit('selection')))
+                self.cFile.openBrace()
+                self.cFile.appendLine('value = (uint32_t) values.{name};'.format(name=v.name))
+                self.cFile.appendLine('values.{name} = ({fmt}) (value - (uint32_t) context->{name});'.format(name=v.name, fmt=v.format))
+                self.cFile.appendLine('context->{name} = ({fmt}) value;'.format(name=v.name, fmt=v.format))
+                self.cFile.closeBrace()
+            self.cFile.appendLine()
+            
+    #local variables required for delta encoding with the table codec
+    def declareDeltaValues(self):
+        self.cFile.appendLine('{data} values = *data; //Copy of the data, in which the delta variables are replaced'.format(data=dataStructName(self.prefix)))
+        self.cFile.appendLine('uint32_t value; //Value of a delta variable')
+        
+    #the data struct that CopyDataToBuffer copies the variables from
+    def copySource(self):
+        return '&values' if self.codec == 'table' and self.hasDeltaVariables() else 'data'
+        
+    #difference between a delta variable (read into the local 'value') and its previous value
+    #the subtraction is unsigned, so it wraps rather than overflowing
+    def deltaExpression(self, var):
+        return '{cast}(value - (uint32_t) context->{name})'.format(
+            cast='({fmt}) '.format(fmt=var.format) if var.bytes < 4 else '',
+            name=var.name)
+            
+    #copy a delta variable as the difference from the previous value, and keep the value in the context
+    #the variable is read once, so that the context holds exactly the value that was copied
+    def copyDeltaVarToBuffer(self, var, struct='data->', pointer='&ptr', count=False):
+        self.cFile.appendLine('uint32_t value = (uint32_t) {struct}{name};'.format(struct=struct, name=var.name))
+        
+        call = 'Copy{enc}ToBuffer(({cast}) {delta}, {ptr});'.format(
+                            enc=self.encodingName(var),
+                            cast='int32_t' if var.encoding == 'zigzag' else 'uint{bits}_t'.format(bits=var.bytes*8),
+                            delta=self.deltaExpression(var),
+                            ptr=pointer)
+                            
+        self.cFile.appendLine('count += ' + call if count else call,
+                            comment="Copy the difference of the '{var}' variable ({enc}, up to {n} bytes)".format(var=var.name, enc=var.encoding, n=var.maxBytes()))
+        self.cFile.appendLine('context->{name} = ({fmt}) value;'.format(name=var.name, fmt=var.format))
+        
+    #count the frames until the next keyframe
+    def deltaToBufferFinish(self):
+        self.cFile.appendLine()
+        self.cFile.appendLine(comment='Count the frames until the next keyframe')
+        self.cFile.appendLine('if (++context->frames >= {interval})'.format(interval=self.keyframeIntervalName()))
+        self.cFile.tabIn()
+        self.cFile.appendLine('context->frames = 0;')
+        self.cFile.tabOut()
+        
+    #reconstruct the delta variables from the previous value
+    def deltaFromBufferFinish(self):
+        self.cFile.appendLine()
+        self.cFile.appendLine('if (keyframe)')
+        self.cFile.openBrace()
+        self.cFile.appendLine('context->synced = 1;')
+        for v in self.deltaVariables():
+            self.cFile.appendLine('context->{name} = 0;'.format(name=v.name))
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine(comment='Reconstruct the delta variables from the previous value')
+        self.cFile.appendLine(comment='Until a keyframe is received they cannot be reconstructed, so are marked as not selected')
+        
+        for v in self.deltaVariables():
+            self.cFile.appendLine('if ({test})'.format(test=v.getBit('selection')))
+            self.cFile.openBrace()
+            self.cFile.appendLine('if (context->synced)')
+            self.cFile.openBrace()
+            self.cFile.appendLine('data->{name} += context->{name};'.format(name=v.name))
+            self.cFile.appendLine('context->{name} = data->{name};'.format(name=v.name))
+            self.cFile.closeBrace()
+            self.cFile.appendLine('else')
+            self.cFile.tabIn()
+            self.cFile.appendLine(v.clearBit('selection') + ';')
+            self.cFile.tabOut()
+            self.cFile.closeBrace()
+            
+    """
+    Functions for reading individual variables straight from an encoded frame
+    The offset of a variable is the total size of the selected variables before it, which is looked up (one selection byte at a time)
+    in a table of the total size of the variables selected by each bit pattern
+    Variable-length encoded variables before the variable are skipped over individually
+    """
+    
+    def hasVariableLengthVariables(self):
+        return any([v.isVariableLength() for v in self.variables])
+        
+    def frameOffsetTablesName(self):
+        return 'Log{pref}_FrameOffsetTables'.format(pref=self.prefix)
+        
+    #offset of the first variable in a frame
+    def frameHeaderBytes(self):
+        if self.hasDeltaVariables():
+            return 'LOG_{PREF}_SELECTION_BYTES + LOG_{PREF}_KEYFRAME_FLAG_BYTES'.format(PREF=self.prefix.upper())
+        else:
+            return 'LOG_{PREF}_SELECTION_BYTES'.format(PREF=self.prefix.upper())
+            
+    #table of size tables (one per selection byte)
+    #variable-length encoded variables are not included in the sizes
+    def createFrameOffsetTables(self):
+        fixedOnly = self.hasVariableLengthVariables()
+        
+        if fixedOnly:
+            self.createSelectionSizeTables(fixedOnly=True)
+            
+        self.cFile.appendLine(comment='Size table for each selection byte, for finding the offset of a variable in a frame')
+        self.cFile.appendLine('static const uint8_t * const {name}[LOG_{PREF}_SELECTION_BYTES] ='.format(name=self.frameOffsetTablesName(), PREF=self.prefix.upper()))
+        self.cFile.openBrace()
+        
+        for table in self.selectionSizeTableIndex(fixedOnly):
+            self.cFile.appendLine('{table},'.format(table=self.selectionSizeTableName(table, fixedOnly)))
+            
+        self.cFile.tabOut()
+        self.cFile.appendLine('};')
+        self.cFile.appendLine()
+        
+    def frameAccessorPrototype(self, var):
+        return 'bool Log{pref}_Frame_Get{name}(const uint8_t *frame, {fmt} *out)'.format(pref=self.prefix, name=var.name, fmt=var.format)
+        
+    def frameOffsetCall(self, var):
+        return 'FrameVariableOffset(frame, {tables}, {pos})'.format(tables=self.frameOffsetTablesName(), pos=var.getEnumString())
+        
+    def createFrameAccessor(self, var):
+        self.cFile.appendLine(comment="Read the '{name}' variable from an encoded frame (without decoding the whole frame)".format(name=var.name))
+        if var.delta:
+            self.cFile.appendLine(comment='Delta variables can only be read from a keyframe')
+        self.cFile.appendLine(comment='Returns false if the variable is not stored in the frame')
+        self.cFile.appendLine(self.frameAccessorPrototype(var))
+        self.cFile.openBrace()
+        
+        encoded = [v for v in self.variables[:self.variables.index(var)] if v.isVariableLength()]
+        
+        self.cFile.appendLine('uint8_t *ptr;')
+        if len(encoded) > 0:
+            self.cFile.appendLine('uint16_t skip = 0; //Size of the variable-length encoded variables before this one')
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine('if (!{test})'.format(test=var.getBit('(void*) frame')))
+        self.cFile.tabIn()
+        self.cFile.appendLine('return false;')
+        self.cFile.tabOut()
+        
+        if var.delta:
+            self.cFile.appendLine('if (frame[LOG_{PREF}_SELECTION_BYTES] == 0)'.format(PREF=self.prefix.upper()), comment='Not a keyframe')
+            self.cFile.tabIn()
+            self.cFile.appendLine('return false;')
+            self.cFile.tabOut()
+            
+        self.cFile.appendLine()
+        
+        if len(encoded) > 0:
+            self.cFile.appendLine(comment='Skip over the variable-length encoded variables')
+            
+            for v in encoded:
+                self.cFile.appendLine('if ({test})'.format(test=v.getBit('(void*) frame')))
+                self.cFile.tabIn()
+                self.cFile.appendLine('skip += VarintSize(frame + {header} + skip + {offset});'.format(header=self.frameHeaderBytes(), offset=self.frameOffsetCall(v)))
+                self.cFile.tabOut()
+                
+            self.cFile.appendLine()
+            
+        self.cFile.appendLine('ptr = (uint8_t*) frame + {header}{skip} + {offset};'.format(
+            header=self.frameHeaderBytes(),
+            skip=' + skip' if len(encoded) > 0 else '',
+            offset=self.frameOffsetCall(var)))
+            
+        self.copyVarFromBuffer(var, struct='', name='out')
+        
+        self.cFile.appendLine()
+        self.cFile.appendLine('return true;')
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+    """
+    Functions for the frame ring buffer
+    A fixed number of frame slots (each large enough for the largest frame) shared between one producer (e.g. an ISR)
+    and one consumer (e.g. the main loop). The head is only written by the producer and the tail only by the consumer,
+    so no locking is required. Frames are encoded straight into the ring memory.
+    """
+    
+    def maxFrameBytesName(self):
+        return 'LOG_{PREF}_MAX_FRAME_BYTES'.format(PREF=self.prefix.upper())
+        
+    def maxFrameBytes(self):
+        n = bitfieldSize(len(self.variables)) + sum([v.maxBytes() for v in self.variables])
+        
+        if self.hasDeltaVariables():
+            n += KEYFRAME_FLAG_BYTES
+            
+        return n
+        
+    def ringStructName(self):
+        return 'Log{pref}_Ring_t'.format(pref=self.prefix)
+        
+    def ringFramesName(self):
+        return 'LOG_{PREF}_RING_FRAMES'.format(PREF=self.prefix.upper())
+        
+    def createRingStruct(self):
+        self.hFile.appendLine(comment='Number of frames in the ring buffer (must be a power of two)')
+        self.hFile.startIf(self.ringFramesName(), invert=True)
+        self.hFile.define(self.ringFramesName(), value=RING_FRAMES)
+        self.hFile.endIf()
+        
+        self.hFile.appendLine('#if ({n} & ({n} - 1)) != 0'.format(n=self.ringFramesName()))
+        self.hFile.appendLine('#error {n} must be a power of two'.format(n=self.ringFramesName()))
+        self.hFile.appendLine('#endif')
+        self.hFile.appendLine()
+        
+        self.hFile.appendLine(comment='Single-producer / single-consumer ring buffer of {pref} frames'.format(pref=self.prefix))
+        self.hFile.appendLine(comment='head and tail are free-running counters (the slot is the counter modulo the number of frames)')
+        self.hFile.appendLine('typedef struct {')
+        self.hFile.tabIn()
+        self.hFile.appendLine('volatile uint16_t head; //Number of frames committed (only written by the producer)')
+        self.hFile.appendLine('volatile uint16_t tail; //Number of frames released (only written by the consumer)')
+        self.hFile.appendLine('uint16_t lengths[{n}]; //Length of the frame in each slot'.format(n=self.ringFramesName()))
+        self.hFile.appendLine('uint8_t frames[{n}][{m}]; //Frame slots'.format(n=self.ringFramesName(), m=self.maxFrameBytesName()))
+        self.hFile.tabOut()
+        self.hFile.appendLine('}} {name};'.format(name=self.ringStructName()))
+        self.hFile.appendLine()
+        
+    def ringFunctionName(self, name):
+        return 'Log{pref}_Ring{name}'.format(pref=self.prefix, name=name)
+        
+    def ringPrototype(self, name, returnType='void', extra=None):
+        params = ['{ring} *ring'.format(ring=self.ringStructName())]
+        
+        if extra:
+            params += extra
+            
+        return '{ret} {fn}({params})'.format(ret=returnType, fn=self.ringFunctionName(name), params=', '.join(params))
+        
+    def ringPrototypes(self):
+        return [
+            self.ringPrototype('Init'),
+            self.ringPrototype('Count', returnType='uint16_t'),
+            self.ringPrototype('Reserve', returnType='uint8_t*'),
+            self.ringPrototype('Commit', extra=['uint16_t length']),
+            self.ringPrototype('Write', returnType='uint16_t', extra=[
+                '{data} *data'.format(data=dataStructName(self.prefix)),
+                '{bits} *selection'.format(bits=bitfieldStructName(self.prefix))] + ['{t} {n}'.format(t=t, n=n) for n, t in self.contextParam()]),
+            self.ringPrototype('Peek', returnType='uint8_t*', extra=['uint16_t *length']),
+            self.ringPrototype('Release'),
+            ]
+            
+    def createRingFunctions(self):
+        init, count, reserve, commit, write, peek, release = self.ringPrototypes()
+        
+        mask = '({n} - 1)'.format(n=self.ringFramesName())
+        
+        self.cFile.startComment()
+        self.cFile.appendLine('Frame ring buffer functions')
+        self.cFile.appendLine('Reserve, Commit and Write must only be called by the producer')
+        self.cFile.appendLine('Peek and Release must only be called by the consumer')
+        self.cFile.finishComment()
+        self.cFile.appendLine()
+        
+        #an empty barrier would let the compiler (or processor) publish a frame before it is written
+        self.cFile.appendLine('#ifndef LOGJAM_MEMORY_BARRIER')
+        self.cFile.appendLine('#error "LOGJAM_MEMORY_BARRIER() must be defined for this compiler (see logjam_common.h)"')
+        self.cFile.appendLine('#endif')
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine(comment='Empty the ring buffer')
+        self.cFile.appendLine(init)
+        self.cFile.openBrace()
+        self.cFile.appendLine('ring->head = 0;')
+        self.cFile.appendLine('ring->tail = 0;')
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine(comment='Number of frames waiting in the ring buffer')
+        self.cFile.appendLine(count)
+        self.cFile.openBrace()
+        self.cFile.appendLine('return (uint16_t) (ring->head - ring->tail);')
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine(comment='Reserve the next frame slot ({n} bytes) for encoding into'.format(n=self.maxFrameBytesName()))
+        self.cFile.appendLine(comment='Returns NULL if the ring buffer is full')
+        self.cFile.appendLine(reserve)
+        self.cFile.openBrace()
+        self.cFile.appendLine('if ((uint16_t) (ring->head - ring->tail) >= {n})'.format(n=self.ringFramesName()))
+        self.cFile.tabIn()
+        self.cFile.appendLine('return NULL;')
+        self.cFile.tabOut()
+        self.cFile.appendLine()
+        self.cFile.appendLine('return ring->frames[ring->head & {mask}];'.format(mask=mask))
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine(comment='Pass the reserved frame slot to the consumer')
+        self.cFile.appendLine(commit)
+        self.cFile.openBrace()
+        self.cFile.appendLine('ring->lengths[ring->head & {mask}] = length;'.format(mask=mask))
+        self.cFile.appendLine('LOGJAM_MEMORY_BARRIER();', comment='Frame must be written before it is published')
+        self.cFile.appendLine('ring->head = (uint16_t) (ring->head + 1);')
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine(comment='Encode the selected data straight into the next frame slot')
+        self.cFile.appendLine(comment='Returns the number of bytes written, or 0 if the ring buffer is full')
+        self.cFile.appendLine(write)
+        self.cFile.openBrace()
+        self.cFile.appendLine('uint8_t *frame = {fn}(ring);'.format(fn=self.ringFunctionName('Reserve')))
+        self.cFile.appendLine('uint16_t length;')
+        self.cFile.appendLine()
+        self.cFile.appendLine('if (frame == NULL)')
+        self.cFile.tabIn()
+        self.cFile.appendLine('return 0;')
+        self.cFile.tabOut()
+        self.cFile.appendLine()
+        self.cFile.appendLine('length = Log{pref}_CopyDataToBuffer(data, selection, frame{ctx});'.format(
+            pref=self.prefix.capitalize(),
+            ctx=', context' if self.hasDeltaVariables() else ''))
+        self.cFile.appendLine('{fn}(ring, length);'.format(fn=self.ringFunctionName('Commit')))
+        self.cFile.appendLine()
+        self.cFile.appendLine('return length;')
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine(comment='Get the oldest frame in the ring buffer (without removing it)')
+        self.cFile.appendLine(comment='Returns NULL if the ring buffer is empty')
+        self.cFile.appendLine(peek)
+        self.cFile.openBrace()
+        self.cFile.appendLine('if (ring->head == ring->tail)')
+        self.cFile.tabIn()
+        self.cFile.appendLine('return NULL;')
+        self.cFile.tabOut()
+        self.cFile.appendLine()
+        self.cFile.appendLine('LOGJAM_MEMORY_BARRIER();', comment='Frame must not be read before it is published')
+        self.cFile.appendLine('*length = ring->lengths[ring->tail & {mask}];'.format(mask=mask))
+        self.cFile.appendLine()
+        self.cFile.appendLine('return ring->frames[ring->tail & {mask}];'.format(mask=mask))
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine(comment='Remove the oldest frame from the ring buffer (once it has been consumed)')
+        self.cFile.appendLine(release)
+        self.cFile.openBrace()
+        self.cFile.appendLine('LOGJAM_MEMORY_BARRIER();', comment='Frame must be read before the slot is reused')
+        self.cFile.appendLine('ring->tail = (uint16_t) (ring->tail + 1);')
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+    """
+    Functions for framing (framing option)
+    Each frame is wrapped with a sync word, length and CRC (see logjam_framing.py) so that
+    a reader can find the start of the next valid frame after any corrupted data
+    """
+    def framingName(self, name):
+        return 'LOG_{PREF}_FRAME_{name}'.format(PREF=self.prefix.upper(), name=name)
+        
+    def crcType(self):
+        return 'uint{n}_t'.format(n=logjam_framing.CRCS[self.framing]['bits'])
+        
+    def crcTableName(self):
+        return 'Log{pref}_CrcTable'.format(pref=self.prefix)
+        
+    def createFramingDefines(self):
+        self.hFile.appendLine(comment='Framing: [sync word] [length] [frame (length bytes)] [{crc} of length and frame]'.format(crc=self.framing.upper()))
+        self.hFile.define(self.framingName('SYNC'), value='0x{sync:04X}'.format(sync=logjam_framing.FRAME_SYNC))
+        self.hFile.define(self.framingName('HEADER_BYTES'), value=logjam_framing.HEADER_BYTES)
+        self.hFile.define(self.framingName('CRC_BYTES'), value=logjam_framing.crcBytes(self.framing))
+        self.hFile.define(self.framingName('OVERHEAD_BYTES'), value='({h} + {c})'.format(h=self.framingName('HEADER_BYTES'), c=self.framingName('CRC_BYTES')))
+        self.hFile.appendLine()
+        
+        self.hFile.appendLine(comment='Maximum number of bytes required to store a framed frame')
+        self.hFile.define('LOG_{PREF}_MAX_FRAMED_BYTES'.format(PREF=self.prefix.upper()), value='({m} + {o})'.format(m=self.maxFrameBytesName(), o=self.framingName('OVERHEAD_BYTES')))
+        self.hFile.appendLine()
+        
+    def framingPrototypes(self):
+        return [
+            self.createFunctionPrototype('FrameData', returnType='uint16_t', extra=[('*dest','void')] + self.contextParam()),
+            'uint16_t Log{pref}_CheckFrame(const uint8_t *src, uint16_t length)'.format(pref=self.prefix),
+            '{crc} Log{pref}_Crc(const uint8_t *data, uint16_t length)'.format(crc=self.crcType(), pref=self.prefix),
+            ]
+            
+    def createCrcTable(self):
+        table = logjam_framing.crcTable(self.framing)
+        digits = logjam_framing.CRCS[self.framing]['bits'] // 4
+        
+        self.cFile.appendLine(comment='{crc} lookup table (one entry for each value of a data byte)'.format(crc=self.framing.upper()))
+        self.cFile.appendLine('static const {crc} {table}[256] ='.format(crc=self.crcType(), table=self.crcTableName()))
+        self.cFile.openBrace()
+        
+        for i in range(0, 256, 8):
+            self.cFile.appendLine(' '.join(['0x{v:0{n}X},'.format(v=v, n=digits) for v in table[i:i+8]]))
+            
+        self.cFile.tabOut()
+        self.cFile.appendLine('};')
+        self.cFile.appendLine()
+        
+    def createFramingFunctions(self):
+        frameData, checkFrame, crcFunc = self.framingPrototypes()
+        
+        crc = logjam_framing.CRCS[self.framing]
+        
+        self.cFile.startComment()
+        self.cFile.appendLine('Frame sync and CRC functions')
+        self.cFile.appendLine('[sync word] [length] [frame (length bytes)] [{crc} of length and frame]'.format(crc=self.framing.upper()))
+        self.cFile.finishComment()
+        self.cFile.appendLine()
+        
+        self.createCrcTable()
+        
+        self.cFile.appendLine(comment='Calculate the {crc} of a block of data'.format(crc=self.framing.upper()))
+        self.cFile.appendLine(crcFunc)
+        self.cFile.openBrace()
+        self.cFile.appendLine('{t} crc = 0x{v:X};'.format(t=self.crcType(), v=crc['init']))
+        self.cFile.appendLine()
+        self.cFile.appendLine('while (length--)')
+        
+        if crc['reflected']:
+            update = 'crc = (crc >> 8) ^ {table}[(crc ^ *data++) & 0xFF];'
+        else:
+            update = 'crc = ({t}) (crc << 8) ^ {table}[((crc >> {shift}) ^ *data++) & 0xFF];'
+            
+        self.cFile.tabIn()
+        self.cFile.appendLine(update.format(t=self.crcType(), table=self.crcTableName(), shift=crc['bits'] - 8))
+        self.cFile.tabOut()
+        self.cFile.appendLine()
+        
+        if crc['xorOut']:
+            self.cFile.appendLine('return crc ^ 0x{v:X};'.format(v=crc['xorOut']))
+        else:
+            self.cFile.appendLine('return crc;')
+            
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine(comment='Copy *selected* data to a buffer, wrapped with a sync word, length and CRC')
+        self.cFile.appendLine(comment='The buffer must hold LOG_{PREF}_MAX_FRAMED_BYTES'.format(PREF=self.prefix.upper()))
+        self.cFile.appendLine(comment='Returns the total number of bytes written')
+        self.cFile.appendLine(frameData)
+        self.cFile.openBrace()
+        self.cFile.appendLine('uint8_t *ptr = (uint8_t*) dest;')
+        self.cFile.appendLine('uint16_t length;')
+        self.cFile.appendLine()
+        self.cFile.appendLine('CopyU16ToBuffer({sync}, &ptr);'.format(sync=self.framingName('SYNC')))
+        self.cFile.appendLine()
+        self.cFile.appendLine('length = Log{pref}_CopyDataToBuffer(data, selection, ptr + 2{ctx});'.format(
+            pref=self.prefix.capitalize(),
+            ctx=', context' if self.hasDeltaVariables() else ''), comment='Frame follows the length')
+        self.cFile.appendLine('CopyU16ToBuffer(length, &ptr);')
+        self.cFile.appendLine('ptr += length;')
+        self.cFile.appendLine()
+        self.cFile.appendLine('Copy{U}ToBuffer(Log{pref}_Crc((uint8_t*) dest + 2, length + 2), &ptr);'.format(
+            U='U{n}'.format(n=crc['bits']),
+            pref=self.prefix), comment='CRC of the length and frame')
+        self.cFile.appendLine()
+        self.cFile.appendLine('return {o} + length;'.format(o=self.framingName('OVERHEAD_BYTES')))
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+        self.cFile.appendLine(comment='Check for a valid framed frame at the start of a buffer (of a given length)')
+        self.cFile.appendLine(comment='Returns the length of the frame (which starts LOG_{PREF}_FRAME_HEADER_BYTES into the buffer), or 0 if there is no valid frame'.format(PREF=self.prefix.upper()))
+        self.cFile.appendLine(checkFrame)
+        self.cFile.openBrace()
+        self.cFile.appendLine('uint8_t *ptr = (uint8_t*) src;')
+        self.cFile.appendLine('uint16_t sync;')
+        self.cFile.appendLine('uint16_t frame;')
+        self.cFile.appendLine('{t} crc;'.format(t=self.crcType()))
+        self.cFile.appendLine()
+        self.cFile.appendLine('if (length < {o})'.format(o=self.framingName('OVERHEAD_BYTES')))
+        self.cFile.tabIn()
+        self.cFile.appendLine('return 0;')
+        self.cFile.tabOut()
+        self.cFile.appendLine()
+        self.cFile.appendLine('CopyU16FromBuffer(&sync, &ptr);')
+        self.cFile.appendLine('CopyU16FromBuffer(&frame, &ptr);')
+        self.cFile.appendLine()
+        self.cFile.appendLine('if ((sync != {sync}) || (frame > {max}) || (frame > length - {o}))'.format(
+            sync=self.framingName('SYNC'),
+            max=self.maxFrameBytesName(),
+            o=self.framingName('OVERHEAD_BYTES')))
+        self.cFile.tabIn()
+        self.cFile.appendLine('return 0;')
+        self.cFile.tabOut()
+        self.cFile.appendLine()
+        self.cFile.appendLine('ptr += frame;')
+        self.cFile.appendLine('Copy{U}FromBuffer(&crc, &ptr);'.format(U='U{n}'.format(n=crc['bits'])))
+        self.cFile.appendLine()
+        self.cFile.appendLine('if (crc != Log{pref}_Crc(src + 2, frame + 2))'.format(pref=self.prefix))
+        self.cFile.tabIn()
+        self.cFile.appendLine('return 0;')
+        self.cFile.tabOut()
+        self.cFile.appendLine()
+        self.cFile.appendLine('return frame;')
+        self.cFile.closeBrace()
+        self.cFile.appendLine()
+        
+    """
+    Functions for bulk copying contiguous struct members
+    The buffer is packed (no padding) and big-endian, so a run of struct members with no padding between them
+    can be copied with a single memcpy, followed by an in-place byte swap of each multi-byte member (on little-endian targets)
+    """
+    
+    #split the variables into runs which (assuming natural alignment) have no padding between them in the data struct
+    def contiguousRuns(self):
+        runs = []
+        offset = 0
+        
+        for var in self.variables:
+            aligned = int(ceil(offset / var.bytes)) * var.bytes
+            
+            #variable-length encoded variables cannot be bulk copied
+            if len(runs) > 0 and aligned == offset and not var.isVariableLength() and not runs[-1][-1].isVariableLength():
+                runs[-1].append(var)
+            else:
+                runs.append([var])
+                
+            offset = aligned + var.bytes
+            
+        return runs
+        
+    #copy a run of variables To or From the buffer
+    #the bulk copy is only used if LOGJAM_BULK_COPY is defined, and the actual struct layout matches the buffer layout
+    #(which the compiler can determine at compile time), otherwise each variable is copied individually
+    def bulkCopyRun(self, run, direction):
+        
+        copyVar = self.copyVarToBuffer if direction == 'To' else self.copyVarFromBuffer
+        
+        if len(run) < 2:
+            copyVar(run[0])
+            return
+            
+        first = run[0]
+        last = run[-1]
+        
+        n = sum([v.bytes for v in run])
+        
+        self.cFile.appendLine('#ifdef LOGJAM_BULK_COPY', ignoreTabs=True)
+        self.cFile.appendLine('if (offsetof({data}, {last}) - offsetof({data}, {first}) == {n})'.format(
+            data=dataStructName(self.prefix),
+            first=first.name,
+            last=last.name,
+            n=n-last.bytes),
+            comment='Struct layout matches the buffer layout')
+        self.cFile.openBrace()
+        
+        if direction == 'To':
+            self.cFile.appendLine('memcpy(ptr, &data->{first}, {n});'.format(first=first.name, n=n),
+                comment="Copy '{first}' to '{last}' ({n} bytes)".format(first=first.name, last=last.name, n=n))
+        else:
+            self.cFile.appendLine('memcpy(&data->{first}, ptr, {n});'.format(first=first.name, n=n),
+                comment="Copy '{first}' to '{last}' ({n} bytes)".format(first=first.name, last=last.name, n=n))
+        
+        offset = 0
+        
+        for var in run:
+            if var.bytes > 1:
+                if direction == 'To':
+                    self.cFile.appendLine('SwapBytes{bits}(ptr + {offset});'.format(bits=var.bytes*8, offset=offset), comment="Byte order of '{var}'".format(var=var.name))
+                else:
+                    self.cFile.appendLine('SwapBytes{bits}(&data->{name});'.format(bits=var.bytes*8, name=var.name), comment="Byte order of '{var}'".format(var=var.name))
+            
+            offset += var.bytes
+        
+        self.cFile.appendLine('ptr += {n};'.format(n=n))
+        self.cFile.closeBrace()
+        self.cFile.appendLine('else')
+        self.cFile.appendLine('#endif //LOGJAM_BULK_COPY', ignoreTabs=True)
+        self.cFile.openBrace()
+        
+        for var in run:
+            copyVar(var)
+            
+        self.cFile.closeBrace()
+            
+    """
+    Functions for calculating the selection size by table lookup
+    For each selection byte, a 256-entry table maps the bit pattern to the total size of the selected variables
+    Selection bytes that describe variables of the same sizes share a table
+    """
+    
+    #sizes of the variables in each selection byte (unused bits have a size of zero)
+    #fixedOnly - variable-length encoded variables also have a size of zero
+    def selectionByteSizes(self, fixedOnly=False):
+        sizes = []
+        
+        for i in range(bitfieldSize(len(self.variables))):
+            byteVars = self.variables[i*8:(i+1)*8]
+            
+            if fixedOnly:
+                varSizes = [0 if v.isVariableLength() else v.bytes for v in byteVars]
+            else:
+                varSizes = [v.maxBytes() for v in byteVars]
+                
+            sizes.append(tuple(varSizes + [0] * (8 - len(byteVars))))
+            
+        return sizes
+        
+    #the unique size tables, and which table is used for each selection byte
+    def selectionSizeTables(self, fixedOnly=False):
+        tables = []
+        
+        for sizes in self.selectionByteSizes(fixedOnly):
+            if sizes not in tables:
+                tables.append(sizes)
+                
+        return tables
+        
+    def selectionSizeTableIndex(self, fixedOnly=False):
+        tables = self.selectionSizeTables(fixedOnly)
+        
+        return [tables.index(sizes) for sizes in self.selectionByteSizes(fixedOnly)]
+        
+    def selectionSizeTableName(self, n, fixedOnly=False):
+        return 'Log{pref}_{kind}Table{n}'.format(pref=self.prefix, kind='FixedSize' if fixedOnly else 'SelectionSize', n=n)
+        
+    def createSelectionSizeTables(self, fixedOnly=False):
+        self.cFile.startComment()
+        if fixedOnly:
+            self.cFile.appendLine('Lookup tables for the total size of the fixed-size variables selected by each selection byte')
+        else:
+            self.cFile.appendLine('Lookup tables for the total size of the variables selected by each selection byte')
+        self.cFile.finishComment()
+        
+        for n, sizes in enumerate(self.selectionSizeTables(fixedOnly)):
+            self.cFile.appendLine(comment='Variable sizes: {sizes}'.format(sizes=', '.join(map(str, sizes))))
+            self.cFile.appendLine('static const uint8_t {table}[256] ='.format(table=self.selectionSizeTableName(n, fixedOnly)))
+            self.cFile.openBrace()
+            
+            values = [sum([sizes[bit] for bit in range(8) if pattern & (1 << bit)]) for pattern in range(256)]
+            
+            for row in range(0, 256, 16):
+                self.cFile.appendLine(', '.join(['{v:2d}'.format(v=v) for v in values[row:row+16]]) + ',')
+                
+            self.cFile.tabOut()
+            self.cFile.appendLine('};')
+            self.cFile.appendLine()
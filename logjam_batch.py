@@ -0,0 +1,112 @@
+import sys
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from logjam_xml import say, splitArgs, getOption, generateOptions, generateFile, copyCommonFiles
+from logjam_version import LOGJAM_VERSION
+
+#compile a list of xml files from a list of files and/or directories
+def findXmlFiles(paths):
+    files = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith('.xml'):
+                    files.append(os.path.join(path, name))
+        elif path.endswith('.xml'):
+            files.append(path)
+        else:
+            say(path,'is not an xml file or directory')
+
+    return files
+
+#generate code for a single xml file
+#any error is returned (rather than raised) so that one bad schema cannot abort the rest of the batch
+#returns (output, error)
+def generateWorker(xml_file, outputdir=None, options=None):
+    try:
+        return generateFile(xml_file, outputdir, options), None
+    except Exception as e:
+        return None, e
+
+#generate code for each xml file, spread across a pool of processes
+#jobs - number of worker processes (defaults to the number of cores)
+#options - options passed to generate() for each file
+#returns a dict of {xml file: error} for each file that could not be generated
+def generateBatch(files, outputdir=None, jobs=None, options=None):
+
+    errors = {}
+
+    #no point starting up a pool for a single process
+    if jobs == 1 or len(files) < 2:
+        results = [(f, generateWorker(f, outputdir, options)) for f in files]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [(f, pool.submit(generateWorker, f, outputdir, options)) for f in files]
+
+            results = []
+
+            for f, future in futures:
+                try:
+                    results.append((f, future.result()))
+                except Exception as e:
+                    #the worker process itself failed (or the result could not be returned)
+                    results.append((f, (None, e)))
+
+    for f, (output, error) in results:
+        if error is None:
+            say('Generated', f, '->', output)
+        else:
+            errors[f] = error
+
+    return errors
+
+def main():
+
+    print("Running LogJam version {v} (batch mode)\n".format(v=LOGJAM_VERSION))
+
+    options, args = splitArgs(sys.argv)
+
+    files = findXmlFiles(args[1:])
+
+    if len(files) == 0:
+        say("No xml files supplied")
+        sys.exit(1)
+
+    outputdir = getOption(options, 'output')
+
+    if outputdir:
+        outputdir = os.path.abspath(outputdir)
+        if not os.path.isdir(outputdir):
+            say(outputdir,'is not a valid directory')
+            sys.exit(1)
+    else:
+        say('No output directory specified.')
+
+    say('Writing files to', outputdir if outputdir else os.getcwd())
+
+    jobs = getOption(options, 'jobs')
+
+    if jobs:
+        jobs = int(jobs)
+
+    say("")
+
+    errors = generateBatch(files, outputdir=outputdir, jobs=jobs, options=generateOptions(options))
+
+    #the common files are shared between all the schemas, so only copy them once
+    if outputdir:
+        copyCommonFiles(outputdir, python=generateOptions(options)['pythonDecoder'])
+
+    for f, e in errors.items():
+        say('Error in', f, '-', e)
+
+    if len(errors) > 0:
+        sys.exit(1)
+
+    say("Complete!")
+
+if __name__ == '__main__':
+    main()
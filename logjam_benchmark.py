@@ -0,0 +1,174 @@
+"""
+Benchmark the LogJam generator against synthetic logging structures
+
+python logjam_benchmark.py [--sizes=10,1000,10000] [--repeat=N] [--save=<file.json>] [--baseline=<file.json>] [--tolerance=0.25]
+
+Each stage of generation (parse, header, code, write) is timed separately, and the peak memory used is recorded.
+--save writes the results to a json file, which can be used as a --baseline for a later run.
+If a stage is slower than the baseline (by more than the tolerance) the benchmark fails.
+"""
+
+import sys
+import os
+import json
+import time
+import tempfile
+import tracemalloc
+
+from xml.etree import ElementTree
+
+from logjam_xml import say, splitArgs, getOption, parseSchema, createLogFile
+from logjam_version import LOGJAM_VERSION
+
+#number of variables in each synthetic logging structure
+DEFAULT_SIZES = [10, 1000, 10000]
+
+#generation stages that are timed
+STAGES = ['parse', 'header', 'code', 'write']
+
+#variable types cycled through by the synthetic structures
+TYPES = ['unsigned8', 'signed8', 'unsigned16', 'signed16', 'unsigned32', 'signed32']
+
+#create the xml for a synthetic logging structure
+#there is one event for every ten variables, each event having three variables
+def synthesizeSchema(nVars, prefix='Bench'):
+    root = ElementTree.Element('Logging', name=prefix, version='1.0')
+
+    for i in range(nVars):
+        attr = {
+            'name' : 'var{i}'.format(i=i),
+            'type' : TYPES[i % len(TYPES)],
+            }
+
+        if i % 3 == 0:
+            attr['units'] = 'V'
+            attr['scaler'] = '100'
+        if i % 4 == 0:
+            attr['comment'] = 'Synthetic variable {i}'.format(i=i)
+
+        ElementTree.SubElement(root, 'Variable', attr)
+
+    for i in range(max(1, nVars // 10)):
+        evt = ElementTree.SubElement(root, 'Event', name='evt{i}'.format(i=i))
+
+        for j in range(3):
+            ElementTree.SubElement(evt, 'Variable', name='arg{j}'.format(j=j), type=TYPES[(i + j) % len(TYPES)])
+
+    return ElementTree.tostring(root)
+
+#time each stage of generation for a given xml source
+#returns a dict of {stage: seconds}
+#trace - also record the peak memory used (bytes), this slows down generation so timings are not comparable
+def benchmarkSchema(data, outputdir, trace=False):
+    result = {}
+
+    if trace:
+        tracemalloc.start()
+
+    t = time.perf_counter()
+    lf = createLogFile(parseSchema(data), 'benchmark.xml', outputdir=outputdir, srcHash='benchmark')
+    result['parse'] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    lf.constructHeaderFile()
+    result['header'] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    lf.constructCodeFile()
+    result['code'] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    lf.writeFiles()
+    result['write'] = time.perf_counter() - t
+
+    if trace:
+        result['peakMemory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    #remove the files so that every write is a real write
+    for f in [lf.hFile.fname, lf.cFile.fname]:
+        os.remove(f)
+
+    return result
+
+#benchmark each size, taking the best time of 'repeat' runs for each stage
+#peak memory is measured in a separate run
+def runBenchmarks(sizes, repeat=3):
+    results = {}
+
+    with tempfile.TemporaryDirectory() as outputdir:
+        for n in sizes:
+            data = synthesizeSchema(n)
+
+            runs = [benchmarkSchema(data, outputdir) for i in range(repeat)]
+
+            best = {}
+            for key in STAGES:
+                best[key] = min([r[key] for r in runs])
+
+            best['peakMemory'] = benchmarkSchema(data, outputdir, trace=True)['peakMemory']
+
+            results[str(n)] = best
+
+    return results
+
+#compare results against a baseline
+#returns a list of strings describing each regression
+def findRegressions(results, baseline, tolerance=0.25):
+    regressions = []
+
+    for size, result in results.items():
+        if size not in baseline:
+            continue
+
+        for key in STAGES + ['peakMemory']:
+            old = baseline[size].get(key)
+            new = result[key]
+
+            if old and new > old * (1 + tolerance):
+                regressions.append('{n} variables, {key}: {new:.4g} vs baseline {old:.4g} (+{pc:.0f}%)'.format(
+                    n=size, key=key, new=new, old=old, pc=100 * (new - old) / old))
+
+    return regressions
+
+def main():
+
+    print("LogJam version {v} benchmark\n".format(v=LOGJAM_VERSION))
+
+    options, args = splitArgs(sys.argv)
+
+    sizes = [int(n) for n in getOption(options, 'sizes', ','.join(map(str, DEFAULT_SIZES))).split(',')]
+    repeat = int(getOption(options, 'repeat', 3))
+    tolerance = float(getOption(options, 'tolerance', 0.25))
+
+    results = runBenchmarks(sizes, repeat)
+
+    say('{:>10} {:>10} {:>10} {:>10} {:>10} {:>12}'.format('variables', 'parse', 'header', 'code', 'write', 'peak memory'))
+
+    for size, r in results.items():
+        say('{:>10} {:>9.4f}s {:>9.4f}s {:>9.4f}s {:>9.4f}s {:>10.1f}kB'.format(
+            size, r['parse'], r['header'], r['code'], r['write'], r['peakMemory'] / 1024))
+
+    save = getOption(options, 'save')
+
+    if save:
+        with open(save, 'w') as file:
+            json.dump(results, file, indent=4)
+        say('\nResults saved to', save)
+
+    baseline = getOption(options, 'baseline')
+
+    if baseline:
+        with open(baseline, 'r') as file:
+            regressions = findRegressions(results, json.load(file), tolerance)
+
+        if len(regressions) > 0:
+            say('\nRegressions against baseline', baseline)
+            for r in regressions:
+                say(r)
+            sys.exit(1)
+
+        say('\nNo regressions against baseline', baseline)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import os
+import pickle
+import hashlib
+
+from functools import lru_cache
+
+#on-disk cache of parsed logging structures (and the code generated from them)
+#entries are keyed on a hash of the xml source, the LogJam version, the generation options and the generator itself
+#so a cached entry can never be used for a different input, or by a different version of the generator
+
+#version of the cache entry layout (bump if the contents of an entry change)
+CACHE_FORMAT = 1
+
+#the generator sources (alongside this script), and the hand-code files that are copied alongside the generated code
+def generatorFiles():
+    folder = os.path.abspath(os.path.dirname(__file__))
+
+    files = [os.path.join(folder, name) for name in os.listdir(folder) if name.endswith('.py') and (name.startswith('logjam') or name == 'code_writer.py')]
+
+    handCode = os.path.join(folder, 'hand-code')
+
+    if os.path.isdir(handCode):
+        files += [os.path.join(handCode, name) for name in os.listdir(handCode) if os.path.isfile(os.path.join(handCode, name))]
+
+    return sorted(files)
+
+#hash of the generator sources
+#the pickled variables and events (and the generated text) are only valid for the generator that produced them
+@lru_cache(maxsize=None)
+def generatorFingerprint():
+    h = hashlib.sha1()
+    h.update(str(CACHE_FORMAT).encode())
+
+    for filename in generatorFiles():
+        h.update(b'\0')
+        h.update(os.path.basename(filename).encode())
+        h.update(b'\0')
+
+        with open(filename, 'rb') as file:
+            h.update(file.read())
+
+    return h.hexdigest()
+
+#file in which a cache entry is stored
+def cacheFileName(cachedir, key):
+    return os.path.join(cachedir, key + '.pickle')
+
+#load a cache entry
+#returns None if there is no (readable) entry for the given key, or if the entry was saved by a different generator
+def loadCacheEntry(cachedir, key):
+    try:
+        with open(cacheFileName(cachedir, key), 'rb') as file:
+            entry = pickle.load(file)
+    except (OSError, EOFError, AttributeError, ImportError, pickle.UnpicklingError):
+        return None
+
+    if not isinstance(entry, dict) or entry.get('fingerprint') != generatorFingerprint():
+        return None
+
+    return entry
+
+#save a cache entry
+#the entry is written to a temporary file and then moved into place,
+#so that concurrent processes never see a partially written entry
+def saveCacheEntry(cachedir, key, entry):
+    os.makedirs(cachedir, exist_ok=True)
+
+    filename = cacheFileName(cachedir, key)
+    tmp = '{f}.{pid}.tmp'.format(f=filename, pid=os.getpid())
+
+    entry['fingerprint'] = generatorFingerprint()
+
+    with open(tmp, 'wb') as file:
+        pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.replace(tmp, filename)
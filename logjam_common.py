@@ -1,10 +1,6 @@
 import re, os
-import time
 from math import ceil
 
-from code_writer import CodeWriter
-from logjam_version import AutogenString
-
 #convert a 'camelCase' string to a 'CAMEL_CASE' string
 #thanks to http://stackoverflow.com/questions/1175208/elegant-python-function-to-convert-camelcase-to-snake-case
 def camel2define(string):
@@ -46,6 +42,10 @@ def bitfieldStructName(prefix):
 def dataStructName(prefix):
     return "Log{prefix}_Data_t".format(prefix=prefix)
 
+#generate the name for a logging context struct (state kept between frames)
+def contextStructName(prefix):
+    return "Log{prefix}_Context_t".format(prefix=prefix)
+
 #generate the name for a 
 def headerDefineName(prefix):
     return "_LOG_{prefix}_DEFS_H_".format(prefix=prefix.upper())
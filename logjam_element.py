@@ -1,7 +1,12 @@
-from math import ceil, log
+from math import ceil
 from logjam_common import *
 import re
 
+#variable-length encodings that can be applied to a variable
+#varint - unsigned LEB128 (7 bits per byte)
+#zigzag - signed values are zigzag-mapped (small magnitudes -> small values) and then LEB128 encoded
+ENCODINGS = ['varint', 'zigzag']
+
 class LogElement:
     def __init__(self, prefix, tag):
         self.prefix = prefix
@@ -72,6 +77,19 @@ class LogVariable(LogElement):
         
         self.bytes = extractNumBytesFromVarType(self.format)
         
+        #optional variable-length encoding
+        self.encoding = attr.get('encoding',None)
+        
+        if self.encoding and self.encoding not in ENCODINGS:
+            raise ValueError("Encoding '{enc}' for {name} is not one of {encs}".format(enc=self.encoding, name=self.name, encs=', '.join(ENCODINGS)))
+            
+        #delta variables are stored as the difference from the previously stored value
+        self.delta = attr.get('delta','false').lower() in ['true','yes','1']
+        
+        #the difference is small, so is stored with a variable-length encoding
+        if self.delta and not self.encoding:
+            self.encoding = 'zigzag' if self.isSigned() else 'varint'
+        
     #datatype definition string (with comment appended)
     def dataString(self):
         return "{datatype} {name}; {comment}".format(
@@ -97,12 +115,54 @@ class LogVariable(LogElement):
     def isSigned(self):
         return self.format.startswith('i')
         
+    #python struct module format character for the variable
+    def structFormat(self):
+        f = {1 : 'b', 2 : 'h', 4 : 'i'}[self.bytes]
+        
+        return f if self.isSigned() else f.upper()
+        
+    #is the variable stored in the buffer with a variable-length encoding?
+    def isVariableLength(self):
+        return self.encoding is not None
+        
+    #maximum number of bytes the variable can occupy in a buffer
+    def maxBytes(self):
+        if self.isVariableLength():
+            return int(ceil(self.bytes * 8 / 7))
+        else:
+            return self.bytes
+        
+    #number of decimal places shown for a scaled variable (enough to show 1/scaler)
+    def decimals(self):
+        if self.scaler > 1:
+            return len(str(self.scaler - 1))
+        else:
+            return 0
+            
     #return the sprintf pattern required to properly decode a variable to a string
     def getStringCast(self):
         return '%{dot}{type}'.format(
-                dot = '.{n}'.format(n=ceil(log(self.scaler) / log(10))) if self.scaler > 1 else '',
+                dot = '.{n}'.format(n=self.decimals()) if self.scaler > 1 else '',
                 type = 'f' if self.scaler > 1 else '{sign}'.format(sign='d' if self.isSigned() else 'u')
                 )
+                
+    #value to pass to the getStringCast() format (scaled variables are converted to floating point)
+    def getStringValue(self, value):
+        if self.scaler > 1:
+            return '(float) {value} / {scaler}'.format(value=value, scaler=self.scaler)
+        else:
+            return value
+            
+    #integer-only formatting of a value into a string (at most size-1 characters)
+    #the scaler is applied with an integer divide, with a fixed number of decimal places
+    def getFormatCall(self, value, str='str', size='size'):
+        return 'Format{sign}({str}, {size}, {value}, {scaler}, {decimals})'.format(
+                sign = 'Signed' if self.isSigned() else 'Unsigned',
+                str = str,
+                size = size,
+                value = value,
+                scaler = self.scaler,
+                decimals = self.decimals())
         
 
 class LogEvent(LogElement):
@@ -116,7 +176,17 @@ class LogEvent(LogElement):
         #add in any 'data' associated with this event
         for child in xmlTag:
             if child.tag == 'Variable':
-                self.variables.append(LogVariable(prefix,child))
+                v = LogVariable(prefix,child)
+                
+                #events have no previous value
+                if v.delta:
+                    raise ValueError("Variable {var} in event {evt} cannot be delta encoded".format(var=v.name, evt=self.name))
+                    
+                #events have a fixed size
+                if v.isVariableLength():
+                    raise ValueError("Variable {var} in event {evt} cannot have a variable-length encoding".format(var=v.name, evt=self.name))
+                    
+                self.variables.append(v)
                 
     def eventSize(self):
         return 1 + sum([v.bytes for v in self.variables])
@@ -129,7 +199,21 @@ class LogEvent(LogElement):
             
         return 'Log{pref}_EventAdd_{name}({args})'.format(pref=self.prefix,name=self.name,args=', '.join(args))
                 
-    def toStringPrototype(self):
-        return 'void Log{pref}_EventToString_{name}(uint8_t **ptr, char *str)'.format(pref=self.prefix,name=self.name)
+    #prototype for adding the event to a batched event block
+    def blockPrototype(self, define=True):
+        args = ['LogEventBlock_t *block', 'uint32_t timestamp']
+        
+        for v in self.variables:
+            args.append('{type}{name}'.format(type=v.format+' ' if define else '',name=v.name))
+            
+        return 'Log{pref}_EventBlockAdd_{name}({args})'.format(pref=self.prefix,name=self.name,args=', '.join(args))
+        
+    #bounded - the string is formatted into a buffer of a given size, and the length of the string is returned
+    def toStringPrototype(self, bounded=False):
+        return '{ret} Log{pref}_EventToString_{name}(uint8_t **ptr, char *str{size})'.format(
+                ret='uint8_t' if bounded else 'void',
+                pref=self.prefix,
+                name=self.name,
+                size=', uint8_t size' if bounded else '')
         
         
\ No newline at end of file
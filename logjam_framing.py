@@ -0,0 +1,238 @@
+"""
+Frame sync markers and CRCs
+
+With the --framing option, each frame produced by CopyDataToBuffer can be wrapped as follows (multi-byte values are big-endian):
+
+[sync word (2 bytes)] [length (2 bytes)] [frame (length bytes)] [crc (2 or 4 bytes)]
+
+The crc covers the length and the frame bytes. The CRC lookup tables used by the generated code are calculated here,
+and scanFrames() finds the valid frames in a (possibly corrupted) buffer on the host side.
+
+python logjam_framing.py <file> --max-length=N [--framing=crc16]
+
+where N is the longest valid frame (LOG_<PREFIX>_MAX_FRAME_BYTES, or MAX_FRAME_BYTES in log_<prefix>_defs.py)
+"""
+
+import sys
+import zlib
+import binascii
+
+from functools import lru_cache
+
+#sync word at the start of each framed frame
+FRAME_SYNC = 0xA55A
+
+SYNC_BYTES = 2
+LENGTH_BYTES = 2
+
+#bytes before the frame data
+HEADER_BYTES = SYNC_BYTES + LENGTH_BYTES
+
+#largest length that can be stored in the length field
+MAX_LENGTH = 0xFFFF
+
+#supported CRCs
+#bits - width of the CRC
+#poly - generator polynomial (normal, MSB-first representation)
+#init - initial CRC value
+#xorOut - value XORed with the final CRC
+#reflected - data bytes (and the CRC) are processed LSB-first
+CRCS = {
+    #CRC-16/CCITT-FALSE
+    'crc16' : {'bits' : 16, 'poly' : 0x1021, 'init' : 0xFFFF, 'xorOut' : 0x0000, 'reflected' : False},
+    #CRC-32 (as used by zlib, ethernet)
+    'crc32' : {'bits' : 32, 'poly' : 0x04C11DB7, 'init' : 0xFFFFFFFF, 'xorOut' : 0xFFFFFFFF, 'reflected' : True},
+    }
+
+FRAMINGS = sorted(CRCS.keys())
+
+#raise a ValueError if a framing is not supported
+def checkFraming(framing):
+    if framing not in CRCS:
+        raise ValueError("Framing '{f}' is not one of {framings}".format(f=framing, framings=', '.join(FRAMINGS)))
+
+#number of bytes in the CRC for a given framing
+def crcBytes(framing):
+    return CRCS[framing]['bits'] // 8
+
+#number of bytes added to each frame
+def overheadBytes(framing):
+    return HEADER_BYTES + crcBytes(framing)
+
+#reverse the bits of an n-bit value
+def reflect(value, bits):
+    result = 0
+
+    for i in range(bits):
+        if value & (1 << i):
+            result |= 1 << (bits - 1 - i)
+
+    return result
+
+#256-entry lookup table for a CRC (one entry for each value of a data byte)
+@lru_cache(maxsize=None)
+def crcTable(framing):
+    crc = CRCS[framing]
+    bits = crc['bits']
+    mask = (1 << bits) - 1
+
+    table = []
+
+    for i in range(256):
+        if crc['reflected']:
+            poly = reflect(crc['poly'], bits)
+            value = i
+
+            for b in range(8):
+                value = (value >> 1) ^ poly if value & 1 else value >> 1
+        else:
+            value = i << (bits - 8)
+
+            for b in range(8):
+                value = (value << 1) ^ crc['poly'] if value & (1 << (bits - 1)) else value << 1
+
+        table.append(value & mask)
+
+    return tuple(table)
+
+#calculate a CRC using the lookup table (the same method as the generated code)
+def tableCrc(framing, data):
+    crc = CRCS[framing]
+    table = crcTable(framing)
+    bits = crc['bits']
+    mask = (1 << bits) - 1
+
+    value = crc['init']
+
+    for byte in data:
+        if crc['reflected']:
+            value = (value >> 8) ^ table[(value ^ byte) & 0xFF]
+        else:
+            value = ((value << 8) & mask) ^ table[((value >> (bits - 8)) ^ byte) & 0xFF]
+
+    return value ^ crc['xorOut']
+
+#calculate a CRC (using the C implementations in the standard library)
+def crc(framing, data):
+    if framing == 'crc16':
+        return binascii.crc_hqx(data, CRCS[framing]['init'])
+    else:
+        return zlib.crc32(data) & 0xFFFFFFFF
+
+#wrap a frame with the sync word, length and CRC
+def frame(framing, data):
+    if len(data) > MAX_LENGTH:
+        raise ValueError("Frame is too long ({n} bytes)".format(n=len(data)))
+
+    body = len(data).to_bytes(LENGTH_BYTES, 'big') + bytes(data)
+
+    return FRAME_SYNC.to_bytes(SYNC_BYTES, 'big') + body + crc(framing, body).to_bytes(crcBytes(framing), 'big')
+
+#check for a valid frame at a given position in a buffer (view is a memoryview of the buffer)
+#returns the length of the frame data, or None if there is no valid frame
+def checkFrame(view, pos, framing, maxLength):
+    nCrc = crcBytes(framing)
+
+    if view[pos:pos + SYNC_BYTES] != FRAME_SYNC.to_bytes(SYNC_BYTES, 'big'):
+        return None
+
+    body = pos + SYNC_BYTES
+    length = int.from_bytes(view[body:body + LENGTH_BYTES], 'big')
+    stop = body + LENGTH_BYTES + length
+
+    if length > maxLength or stop + nCrc > len(view):
+        return None
+
+    if crc(framing, view[body:stop]) != int.from_bytes(view[stop:stop + nCrc], 'big'):
+        return None
+
+    return length
+
+"""
+Find each valid frame in a buffer
+data - bytes, bytearray or mmap containing framed frames (possibly with corrupted or missing bytes)
+framing - the CRC used for the frames (see FRAMINGS)
+maxLength - frames longer than this are rejected without checking the CRC (e.g. LOG_<PREFIX>_MAX_FRAME_BYTES)
+
+Yields (offset, frame) for each valid frame, where offset is the position of the sync word
+and frame is a memoryview of the frame data (without the sync word, length or CRC)
+
+Candidate frames are only checked where the sync word is found (which is searched for by the underlying buffer, rather than
+trying each offset in turn), and the search continues after the end of each valid frame. A candidate whose length is larger
+than maxLength (or runs past the end of the buffer) is rejected before its CRC is calculated.
+
+A buffer of valid frames is scanned in O(n) time. Each sync word followed by a plausible length but a bad CRC costs a CRC over
+up to maxLength bytes, so the worst case (e.g. a buffer full of corrupted frames) is O(n * maxLength)
+"""
+def scanFrames(data, framing, maxLength, start=0):
+    checkFraming(framing)
+
+    sync = FRAME_SYNC.to_bytes(SYNC_BYTES, 'big')
+    view = memoryview(data)
+
+    pos = data.find(sync, start)
+
+    while pos >= 0:
+        length = checkFrame(view, pos, framing, maxLength)
+
+        if length is None:
+            #not a valid frame, try the next sync word
+            pos = data.find(sync, pos + 1)
+        else:
+            yield pos, view[pos + HEADER_BYTES:pos + HEADER_BYTES + length]
+
+            pos = data.find(sync, pos + HEADER_BYTES + length + crcBytes(framing))
+
+def main():
+
+    #imported here so that this module can be used on its own (e.g. alongside a generated python decoder)
+    from logjam_xml import say, splitArgs, getOption
+    from logjam_version import LOGJAM_VERSION
+
+    print("LogJam version {v} frame scanner\n".format(v=LOGJAM_VERSION))
+
+    options, args = splitArgs(sys.argv)
+
+    if len(args) < 2:
+        say("No file supplied")
+        sys.exit(1)
+
+    framing = getOption(options, 'framing', 'crc16')
+    maxLength = getOption(options, 'max-length')
+
+    #scanning a corrupted dump costs up to maxLength bytes of CRC per false sync word, so the real limit is required
+    if maxLength is None:
+        say("No maximum frame length supplied (--max-length=LOG_<PREFIX>_MAX_FRAME_BYTES)")
+        sys.exit(1)
+
+    maxLength = int(maxLength)
+
+    try:
+        checkFraming(framing)
+    except ValueError as e:
+        say(e)
+        sys.exit(1)
+
+    with open(args[1], 'rb') as file:
+        data = file.read()
+
+    frames = 0
+    framed = 0
+    gaps = 0
+    expected = 0
+
+    for offset, f in scanFrames(data, framing, maxLength):
+        if offset != expected:
+            gaps += 1
+
+        frames += 1
+        framed += len(f) + overheadBytes(framing)
+        expected = offset + len(f) + overheadBytes(framing)
+
+    if expected != len(data):
+        gaps += 1
+
+    say('{n} valid frames ({b} bytes), {s} bytes skipped in {g} gaps'.format(n=frames, b=framed, s=len(data) - framed, g=gaps))
+
+if __name__ == '__main__':
+    main()
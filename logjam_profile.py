@@ -0,0 +1,56 @@
+import time
+
+from logjam_element import LogElement
+
+#records the time taken and the number of bytes emitted by each section of code generation
+#sections are timed inclusively (e.g. createCaseEnumeration is also counted in titleByIndexFunction)
+class LogProfiler:
+    def __init__(self, writers):
+        #the CodeWriter objects that sections write to
+        self.writers = writers
+        
+        self.clear()
+        
+    def clear(self):
+        self.sections = {}
+        self.elements = {}
+        
+    #total number of characters generated so far
+    def length(self):
+        return sum([w.length for w in self.writers])
+        
+    #wrap a function so that every call to it is recorded against the named section
+    #if the first argument is a variable or event, the call is also recorded against that element
+    def wrap(self, name, fn):
+        def profiled(*args, **kwargs):
+            n = self.length()
+            t = time.perf_counter()
+            
+            result = fn(*args, **kwargs)
+            
+            t = time.perf_counter() - t
+            n = self.length() - n
+            
+            self.record(self.sections, name, t, n)
+            
+            if len(args) > 0 and isinstance(args[0], LogElement):
+                self.record(self.elements.setdefault(args[0].name, {}), name, t, n)
+            
+            return result
+            
+        return profiled
+        
+    #add a timing to a set of records
+    def record(self, records, name, t, n):
+        r = records.setdefault(name, {'calls' : 0, 'time' : 0, 'bytes' : 0})
+        
+        r['calls'] += 1
+        r['time'] += t
+        r['bytes'] += n
+        
+    def report(self):
+        return {
+            'sections' : self.sections,
+            'elements' : self.elements,
+            'files' : dict([(w.fname, w.length) for w in self.writers]),
+            }
@@ -1,16 +1,37 @@
 import time
+import hashlib
 
 #LOGJAM version
 LOGJAM_VERSION = "0.1"
 
-def AutogenString(src=None):
-    v  = "/*\n"
-    v += "* This file was auto-generated at {time} using LogJam version {v}.\n".format(time=time.ctime(), v=LOGJAM_VERSION)
-    v += "* LogJam - https://github.com/SchrodingersGat/LogJam\n"
-    v += "* Do not edit this file, any changes will be overwritten.\n"
+#generate a hash of the source (xml) data and the LogJam version
+#used in place of a timestamp, so that identical inputs generate identical outputs
+#any extra (string) arguments are also added to the hash
+def hashSource(data, *extra):
+    h = hashlib.sha1()
+    h.update(LOGJAM_VERSION.encode())
+    h.update(data)
+    
+    for x in extra:
+        h.update(b'\0')
+        h.update(str(x).encode())
+    
+    return h.hexdigest()
+
+#srcHash - if provided, the file is stamped with the source hash rather than the current time
+#python - comment lines with '#' (for a python file) rather than a c-style block comment
+def AutogenString(src=None, srcHash=None, python=False):
+    lines = []
+    if srcHash:
+        lines.append("This file was auto-generated from source hash {h} using LogJam version {v}.".format(h=srcHash, v=LOGJAM_VERSION))
+    else:
+        lines.append("This file was auto-generated at {time} using LogJam version {v}.".format(time=time.ctime(), v=LOGJAM_VERSION))
+    lines.append("LogJam - https://github.com/SchrodingersGat/LogJam")
+    lines.append("Do not edit this file, any changes will be overwritten.")
     if src:
-        v += "* Edit the source file '{src}' from which this file was generated.\n".format(src=src)
-    v += "*/\n\n"
+        lines.append("Edit the source file '{src}' from which this file was generated.".format(src=src))
+    
+    if python:
+        return ''.join(['#{line}\n'.format(line=line) for line in lines]) + '\n'
     
-    return v
-    
\ No newline at end of file
+    return "/*\n" + ''.join(["* {line}\n".format(line=line) for line in lines]) + "*/\n\n"
@@ -1,116 +1,414 @@
 import sys
 import os
 import shutil
+import filecmp
+import time
+import json
 
 import re
 
-from logjam import LogVariable, LogFile, LogEvent
-from logjam_version import LOGJAM_VERSION
+#import xml funcs
+from xml.etree import ElementTree
 
-print("Running LogJam version {v}\n".format(v=LOGJAM_VERSION))
+from logjam import LogVariable, LogFile, LogEvent
+from logjam_version import LOGJAM_VERSION, hashSource
+from logjam_cache import loadCacheEntry, saveCacheEntry, generatorFingerprint
 
 def thisFolder():
-    #python script is argument 0
-    folder = os.path.abspath(os.path.dirname(sys.argv[0]))
+    #the hand-code folder lives alongside this script
+    folder = os.path.abspath(os.path.dirname(__file__))
     return folder
 
-def copySourceFile(name, outputdir = None):
+#copy a hand-code file to the output directory
+#folder - folder (alongside this script) that contains the file
+#returns True if the file was copied (or False if it was already up to date)
+def copySourceFile(name, outputdir = None, verbose = True, folder = 'hand-code'):
 
-    filename = os.path.join(thisFolder(), 'hand-code', name)
+    filename = os.path.join(thisFolder(), folder, name)
     if outputdir:
         output = os.path.join(outputdir, name)
     else:
         output = name
-    say("Copying {src} to {dest}".format(src=filename,dest=output))
+
+    #don't touch the file if it is already up to date
+    if os.path.exists(output) and filecmp.cmp(filename, output, shallow=False):
+        if verbose:
+            say("{dest} is up to date".format(dest=output))
+        return False
+
+    if verbose:
+        say("Copying {src} to {dest}".format(src=filename,dest=output))
     shutil.copyfile(filename, output)
 
+    return True
+
+#copy across the 'common' files
+#python - also copy the python decoders (used with the generated python modules)
+#returns a list of the files that were copied
+def copyCommonFiles(outputdir = None, verbose = True, python = False):
+    copied = []
+
+    names = ['logjam_common.h', 'logjam_common.c']
+
+    if python:
+        names += ['logjam_decoder.py', 'logjam_bulk.py', 'logjam_reader.py']
+
+    for name in names:
+        if copySourceFile(name, outputdir = outputdir, verbose = verbose):
+            copied.append(name)
+
+    #the reader uses the frame scanner (which lives alongside the generator)
+    if python and copySourceFile('logjam_framing.py', outputdir = outputdir, verbose = verbose, folder = ''):
+        copied.append('logjam_framing.py')
+
+    return copied
+
 def say(*arg):
     print(" ".join(map(str,arg)))
 
 def close(*arg):
     say(*arg)
     sys.exit(0)
-    
-#get an xml file
-if len(sys.argv) < 2 or not sys.argv[1].endswith(".xml"):
-    close("No xml file supplied")
-    
-xml_file = sys.argv[1]
 
-#import xml funcs
-from xml.etree import ElementTree
+#separate --options from the positional arguments
+def splitArgs(argv):
+    options = [arg for arg in argv[1:] if arg.startswith('--')]
+    args = [argv[0]] + [arg for arg in argv[1:] if not arg.startswith('--')]
+
+    return options, args
+
+#get the value of a --name=value option (or the default if not supplied)
+def getOption(options, name, default=None):
+    for opt in options:
+        if opt.startswith('--' + name + '='):
+            return opt.split('=',1)[1]
+
+    return default
+
+#extract the generate() options from the command line options
+def generateOptions(options):
+    return {
+        #stream generated code straight to file (for very large schemas)
+        'stream' : '--stream' in options,
+        #stamp generated files with a hash of the source rather than the current time
+        'deterministic' : '--deterministic' in options,
+        #cache parsed logging structures
+        'cache' : getOption(options, 'cache'),
+        #profile the generator
+        'profile' : getOption(options, 'profile') is not None,
+        #iterate through set selection bits only
+        'bitIteration' : '--bit-iteration' in options,
+        #codec for copying data to/from a buffer
+        'codec' : getOption(options, 'codec', 'unrolled'),
+        #bulk copy contiguous struct members
+        'bulkCopy' : '--bulk-copy' in options,
+        #selection size lookup tables
+        'sizeTables' : '--size-tables' in options,
+        #frame ring buffer
+        'ring' : '--ring' in options,
+        #batched event blocks
+        'eventBlocks' : '--event-blocks' in options,
+        #read individual variables straight from an encoded frame
+        'frameAccessors' : '--frame-accessors' in options,
+        #integer-only string formatting
+        'integerFormat' : '--int-format' in options,
+        #titles, units and values looked up in const tables
+        'stringTables' : '--string-tables' in options,
+        #frame sync word, length and CRC
+        'framing' : getOption(options, 'framing'),
+        #python decoder module
+        'pythonDecoder' : '--python' in options,
+        }
+
+#parse xml data describing a logging structure
+#returns a dict containing the prefix, version, variables and events
+#raises ValueError if the xml data is not a valid logging description
+def parseSchema(data):
+
+    root = ElementTree.fromstring(data)
 
-outputdir = None
-
-#have we been directed to an output directory?
-if len(sys.argv) > 2:
-    outputdir = os.path.abspath(sys.argv[2])
-    if not os.path.isdir(outputdir):
-        say(outputdir,'is not a valid directory')
-        outputdir = None
-    
-else:
-    say('No output directory specified.')
-    
-if not outputdir:
-    say('Writing files to',os.getcwd())
-else:
-    say('Writing files to',outputdir)
-
-say("")
-        
-with open(xml_file, 'rt') as xml:
-    tree = ElementTree.parse(xml)
-    
-    root = tree.getroot()
-    
     #check that it's "Logging"
     if not root.tag == "Logging":
-        close("Root of xml tree should be 'logging'")
-    
+        raise ValueError("Root of xml tree should be 'logging'")
+
     #extract the name of the logging structure
     prefix = root.attrib.get("name",None)
-    
+
     if not prefix:
-        close("Logging prefix not set - use attribute 'name'")
-        
+        raise ValueError("Logging prefix not set - use attribute 'name'")
+
     #extract the version number
     version = root.attrib.get("version",None)
-    
+
     if not version:
-        close("Version number not set")
-        
+        raise ValueError("Version number not set")
+
     #is the version number 'valid'?
-    
+
     result = re.match("(\d*).(\d*)", version)
-    
+
     try:
         version_major = int(result.groups()[0])
         version_minor = int(result.groups()[1])
     except:
-        close("Version number incorrect format -",version)
-    
+        raise ValueError("Version number incorrect format - " + version)
+
     variables = []
     triggers = []
     events = []
-    
+
     #extract the children
     for node in root:
-        
+
         if node.tag == 'Variable':
-        
+
             variables.append(LogVariable(prefix,node))
-            
+
         elif node.tag == 'Event':
             events.append(LogEvent(prefix, node))
-            
-    lf = LogFile(prefix, version, os.path.basename(xml_file), vars=variables, events=events, outputdir=outputdir)
-    
-    lf.saveFiles()
-    
-#copy across the 'common' files
-if outputdir:
-    copySourceFile('logjam_common.h',outputdir = outputdir)
-    copySourceFile('logjam_common.c',outputdir = outputdir)
 
-close("Complete!")
\ No newline at end of file
+    return {
+        'prefix' : prefix,
+        'version' : version,
+        'variables' : variables,
+        'events' : events,
+        }
+
+#construct a LogFile from a parsed logging structure
+#any extra keyword arguments (see CODE_OPTIONS) are passed through to the LogFile
+def createLogFile(schema, source, outputdir=None, stream=False, srcHash=None, profile=False, **kwargs):
+    return LogFile(schema['prefix'], schema['version'], source, vars=schema['variables'], events=schema['events'], outputdir=outputdir, stream=stream, srcHash=srcHash, profile=profile, **kwargs)
+
+#parse an xml file and construct the LogFile it describes
+#raises ValueError if the xml file is not a valid logging description
+def loadLogFile(xml_file, outputdir=None, stream=False, deterministic=False):
+
+    with open(xml_file, 'rb') as xml:
+        data = xml.read()
+
+    srcHash = hashSource(data) if deterministic else None
+
+    return createLogFile(parseSchema(data), os.path.basename(xml_file), outputdir=outputdir, stream=stream, srcHash=srcHash)
+
+#default options for the generate() function
+#stream - write the generated files out incrementally (generated text is not returned)
+#deterministic - stamp the generated files with a hash of the source rather than the current time
+#write - write the generated files (set to False to only return the generated text)
+#cache - directory in which parsed logging structures (and deterministic output) are cached
+#profile - record the time taken and bytes generated by each section of the generator
+DEFAULT_OPTIONS = {
+    'stream' : False,
+    'deterministic' : False,
+    'write' : True,
+    'cache' : None,
+    'profile' : False,
+    }
+
+#options which control the generated code (passed through to LogFile)
+#bitIteration - only visit the *set* selection bits when copying data or measuring the selection size
+#codec - 'unrolled' or 'table' method for copying data to/from a buffer
+#bulkCopy - copy runs of contiguous struct members with a single memcpy (when the target byte order is known)
+#sizeTables - calculate the selection size with a lookup table per selection byte
+#ring - generate a single-producer / single-consumer ring buffer of frames
+#eventBlocks - generate functions for batching events into blocks
+#frameAccessors - generate functions for reading individual variables straight from an encoded frame
+#integerFormat - format values into strings with integer arithmetic (rather than sprintf), into a buffer of a given size
+#stringTables - look up titles, units and values by index in const tables (rather than a switch statement)
+#framing - wrap frames with a sync word, length and CRC ('crc16' or 'crc32', see logjam_framing.py)
+#pythonDecoder - also generate a python module (log_<prefix>_defs.py) for decoding frames and events on the host
+CODE_OPTIONS = {
+    'bitIteration' : False,
+    'codec' : 'unrolled',
+    'bulkCopy' : False,
+    'sizeTables' : False,
+    'ring' : False,
+    'eventBlocks' : False,
+    'frameAccessors' : False,
+    'integerFormat' : False,
+    'stringTables' : False,
+    'framing' : None,
+    'pythonDecoder' : False,
+    }
+
+DEFAULT_OPTIONS.update(CODE_OPTIONS)
+
+#options which do not affect the generated code
+NON_OUTPUT_OPTIONS = ['stream', 'write', 'cache', 'profile']
+
+#cache key for an xml file
+#the generated code depends on the source, the name of the source file, the generation options and the generator itself
+def cacheKey(data, source, opts):
+    outputOpts = [(k, opts[k]) for k in sorted(opts) if k not in NON_OUTPUT_OPTIONS]
+
+    return hashSource(data, source, outputOpts, generatorFingerprint())
+
+"""
+Generate the code files for an xml file
+Nothing is printed and no global state is modified, so this can be called repeatedly from another program
+xml_path - xml file describing the logging structure
+outputdir - directory to write the generated files to
+options - dict of options to override DEFAULT_OPTIONS
+
+Returns a dict:
+prefix - name of the logging structure
+files - dict of {filename: text} for each generated file (text is None if the file was streamed)
+written - list of the files that were actually written (unchanged files are not touched)
+stats - dict of statistics about the logging structure and the generated code
+profile - per-section profiling report (if the 'profile' option is set)
+
+Raises ValueError if the xml file is not a valid logging description
+"""
+def generate(xml_path, outputdir=None, options=None):
+
+    opts = dict(DEFAULT_OPTIONS)
+
+    if options:
+        opts.update(options)
+
+    #there is nothing to stream to if the files are not being written
+    stream = opts['stream'] and opts['write']
+
+    start = time.time()
+
+    with open(xml_path, 'rb') as xml:
+        data = xml.read()
+
+    source = os.path.basename(xml_path)
+    srcHash = hashSource(data) if opts['deterministic'] else None
+
+    entry = None
+
+    if opts['cache']:
+        key = cacheKey(data, source, opts)
+        entry = loadCacheEntry(opts['cache'], key)
+
+    cached = entry is not None
+
+    if not cached:
+        entry = {'schema' : parseSchema(data)}
+
+    codeOpts = dict([(k, opts[k]) for k in CODE_OPTIONS])
+
+    lf = createLogFile(entry['schema'], source, outputdir=outputdir, stream=stream, srcHash=srcHash, profile=opts['profile'], **codeOpts)
+
+    #generated text is only reusable if it does not contain a timestamp
+    #(and cannot be reused when the generator is being profiled)
+    if 'text' in entry and not opts['profile']:
+        lf.hFile.clear()
+        lf.hFile.write(entry['text']['header'])
+        lf.cFile.clear()
+        lf.cFile.write(entry['text']['code'])
+
+        if lf.pyFile:
+            lf.pyFile.clear()
+            lf.pyFile.write(entry['text']['python'])
+    else:
+        lf.constructHeaderFile()
+        lf.constructCodeFile()
+
+        if lf.pyFile:
+            lf.constructPythonFile()
+
+        if opts['cache'] and opts['deterministic'] and not stream:
+            entry['text'] = {'header' : lf.hFile.text, 'code' : lf.cFile.text}
+
+            if lf.pyFile:
+                entry['text']['python'] = lf.pyFile.text
+
+        if opts['cache'] and (not cached or 'text' in entry):
+            saveCacheEntry(opts['cache'], key, entry)
+
+    files = {}
+
+    for f in lf.codeFiles():
+        files[f.fname] = None if stream else f.text
+
+    written = lf.writeFiles() if opts['write'] else []
+
+    stats = lf.statistics()
+    stats['headerBytes'] = lf.hFile.length
+    stats['codeBytes'] = lf.cFile.length
+    stats['cached'] = cached
+    stats['time'] = time.time() - start
+
+    return {
+        'prefix' : lf.prefix,
+        'files' : files,
+        'written' : written,
+        'stats' : stats,
+        'profile' : lf.profiler.report() if lf.profiler else None,
+        }
+
+#generate the code files for a single xml file
+#returns the prefix of the generated logging structure
+def generateFile(xml_file, outputdir=None, options=None):
+
+    result = generate(xml_file, outputdir, options)
+
+    return result['prefix']
+
+def main():
+
+    print("Running LogJam version {v}\n".format(v=LOGJAM_VERSION))
+
+    options, args = splitArgs(sys.argv)
+
+    #get an xml file
+    if len(args) < 2 or not args[1].endswith(".xml"):
+        close("No xml file supplied")
+
+    xml_file = args[1]
+
+    outputdir = None
+
+    #have we been directed to an output directory?
+    if len(args) > 2:
+        outputdir = os.path.abspath(args[2])
+        if not os.path.isdir(outputdir):
+            say(outputdir,'is not a valid directory')
+            outputdir = None
+
+    else:
+        say('No output directory specified.')
+
+    if not outputdir:
+        say('Writing files to',os.getcwd())
+    else:
+        say('Writing files to',outputdir)
+
+    say("")
+
+    try:
+        result = generate(xml_file, outputdir, generateOptions(options))
+    except ValueError as e:
+        close(e)
+
+    for f in result['files']:
+        say(f, 'written' if f in result['written'] else 'is up to date')
+
+    #report the size/speed trade-off of the codecs for this schema
+    codec = result['stats']['codec']
+    say('')
+    say('Codec estimates (copy functions):')
+    say('  unrolled - ~{n} bytes flash'.format(n=codec['unrolled']['flashBytes']))
+    say('  table    - ~{n} bytes flash (+{s} bytes shared), ~{x}x per-variable copy time'.format(
+        n=codec['table']['flashBytes'],
+        s=codec['table']['sharedFlashBytes'],
+        x=codec['table']['relativeCost']))
+    say('')
+
+    #write the profiling report
+    if result['profile']:
+        profile = getOption(options, 'profile')
+        with open(profile, 'w') as file:
+            json.dump(result['profile'], file, indent=4)
+        say('Profile written to', profile)
+
+    #copy across the 'common' files
+    if outputdir:
+        copyCommonFiles(outputdir, python=generateOptions(options)['pythonDecoder'])
+
+    close("Complete!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import pickle
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import logjam_cache
+
+from logjam_xml import generate, cacheKey, DEFAULT_OPTIONS
+from logjam_cache import loadCacheEntry, saveCacheEntry, generatorFingerprint
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example', 'example.xml')
+
+#generate the example (without writing any files) through a cache directory
+def generateCached(cachedir):
+    return generate(EXAMPLE, options={'cache' : cachedir, 'deterministic' : True, 'write' : False})
+
+def test_cache_hit(tmp_path):
+    first = generateCached(str(tmp_path))
+    second = generateCached(str(tmp_path))
+
+    assert not first['stats']['cached']
+    assert second['stats']['cached']
+    assert first['files'] == second['files']
+
+#an entry saved by a different generator is a miss
+def test_generator_change_is_miss(tmp_path, monkeypatch):
+    generateCached(str(tmp_path))
+
+    monkeypatch.setattr(logjam_cache, 'CACHE_FORMAT', logjam_cache.CACHE_FORMAT + 1)
+    generatorFingerprint.cache_clear()
+
+    try:
+        result = generateCached(str(tmp_path))
+    finally:
+        monkeypatch.undo()
+        generatorFingerprint.cache_clear()
+
+    assert not result['stats']['cached']
+
+#an entry (e.g. pickled from an older model) found under the current key is a miss if its fingerprint does not match
+def test_stale_entry_is_miss(tmp_path):
+    with open(EXAMPLE, 'rb') as xml:
+        data = xml.read()
+
+    opts = dict(DEFAULT_OPTIONS)
+    opts.update({'cache' : str(tmp_path), 'deterministic' : True})
+
+    key = cacheKey(data, os.path.basename(EXAMPLE), opts)
+
+    saveCacheEntry(str(tmp_path), key, {'schema' : None})
+    assert loadCacheEntry(str(tmp_path), key) is not None
+
+    with open(logjam_cache.cacheFileName(str(tmp_path), key), 'wb') as file:
+        pickle.dump({'schema' : None, 'fingerprint' : 'stale'}, file)
+
+    assert loadCacheEntry(str(tmp_path), key) is None
+    assert not generateCached(str(tmp_path))['stats']['cached']
@@ -0,0 +1,308 @@
+import os
+import sys
+import random
+import importlib.util
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hand-code'))
+
+from logjam_xml import generate
+from logjam_decoder import FORMAT_BITS, LogContext, wrapValue
+
+SCHEMA = """<?xml version="1.0"?>
+<Logging name="Codec" version="1.0">
+    <Variable name="plain" type="unsigned16"/>
+    <Variable name="count" type="unsigned32" delta="true"/>
+    <Variable name="offset" type="signed32" delta="true"/>
+    <Variable name="small" type="signed8" delta="true"/>
+    <Variable name="packed" type="unsigned16" encoding="varint"/>
+    <Variable name="swing" type="signed16" encoding="zigzag"/>
+    <Variable name="temp" type="signed8" scaler="10"/>
+    <Variable name="wide" type="signed32"/>
+    <Variable name="flag" type="unsigned8"/>
+</Logging>
+"""
+
+#generate and import the python decoder module for SCHEMA
+@pytest.fixture(scope='module')
+def defs(tmp_path_factory):
+    outputdir = tmp_path_factory.mktemp('codec')
+    xml = outputdir / 'codec.xml'
+    xml.write_text(SCHEMA)
+
+    generate(str(xml), str(outputdir), options={'pythonDecoder' : True, 'deterministic' : True})
+
+    spec = importlib.util.spec_from_file_location('log_codec_defs', str(outputdir / 'log_codec_defs.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+def varint(value):
+    data = bytearray()
+
+    while value >= 0x80:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+
+    data.append(value)
+
+    return bytes(data)
+
+def zigzag(value):
+    return varint((value << 1) if value >= 0 else ((-value) << 1) - 1)
+
+"""
+Encode a frame the way Log<Prefix>_CopyDataToBuffer() does
+values - dict of {name: value} for the selected variables
+previous - previous value of each delta variable (updated in place)
+"""
+def encodeFrame(decoder, values, keyframe, previous):
+    selection = bytearray(decoder.selectionBytes)
+    data = bytearray()
+
+    if keyframe:
+        previous.clear()
+
+    for i, var in enumerate(decoder.variables):
+        if var.name not in values:
+            continue
+
+        selection[i // 8] |= 1 << (i % 8)
+        value = values[var.name]
+
+        if var.delta:
+            value = wrapValue(value - previous.get(var.name, 0), var.format)
+            previous[var.name] = values[var.name]
+
+        if var.encoding == 'zigzag':
+            data += zigzag(value)
+        elif var.encoding == 'varint':
+            data += varint(value & ((1 << FORMAT_BITS[var.format]) - 1))
+        else:
+            data += value.to_bytes(FORMAT_BITS[var.format] // 8, 'big', signed=var.format.islower())
+
+    return bytes(selection) + bytes([1 if keyframe else 0] if decoder.keyframeBytes else []) + bytes(data)
+
+#random value of a struct format
+def randomValue(rng, fmt):
+    bits = FORMAT_BITS[fmt]
+
+    return wrapValue(rng.getrandbits(bits), fmt)
+
+"""
+Encode a sequence of random frames (a keyframe every keyframeInterval frames)
+Returns (buffer, expected) where expected is a list of {name: value} for each frame (delta variables are always selected
+on a keyframe, so every delta variable is known)
+"""
+def encodeFrames(decoder, count, seed=1, keyframeInterval=10):
+    rng = random.Random(seed)
+
+    current = dict([(var.name, 0) for var in decoder.variables])
+    previous = {}
+
+    buffer = bytearray()
+    expected = []
+
+    for n in range(count):
+        keyframe = n % keyframeInterval == 0
+
+        values = {}
+
+        for var in decoder.variables:
+            if var.delta:
+                #small steps, with an occasional jump across the whole range
+                step = rng.getrandbits(32) if rng.random() < 0.05 else rng.randrange(-100, 100)
+                current[var.name] = wrapValue(current[var.name] + step, var.format)
+            else:
+                current[var.name] = randomValue(rng, var.format)
+
+            if keyframe or rng.random() < 0.7:
+                values[var.name] = current[var.name]
+
+        buffer += encodeFrame(decoder, values, keyframe, previous)
+        expected.append(values)
+
+    return bytes(buffer), expected
+
+def test_decode_frames(defs):
+    decoder = defs.decoder
+    buffer, expected = encodeFrames(decoder, 1000)
+
+    context = LogContext()
+    offset = 0
+
+    for values in expected:
+        decoded, length = decoder.decodeFrame(buffer, offset, context)
+
+        assert decoded == values
+
+        offset += length
+
+    assert offset == len(buffer)
+
+#delta variables are left out until the first keyframe
+def test_decode_mid_stream(defs):
+    decoder = defs.decoder
+    buffer, expected = encodeFrames(decoder, 30)
+
+    context = LogContext()
+    offset = 0
+
+    #skip the first (key)frame
+    offset += decoder.decodeFrame(buffer, offset, LogContext())[1]
+
+    for n, values in enumerate(expected[1:], 1):
+        decoded, length = decoder.decodeFrame(buffer, offset, context)
+
+        if n < 10:
+            assert decoded == dict([(var.name, values[var.name]) for var in decoder.variables if var.name in values and not var.delta])
+        else:
+            assert decoded == values
+
+        offset += length
+
+def test_decode_columns(defs):
+    pytest.importorskip('numpy')
+
+    from logjam_bulk import decodeColumns
+
+    decoder = defs.decoder
+    buffer, expected = encodeFrames(decoder, 1000)
+
+    values, valid = decodeColumns(decoder, buffer)
+
+    for var in decoder.variables:
+        assert list(valid[var.name]) == [var.name in frame for frame in expected]
+
+        for n, frame in enumerate(expected):
+            if var.name in frame:
+                assert values[var.name][n] == frame[var.name] / var.scaler
+
+#frames without any variable-length encoded variables are decoded a group at a time
+def test_decode_columns_fixed(defs):
+    pytest.importorskip('numpy')
+
+    from logjam_bulk import decodeColumns
+
+    decoder = defs.decoder
+
+    rng = random.Random(2)
+    expected = []
+
+    for n in range(200):
+        expected.append(dict([(var.name, randomValue(rng, var.format)) for var in decoder.variables if not var.encoding and rng.random() < 0.5]))
+
+    buffer = b''.join([encodeFrame(decoder, frame, False, {}) for frame in expected])
+
+    values, valid = decodeColumns(decoder, buffer)
+
+    for var in decoder.variables:
+        for n, frame in enumerate(expected):
+            assert valid[var.name][n] == (var.name in frame)
+
+            if var.name in frame:
+                assert values[var.name][n] == frame[var.name] / var.scaler
+
+#frames lost between the given offsets are detected, so delta variables are not reconstructed from the wrong value
+def test_decode_columns_gap(defs):
+    pytest.importorskip('numpy')
+
+    from logjam_bulk import decodeColumns
+    from logjam_framing import HEADER_BYTES, overheadBytes, frame, scanFrames
+
+    decoder = defs.decoder
+    buffer, expected = encodeFrames(decoder, 100)
+
+    offsets = []
+    offset = 0
+
+    for n in range(len(expected)):
+        offsets.append(offset)
+        offset += decoder.decodeFrame(buffer, offset, LogContext())[1]
+
+    offsets.append(len(buffer))
+
+    #frame each frame, and corrupt frames 25 and 52 (which are then skipped by scanFrames)
+    frames = [bytearray(frame('crc16', buffer[offsets[n]:offsets[n + 1]])) for n in range(len(expected))]
+
+    for n in [25, 52]:
+        frames[n][HEADER_BYTES] ^= 0x01
+
+    data = b''.join(frames)
+    kept = [values for n, values in enumerate(expected) if n not in [25, 52]]
+
+    found = [offset + HEADER_BYTES for offset, f in scanFrames(data, 'crc16', decoder.headerBytes + 64)]
+
+    values, valid = decodeColumns(decoder, data, offsets=found, overhead=overheadBytes('crc16'))
+
+    for n, frame in enumerate(kept):
+        #after frame 25 (and 52) the delta variables are unknown until the keyframe at frame 30 (and 60)
+        lost = 25 <= n < 29 or 51 <= n < 58
+
+        for var in decoder.variables:
+            assert valid[var.name][n] == (var.name in frame and not (var.delta and lost))
+
+            if valid[var.name][n]:
+                assert values[var.name][n] == frame[var.name] / var.scaler
+
+#an incomplete final frame is left out
+def test_decode_columns_truncated(defs):
+    pytest.importorskip('numpy')
+
+    from logjam_bulk import decodeColumns
+
+    decoder = defs.decoder
+    buffer, expected = encodeFrames(decoder, 20)
+
+    for end in range(len(buffer)):
+        values, valid = decodeColumns(decoder, buffer[:end])
+
+        count = len(valid[decoder.variables[0].name])
+
+        assert count < len(expected)
+
+        for var in decoder.variables:
+            assert list(valid[var.name]) == [var.name in frame for frame in expected[:count]]
+
+#corrupted frames are skipped by LogReader, and delta variables are not reconstructed from the wrong value
+def test_reader_corrupted_frames(defs, tmp_path):
+    from logjam_reader import LogReader
+    from logjam_framing import HEADER_BYTES, frame
+
+    decoder = defs.decoder
+    buffer, expected = encodeFrames(decoder, 100)
+
+    frames = []
+    offset = 0
+
+    for values in expected:
+        length = decoder.decodeFrame(buffer, offset, LogContext())[1]
+        frames.append(bytearray(frame('crc16', buffer[offset:offset + length])))
+        offset += length
+
+    for n in [25, 52]:
+        frames[n][HEADER_BYTES] ^= 0x01
+
+    path = str(tmp_path / 'dump.bin')
+
+    with open(path, 'wb') as file:
+        file.write(b''.join(frames))
+
+    kept = [values for n, values in enumerate(expected) if n not in [25, 52]]
+
+    for method in ['frames', 'records']:
+        with LogReader(path, decoder, 'crc16', defs.MAX_FRAME_BYTES) as reader:
+            records = list(getattr(reader, method)())
+
+            assert reader.skipped == len(frames[25]) + len(frames[52])
+
+        assert len(records) == len(kept)
+
+        for n, (record, values) in enumerate(zip(records, kept)):
+            #after frame 25 (and 52) the delta variables are unknown until the keyframe at frame 30 (and 60)
+            lost = 25 <= n < 29 or 51 <= n < 58
+
+            assert record.values == dict([(var.name, values[var.name]) for var in decoder.variables if var.name in values and not (var.delta and lost)])
@@ -0,0 +1,49 @@
+import os
+import re
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from logjam_xml import generate
+from logjam_framing import FRAMINGS, HEADER_BYTES, crc, crcTable, tableCrc, frame, scanFrames
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example', 'example.xml')
+
+#the lookup tables (as used by the generated code) give the same CRCs as binascii.crc_hqx and zlib.crc32
+def test_table_crc():
+    rng = random.Random(1)
+
+    for framing in FRAMINGS:
+        for n in [0, 1, 2, 7, 64, 300]:
+            data = bytes([rng.randrange(256) for i in range(n)])
+
+            assert tableCrc(framing, data) == crc(framing, data)
+
+#the tables emitted into the generated code are the tables checked above
+def test_emitted_tables():
+    for framing in FRAMINGS:
+        result = generate(EXAMPLE, options={'framing' : framing, 'deterministic' : True, 'write' : False})
+        code = [text for name, text in result['files'].items() if name.endswith('.c')][0]
+
+        table = re.search(r'_CrcTable\[256\] =\s*\{(.*?)\};', code, re.S).group(1)
+
+        assert tuple([int(value, 16) for value in re.findall(r'0x[0-9A-F]+', table)]) == crcTable(framing)
+
+#junk bytes and a corrupted frame are skipped, and every valid frame is found
+def test_scan_frames():
+    framing = 'crc16'
+    frames = [frame(framing, bytes([i] * (i + 1))) for i in range(10)]
+
+    corrupted = bytearray(frames[4])
+    corrupted[HEADER_BYTES] ^= 0xFF
+    frames[4] = bytes(corrupted)
+
+    data = b'\x00\xA5' + b''.join(frames[:7]) + b'\xA5\x5A\x00' + b''.join(frames[7:])
+
+    found = [bytes(f) for offset, f in scanFrames(data, framing, 16)]
+
+    assert found == [bytes([i] * (i + 1)) for i in range(10) if i != 4]
+
+    #frames longer than maxLength are rejected
+    assert len(list(scanFrames(data, framing, 5))) == 4